@@ -1,19 +1,128 @@
 from fastapi.middleware.cors import CORSMiddleware
-from pool import get_connection
+from db import (DBSession, get_db, get_read_db, get_connection, offload, open_pool, close_pool, pool_stats,
+                replica_stats, executor_stats, DB_REQUEST_TIMEOUT, DB_READ_YOUR_WRITES_WINDOW)
+from metrics import METRICS_ENABLED, CONTENT_TYPE, MetricsMiddleware, format_family, registry as metrics_registry
+from profiler import SQL_PROFILE, ProfilerMiddleware, profiler
+from writer import WRITE_BATCHING, GroupCommitWriter
+from admission import (ADMISSION_CONTROL, ADMISSION_SATURATION_QUEUE, POST_RATE, POST_BURST, REPLY_RATE,
+                       REPLY_BURST, AdmissionController, AdmissionMiddleware, TokenBucketLimiter, class_limiter)
+from cache import TTLCache
+from events import Broadcaster
+from search import NameIndex, PostIndex
+from serialization import dumps, post_record, reply_record
+from sessions import (InvalidToken, RevocationList, issue_token, verify_token,
+                      SESSION_REVOCATION_REFRESH, SESSION_SECRET_CONFIGURED, SESSION_TOKENS_REQUIRED)
 from fastapi import FastAPI, Body
 import requests
 import re
+import asyncio
+import base64
+import csv
+import io
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import asynccontextmanager
+from datetime import datetime
 import pymysql
-from fastapi import Query, HTTPException, File, UploadFile, Depends
+from fastapi import Query, HTTPException, File, UploadFile, Depends, Header, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from fastapi.middleware.cors import CORSMiddleware
 
 
-app = FastAPI()
+logger = logging.getLogger(__name__)
+broadcaster = Broadcaster(queue_size=100, history=500)
+
+@asynccontextmanager
+async def lifespan(app):
+    # One connection pool per worker process, shared by every request
+    if not SESSION_SECRET_CONFIGURED:
+        logger.warning("SESSION_SECRET is not set: this worker signs session tokens with its own random key, "
+                       "so tokens fail on every other worker and after a restart")
+    app.state.db_pool = open_pool()
+    broadcaster.bind(asyncio.get_running_loop())
+    yield
+    # Commit anything still queued for group commit before the pool goes away
+    write_batcher.close()
+    close_pool()
+
+app = FastAPI(lifespan=lifespan)
 origins = [
     "*",
 ]
 
+#== Admission Control START ===
+# Each request is admitted by its route class before it can queue for a DB worker. A class
+# that is at its limit queues a bounded number of requests; past that the client gets a fast
+# 503 with Retry-After. Reads are also shed while the DB is saturated, so writes, logins and
+# moderation keep getting through.
+_LOGIN_PATHS = {"/login-check-student", "/login-check-teacher", "/login-check-admin", "/sign-up"}
+_MODERATION_PATHS = {"/block-post", "/validate-post", "/block-reply", "/validate-reply", "/moderate/bulk",
+                     "/pending-content", "/pending-content/counts", "/sessions/revoke",
+                     "/role-cache/invalidate", "/debug/sql-profile"}
+# POST endpoints that only read
+_POST_READ_PATHS = {"/my-post-list"}
+# Streaming exports hold their slot until the last byte is sent, so they get their own class
+# and can't starve moderation actions
+_EXPORT_PATHS = {"/export"}
+# Health, monitoring and the long-lived /events stream never take a slot
+_UNLIMITED_PATHS = {"/", "/metrics", "/pool-stats", "/events"}
+
+def _route_class(method, path):
+    if path in _UNLIMITED_PATHS or path.endswith("/stats"):
+        return None
+    if path in _LOGIN_PATHS:
+        return "login"
+    if path in _MODERATION_PATHS:
+        return "moderation"
+    if path in _EXPORT_PATHS:
+        return "export"
+    if method in ("GET", "HEAD") or path in _POST_READ_PATHS:
+        return "read"
+    return "write"
+
+def _db_saturated():
+    return executor_stats()["queued"] >= ADMISSION_SATURATION_QUEUE or pool_stats()["waiters"] > 0
+
+admission = AdmissionController(
+    {
+        "read": class_limiter("read", limit=32, queue=64, shed_when_saturated=True),
+        "write": class_limiter("write", limit=16, queue=32),
+        "moderation": class_limiter("moderation", limit=4, queue=8),
+        "login": class_limiter("login", limit=8, queue=16),
+        "export": class_limiter("export", limit=2, queue=2),
+    },
+    classify=_route_class,
+    saturated=_db_saturated,
+)
+post_rate_limiter = TokenBucketLimiter(POST_RATE, POST_BURST)
+reply_rate_limiter = TokenBucketLimiter(REPLY_RATE, REPLY_BURST)
+
+def _rate_limited(limiter, author_id):
+    """429 response when author_id has used up its bucket, else None."""
+    if not ADMISSION_CONTROL:
+        return None
+    retry_after = limiter.take(str(author_id))
+    if not retry_after:
+        return None
+    return JSONResponse(status_code=429, headers={"Retry-After": str(max(1, round(retry_after)))},
+                        content={"status": "error", "message": "Too many submissions, please slow down"})
+
+if ADMISSION_CONTROL:
+    # Added before CORS so it sits inside it and refusals still carry CORS headers
+    app.add_middleware(AdmissionMiddleware, controller=admission)
+
+@app.get("/admission/stats")
+async def admission_stats():
+    return {"status": "success", "stats": {**admission.stats(), "rate_limits": {
+        "post": post_rate_limiter.stats(), "reply": reply_rate_limiter.stats()}}}
+#== Admission Control END ===
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
@@ -21,11 +130,170 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+if SQL_PROFILE:
+    app.add_middleware(ProfilerMiddleware, profiler=profiler)
+if METRICS_ENABLED:
+    # Added last so it is outermost and times CORS handling too
+    app.add_middleware(MetricsMiddleware, registry=metrics_registry)
 
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
 
+@app.get("/pool-stats")
+async def get_pool_stats():
+    return {"status": "success", "stats": pool_stats(), "replicas": replica_stats()}
+
+_POOL_GAUGES = ("size", "in_use", "idle", "waiters", "max_size")
+_POOL_COUNTERS = ("created", "destroyed", "acquires", "acquire_timeouts", "ping_failures")
+
+def _metric_families():
+    """Pool, executor, cache and event-stream figures sampled at scrape time."""
+    stats = pool_stats()
+    families = [format_family(f"db_pool_{name}", "gauge", f"Connection pool {name}.", [({}, stats[name])])
+                for name in _POOL_GAUGES]
+    families += [format_family(f"db_pool_{name}_total", "counter", f"Connection pool {name}.", [({}, stats[name])])
+                 for name in _POOL_COUNTERS]
+    families.append(format_family("db_pool_acquire_wait_seconds_max", "gauge", "Longest wait for a connection.",
+                                  [({}, stats["max_acquire_ms"] / 1000)]))
+    replicas = replica_stats()
+    families.append(format_family("db_replica_reads_total", "counter", "Reads served by each replica.",
+                                  [({"replica": replica["name"]}, replica["reads"]) for replica in replicas["replicas"]]))
+    families.append(format_family("db_replica_up", "gauge", "Whether the replica is currently used.",
+                                  [({"replica": replica["name"]}, replica["up"]) for replica in replicas["replicas"]]))
+    families.append(format_family("db_primary_reads_total", "counter", "Read-only sessions served by the primary.",
+                                  [({"reason": reason}, count) for reason, count in replicas["primary_reads"].items()]))
+    families.append(format_family("db_executor_queued", "gauge", "Handlers waiting for a DB worker thread.",
+                                  [({}, executor_stats()["queued"])]))
+    caches = {"feed": feed_cache.stats(), "role": role_cache.stats()}
+    for name, help_text in (("hits", "Cache hits."), ("misses", "Cache misses."),
+                            ("evictions", "Entries evicted for size."),
+                            ("invalidations", "Entries dropped by invalidation.")):
+        families.append(format_family(f"cache_{name}_total", "counter", help_text,
+                                      [({"cache": cache}, cache_stats[name]) for cache, cache_stats in caches.items()]))
+    families.append(format_family("cache_entries", "gauge", "Entries currently cached.",
+                                  [({"cache": cache}, cache_stats["size"]) for cache, cache_stats in caches.items()]))
+    families.append(format_family("cache_hit_ratio", "gauge", "Hits / lookups since start.",
+                                  [({"cache": cache}, cache_stats["hit_ratio"]) for cache, cache_stats in caches.items()]))
+    writes = write_batcher.stats()
+    families.append(format_family("write_batches_total", "counter", "Group-commit transactions.",
+                                  [({}, writes["batches"])]))
+    families.append(format_family("write_batch_rows_total", "counter", "Rows written by group commit.",
+                                  [({}, writes["rows"])]))
+    families.append(format_family("write_batch_queued", "gauge", "Rows waiting for the group-commit writer.",
+                                  [({}, writes["queued"])]))
+    classes = admission.stats()["classes"]
+    for name, key, help_text in (("admission_limit", "limit", "Concurrent requests admitted per route class."),
+                                 ("admission_in_flight", "in_flight", "Requests holding an admission slot."),
+                                 ("admission_queued", "queued", "Requests waiting for an admission slot.")):
+        families.append(format_family(name, "gauge", help_text,
+                                      [({"class": route_class}, stats[key]) for route_class, stats in classes.items()]))
+    families.append(format_family("admission_admitted_total", "counter", "Requests admitted, by route class.",
+                                  [({"class": route_class}, stats["admitted"]) for route_class, stats in classes.items()]))
+    families.append(format_family("admission_rejected_total", "counter", "Requests refused with a 503.",
+                                  [({"class": route_class, "reason": reason}, count)
+                                   for route_class, stats in classes.items()
+                                   for reason, count in stats["rejected"].items()]))
+    families.append(format_family("rate_limited_total", "counter", "Submissions refused with a 429, by action.",
+                                  [({"action": "post"}, post_rate_limiter.stats()["limited"]),
+                                   ({"action": "reply"}, reply_rate_limiter.stats()["limited"])]))
+    events = broadcaster.stats()
+    families.append(format_family("events_subscribers", "gauge", "Open /events streams.", [({}, events["subscribers"])]))
+    families.append(format_family("events_published_total", "counter", "Events published.", [({}, events["published"])]))
+    return families
+
+@app.get("/metrics")
+async def metrics():
+    # Prometheus scrape endpoint; the request metrics themselves are recorded by MetricsMiddleware
+    return Response(metrics_registry.render(_metric_families()), media_type=CONTENT_TYPE)
+
+#== Sessions START ===
+# Login hands out an HMAC-signed token carrying school_id, user_id and role flags. Requests
+# that send it as "Authorization: Bearer <token>" are authorized from the token alone. The
+# legacy requester_school_id is still honoured for reads unless SESSION_TOKENS_REQUIRED is
+# set; moderation, export and admin endpoints only ever trust the token.
+revocations = RevocationList()
+_revocations_refreshing = False
+_revocations_lock = threading.Lock()
+
+def _refresh_revocations():
+    global _revocations_refreshing
+    session = DBSession()
+    try:
+        cursor = session.cursor()
+        cursor.execute("SELECT school_id, revoked_at FROM session_revocations")
+        revocations.replace({str(row["school_id"]): float(row["revoked_at"]) for row in cursor.fetchall()},
+                            loaded_at=time.monotonic())
+    except Exception:
+        logger.exception("Could not load session revocations; retrying in %ss", SESSION_REVOCATION_REFRESH)
+        # Keep the current list, but wait a full interval before the next attempt instead of
+        # starting a new refresh on every authenticated request
+        revocations.loaded_at = time.monotonic()
+    finally:
+        session.close()
+        _revocations_refreshing = False
+
+def _ensure_revocations():
+    """Reload the shared revocation list in the background once it is SESSION_REVOCATION_REFRESH old."""
+    global _revocations_refreshing
+    if revocations.loaded_at is not None and time.monotonic() - revocations.loaded_at < SESSION_REVOCATION_REFRESH:
+        return
+    with _revocations_lock:
+        if _revocations_refreshing:
+            return
+        _revocations_refreshing = True
+    threading.Thread(target=_refresh_revocations, daemon=True).start()
+
+async def get_session(authorization: str = Header(None)):
+    """Dependency: the verified session claims, or None when no bearer token was sent."""
+    if not authorization or not authorization.startswith("Bearer "):
+        return None
+    try:
+        session = verify_token(authorization[len("Bearer "):].strip())
+    except InvalidToken as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    _ensure_revocations()
+    if revocations.is_revoked(session):
+        raise HTTPException(status_code=401, detail="Session revoked")
+    return session
+
+def _session_response(user, role):
+    """Successful login response carrying a fresh session token."""
+    token, expires_at = issue_token(role["school_id"], user.get("user_id"), role["is_teacher"], role["is_admin"])
+    return {"status": "success", "message": "Login successful", "user": user,
+            "token": token, "expires_at": expires_at}
+
+@app.post("/sessions/revoke")
+@offload
+def revoke_sessions(request: dict = Body(...), session: dict = Depends(get_session), db: DBSession = Depends(get_db)):
+    """Admin only: invalidate every token issued so far to the given school_ids/user_ids,
+    e.g. after a demotion. Other workers pick it up within SESSION_REVOCATION_REFRESH seconds.
+    """
+    requester_school_id = request.get("requester_school_id")
+    identifiers = request.get("identifiers") or []
+    if not identifiers:
+        return {"status": "error", "message": "identifiers is required"}
+    try:
+        _is_teacher, is_admin = _session_privileges(session)
+        if not is_admin:
+            return {"status": "error", "message": "Access denied"}
+        # Role changes usually come with a revocation, so drop the cached roles too
+        school_ids = sorted({_resolve_role(db, identifier)["school_id"] for identifier in identifiers})
+        invalidate_role(*identifiers, *school_ids)
+        revoked_at = time.time()
+        cursor = db.cursor()
+        cursor.executemany("INSERT INTO session_revocations (school_id, revoked_at) VALUES (%s, %s) "
+                           "ON DUPLICATE KEY UPDATE revoked_at = VALUES(revoked_at)",
+                           [(school_id, revoked_at) for school_id in school_ids])
+        db.commit()
+        for school_id in school_ids:
+            revocations.revoke(school_id, revoked_at)
+        return {"status": "success", "message": f"Sessions revoked for {len(school_ids)} account(s)",
+                "school_ids": school_ids}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+#== Sessions END ===
+
 '''
 #== Registration START ===
 @app.post("/login-check-student")
@@ -52,43 +320,36 @@ async def login_check_student(username=Body("user_id"), password=Body("password"
    '''
 
 @app.post("/login-check-student")
-async def login_check_student(username=Body("user_id"), password=Body("password")):
-    connection = None
-    cursor = None
+@offload
+def login_check_student(username=Body("user_id"), password=Body("password"), db: DBSession = Depends(get_db)):
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         cursor.execute("SELECT * FROM personal_info WHERE user_id=%s AND password=%s", (username, password))
         user = cursor.fetchone()
         if user:
             # Check if this user is actually a teacher (should not be allowed to login as student)
             school_id = user.get("school_id")
+            role = _resolve_role(db, school_id or user["user_id"])
             if school_id:
-                cursor.execute("SELECT teacher_id FROM teacher_data WHERE teacher_id=%s", (school_id,))
-                teacher = cursor.fetchone()
-                if teacher:
+                if role["is_teacher"]:
                     return {"status": "error", "message": "This is a teacher account. Please use teacher login."}
             
             # If not a teacher, allow student login
             # Remove password from response for security
             if 'password' in user:
                 del user['password']
-            return {"status": "success", "message": "Login successful", "user": user}
+            return _session_response(user, role)
         else:
             return {"status": "error", "message": "Invalid credentials"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.post("/sign-up")
-async def sign_up(user_id=Body("user_id"), password=Body("password"),
+@offload
+def sign_up(user_id=Body("user_id"), password=Body("password"),
                   given_name=Body("given_name"), surname=Body("surname"),
                   age=Body("age"), school_id=Body("school_id"), intended_major=Body("intended_major"),
-                  email=Body("email"), classOf=Body("class")):
+                  email=Body("email"), classOf=Body("class"), db: DBSession = Depends(get_db)):
     # Validate input formats
     if not re.match(r"^[\w\s]{2,20}$", given_name) or not re.match(r"^[\w\s]{2,20}$", surname):
         return {"status": "error", "message": "Invalid name format"}
@@ -101,34 +362,257 @@ async def sign_up(user_id=Body("user_id"), password=Body("password"),
     if not re.match(r"^[\w\s]{2,20}$", classOf):
         return {"status": "error", "message": "Invalid class format"}
 
-    connection = None
-    cursor = None
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         cursor.execute("SELECT * FROM personal_info WHERE user_id=%s", (user_id,))
         user = cursor.fetchone()
         if not user:
             cursor.execute("INSERT INTO student_data (school_id, user_id, password, point, validated) VALUES (%s, %s, %s, %s, %s)", (school_id, user_id, password, "0", "1"))
             cursor.execute("INSERT INTO personal_info (user_id, password, given_name, surname, age, school_id, intended_major, email, class) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
                        (user_id, password, given_name, surname, age, school_id, intended_major, email, classOf))
-            connection.commit()
+            db.commit()
+            # The identifiers may be cached as unknown from earlier lookups
+            invalidate_role(user_id, school_id)
+            student_index.add({"school_id": school_id, "given_name": given_name, "surname": surname,
+                               "email": email, "class": classOf})
             return {"status": "success", "message": "Account created successfully!"}
         else:
             return {"status": "error", "message": "Denied: Account already exists with this username."}
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 #== Registration END ===
 
 
 #== Post START ===
+REPLY_FETCH_CHUNK = 500
+
+def _fetch_replies_for_posts(connection, post_ids):
+    """Load replies for many posts with chunked IN queries instead of one query per post.
+    Returns {post_id: [reply rows ordered by upload_time]}; posts without replies map to [].
+    """
+    replies_by_post = {post_id: [] for post_id in post_ids}
+    if not post_ids:
+        return replies_by_post
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        for start in range(0, len(post_ids), REPLY_FETCH_CHUNK):
+            chunk = post_ids[start:start + REPLY_FETCH_CHUNK]
+            placeholders = ",".join(["%s"] * len(chunk))
+            cursor.execute(
+                f"SELECT * FROM reply WHERE parent_post_id IN ({placeholders}) ORDER BY upload_time ASC, reply_id ASC",
+                tuple(chunk))
+            for reply in cursor.fetchall():
+                replies_by_post.setdefault(reply["parent_post_id"], []).append(reply)
+    finally:
+        cursor.close()
+    return replies_by_post
+
+FEED_DEFAULT_LIMIT = 50
+FEED_MAX_LIMIT = 200
+
+def _encode_keyset_cursor(upload_time, row_id):
+    """Opaque keyset cursor for an (upload_time, id) position."""
+    raw = f"{upload_time.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def _encode_feed_cursor(post):
+    """Keyset cursor for the (upload_time, post_id) position of the last post on a page."""
+    return _encode_keyset_cursor(post["upload_time"], post["post_id"])
+
+def _decode_feed_cursor(token):
+    """Inverse of _encode_feed_cursor. Raises ValueError on malformed input."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        upload_time, post_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.fromisoformat(upload_time), int(post_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _clamp_feed_limit(limit):
+    return max(1, min(int(limit), FEED_MAX_LIMIT))
+
+def _fetch_post_page(cursor, conditions, params, limit, page_cursor=None, full=False):
+    """Run a post feed query ordered by (upload_time, post_id) DESC.
+    Pages are keyset based, so rows inserted after the first page never shift later pages.
+    Returns (posts, next_cursor); next_cursor is None on the last page or when full=True.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    if page_cursor and not full:
+        after_time, after_id = _decode_feed_cursor(page_cursor)
+        conditions.append("(upload_time < %s OR (upload_time = %s AND post_id < %s))")
+        params.extend([after_time, after_time, after_id])
+    query = "SELECT * FROM post"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY upload_time DESC, post_id DESC"
+    if full:
+        cursor.execute(query, tuple(params))
+        return cursor.fetchall(), None
+    limit = _clamp_feed_limit(limit)
+    # Fetch one extra row to learn whether another page exists
+    cursor.execute(query + " LIMIT %s", tuple(params) + (limit + 1,))
+    posts = cursor.fetchall()
+    if len(posts) > limit:
+        posts = posts[:limit]
+        return posts, _encode_feed_cursor(posts[-1])
+    return posts, None
+
+# Serialized feed pages as (etag, body), keyed by feed version so writes invalidate by bumping a counter.
+# Versions are per process, so the TTL bounds staleness across uvicorn workers.
+FEED_CACHE_TTL = 30
+feed_cache = TTLCache(maxsize=2048, ttl=FEED_CACHE_TTL, maxbytes=32 * 1024 * 1024, sizeof=lambda entry: len(entry[1]))
+_feed_versions = {}
+_feed_versions_lock = threading.Lock()
+_feeds_changed_at = 0.0
+_ALL_POSTS = "*"
+
+def _feed_version(category=_ALL_POSTS):
+    return _feed_versions.get(None, 0), _feed_versions.get(category, 0)
+
+def bump_feed_version(category=None):
+    """Invalidate cached feeds after a write to `category`, or every feed if the category is unknown."""
+    global _feeds_changed_at
+    with _feed_versions_lock:
+        _feeds_changed_at = time.monotonic()
+        if category is None:
+            _feed_versions[None] = _feed_versions.get(None, 0) + 1
+        else:
+            _feed_versions[_ALL_POSTS] = _feed_versions.get(_ALL_POSTS, 0) + 1
+            _feed_versions[category] = _feed_versions.get(category, 0) + 1
+
+def _content_changed(event_type, category, post_id=None, reply_id=None):
+    """Call after a committed post/reply write: invalidates cached feeds and notifies /events subscribers."""
+    bump_feed_version(category)
+    broadcaster.publish(event_type, category=category, post_id=post_id, reply_id=reply_id)
+
+# Denormalized counters (added by `python migrations.py counters`): post.reply_count holds the
+# validated replies of a post and author_stats.post_count the validated posts of an author;
+# author_stats.total_posts counts every post the author made, validated or not.
+# Writers adjust them in the same transaction as the change they describe.
+def _adjust_reply_counts(cursor, deltas):
+    """deltas: {post_id: change in validated replies}."""
+    rows = [(delta, post_id) for post_id, delta in deltas.items() if delta]
+    if rows:
+        cursor.executemany("UPDATE post SET reply_count = GREATEST(reply_count + %s, 0) WHERE post_id=%s", rows)
+
+def _adjust_post_counts(cursor, deltas, created=False):
+    """deltas: {author_id: change in validated posts}; created=True when the deltas are new posts."""
+    rows = [(author_id, max(delta, 0), delta if created else 0, delta, delta if created else 0)
+            for author_id, delta in deltas.items() if delta]
+    if rows:
+        cursor.executemany("INSERT INTO author_stats (author_id, post_count, total_posts) VALUES (%s, %s, %s) "
+                           "ON DUPLICATE KEY UPDATE post_count = GREATEST(post_count + %s, 0), "
+                           "total_posts = total_posts + %s", rows)
+
+# Optional group commit (WRITE_BATCHING=1): post_upload and post_reply queue their row and
+# the writer thread commits everything that arrived within a few ms in one transaction.
+write_batcher = GroupCommitWriter(get_connection)
+_auto_increment_step = None
+
+def _inserted_ids(connection, first_id, count):
+    """Ids of a multi-row INSERT. InnoDB hands a simple multi-row INSERT consecutive values
+    (spaced by auto_increment_increment) and lastrowid is the first of them."""
+    global _auto_increment_step
+    if _auto_increment_step is None:
+        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor.execute("SELECT @@auto_increment_increment AS step")
+        _auto_increment_step = int(cursor.fetchone()["step"])
+        cursor.close()
+    return [first_id + i * _auto_increment_step for i in range(count)]
+
+def _insert_posts(connection, rows):
+    """Group-commit flusher. rows: (upload_time, title, content, author_id, anonymous, category)."""
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute("INSERT INTO post (upload_time, title, content, author_id, anonymous, category, validated) "
+                       "VALUES " + ", ".join(["(%s, %s, %s, %s, %s, %s, 1)"] * len(rows)),
+                       [value for row in rows for value in row])
+        ids = _inserted_ids(connection, cursor.lastrowid, len(rows))
+        _adjust_post_counts(cursor, Counter(row[3] for row in rows), created=True)
+        # Nothing may fail after the commit: the writer retries a failed batch row by row
+        connection.commit()
+    finally:
+        cursor.close()
+    return ids
+
+def _insert_replies(connection, rows):
+    """Group-commit flusher. rows: (parent_post_id, author_id, upload_time, anonymous, content)."""
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute("INSERT INTO reply (parent_post_id, author_id, upload_time, anonymous, content, validated) "
+                       "VALUES " + ", ".join(["(%s, %s, %s, %s, %s, 1)"] * len(rows)),
+                       [value for row in rows for value in row])
+        ids = _inserted_ids(connection, cursor.lastrowid, len(rows))
+        _adjust_reply_counts(cursor, Counter(row[0] for row in rows))
+        # Nothing may fail after the commit: the writer retries a failed batch row by row
+        connection.commit()
+    finally:
+        cursor.close()
+    return ids
+
+write_batcher.register("post", _insert_posts)
+write_batcher.register("reply", _insert_replies)
+
+def _submit_write(kind, row):
+    """Queue one row for group commit and wait for its new id; raises the row's own error."""
+    future = write_batcher.submit(kind, row)
+    try:
+        return future.result(timeout=DB_REQUEST_TIMEOUT)
+    except FutureTimeout:
+        # Still queued rows are dropped; a row already being written will land anyway
+        future.cancel()
+        raise RuntimeError("Timed out waiting for the write queue")
+
+def _cached_feed(cache_key, if_none_match=None):
+    entry = feed_cache.get(cache_key)
+    if entry is None:
+        return None
+    etag, body = entry
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+def _json_response(payload, headers=None):
+    """Encode with the fast serializer instead of FastAPI's jsonable_encoder walk."""
+    return Response(content=dumps(payload), media_type="application/json", headers=headers)
+
+def _feed_response(payload, cache_key, db=None, if_none_match=None):
+    if cache_key is not None and db is not None and db.on_replica \
+            and time.monotonic() - _feeds_changed_at < DB_READ_YOUR_WRITES_WINDOW:
+        # The replica may not have the write that bumped the version yet; caching
+        # its answer would pin the stale page to the new version
+        cache_key = None
+    body = dumps(payload)
+    etag = _body_etag(body)
+    if cache_key is not None:
+        feed_cache.set(cache_key, (etag, body))
+    if _etag_matches(if_none_match, etag):
+        return _not_modified(etag)
+    return Response(content=body, media_type="application/json", headers={"ETag": etag})
+
+def _make_etag(*parts):
+    """Strong ETag derived from version data, never from the response body."""
+    return '"' + hashlib.sha1(repr(parts).encode()).hexdigest()[:24] + '"'
+
+# Feed versions live in this process only and miss writes made by other workers, so feed
+# ETags hash the body being served: an equal tag always means an identical page.
+def _body_etag(body):
+    return '"' + hashlib.sha1(body).hexdigest()[:24] + '"'
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+def _not_modified(etag):
+    return Response(status_code=304, headers={"ETag": etag})
+
 @app.post("/post-upload")
-async def post_upload(request: dict = Body(...)):
+@offload
+def post_upload(request: dict = Body(...), db: DBSession = Depends(get_db)):
     time = request.get("upload_time")
     title = request.get("title")
     content = request.get("content")
@@ -148,21 +632,27 @@ async def post_upload(request: dict = Body(...)):
     except Exception as e:
         return {"status": "error", "message": f"Invalid datetime format: {str(e)}"}
 
-    connection = None
-    cursor = None
+    limited = _rate_limited(post_rate_limiter, author_id)
+    if limited is not None:
+        return limited
+
+    db.for_user(*_identities(db, author_id))
+
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
-        cursor.execute("INSERT INTO post (upload_time, title, content, author_id, anonymous, category, validated) VALUES (%s, %s, %s, %s, %s, %s, %s)", (mysql_time, title, content, author_id, anonymous, category, 1))
-        connection.commit()
-        return {"status": "success", "message": "Post uploaded successfully!"}
+        if WRITE_BATCHING:
+            post_id = _submit_write("post", (mysql_time, title, content, author_id, anonymous, category))
+            db.note_write()
+        else:
+            cursor = db.cursor()
+            cursor.execute("INSERT INTO post (upload_time, title, content, author_id, anonymous, category, validated) VALUES (%s, %s, %s, %s, %s, %s, %s)", (mysql_time, title, content, author_id, anonymous, category, 1))
+            post_id = cursor.lastrowid
+            _adjust_post_counts(cursor, {author_id: 1}, created=True)
+            db.commit()
+        _content_changed("post_created", category, post_id=post_id)
+        post_index.add_post(post_id, title, content, category, 1)
+        return {"status": "success", "message": "Post uploaded successfully!", "post_id": post_id}
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 '''
 @app.get("/post-list")
@@ -198,141 +688,107 @@ async def post_list():
 '''
 
 @app.get("/post-list")
-async def post_list(requester_school_id: str = Query(None), show_pending: bool = Query(False)):
-    connection = None
-    cursor = None
+@offload
+def post_list(requester_school_id: str = Query(None), show_pending: bool = Query(False),
+                    limit: int = Query(FEED_DEFAULT_LIMIT), page_cursor: str = Query(None, alias="cursor"),
+                    full: bool = Query(False), include_replies: bool = Query(True),
+                    if_none_match: str = Header(None), session: dict = Depends(get_session),
+                    db: DBSession = Depends(get_read_db)):
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
         # Determine privilege (teacher/admin) once
-        if requester_school_id:
-            is_teacher, is_admin = _is_privileged(cursor, requester_school_id)
-        else:
-            is_teacher, is_admin = False, False
+        is_teacher, is_admin = _is_privileged(db, requester_school_id, session)
+        # Cached per visibility class since author masking differs for admins
+        cache_key = None
+        if not (full and is_admin):
+            # Clamp first so out-of-range limits share the entry of the page they actually get
+            limit = _clamp_feed_limit(limit)
+            cache_key = ("post-list", _feed_version(), is_admin, is_admin and show_pending, limit, page_cursor,
+                         include_replies)
+            cached = _cached_feed(cache_key, if_none_match)
+            if cached is not None:
+                return cached
+        cursor = db.cursor()
         # Only admins can view unvalidated (pending) content via show_pending
-        if is_admin:
-            if show_pending:
-                cursor.execute("SELECT * FROM post ORDER BY upload_time DESC")
-            else:
-                cursor.execute("SELECT * FROM post WHERE validated=1 ORDER BY upload_time DESC")
-        else:
-            cursor.execute("SELECT * FROM post WHERE validated=1 ORDER BY upload_time DESC")
-        posts = cursor.fetchall()
-        post_list = []
-        for post in posts:
-            # Fetch replies for this post
-            cursor2 = connection.cursor(dictionary=True, buffered=True)
-            cursor2.execute("SELECT * FROM reply WHERE parent_post_id = %s ORDER BY upload_time ASC", (post["post_id"],))
-            replies = cursor2.fetchall()
-            cursor2.close()
-            # Author display logic
-            if post["anonymous"]:
-                # Only admins see anonymous author (teachers no longer privileged)
-                display_author = post["author_id"] if is_admin else "Anonymous"
-            else:
-                display_author = post["author_id"]
-            # Replies author display logic
-            processed_replies = []
-            for reply in replies:
-                if reply["anonymous"]:
-                    reply_author = reply["author_id"] if is_admin else "Anonymous"
-                else:
-                    reply_author = reply["author_id"]
-                processed_replies.append({
-                    "reply_id": reply["reply_id"],
-                    "parent_post_id": reply["parent_post_id"],
-                    "author_id": reply_author,
-                    "upload_time": reply["upload_time"],
-                    "anonymous": reply["anonymous"],
-                    "content": reply["content"],
-                    "validated": reply.get("validated", 1)
-                })
-            post_list.append({
-                "post_id": post["post_id"],
-                "upload_time": post["upload_time"],
-                "content": post["content"],
-                "author_id": display_author,
-                "anonymous": post["anonymous"],
-                "category": post["category"],
-                "title": post["title"],
-                "validated": post["validated"],
-                "replies": processed_replies
-            })
-        return {"status": "success", "posts": post_list}
+        conditions = [] if (is_admin and show_pending) else ["validated=1"]
+        # Full (unpaginated) dump is an admin-only opt-in
+        try:
+            posts, next_cursor = _fetch_post_page(cursor, conditions, [], limit, page_cursor, full=full and is_admin)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        # Fetch replies for the whole page of posts at once, unless the caller only needs reply_count
+        replies_by_post = {}
+        if include_replies:
+            replies_by_post = _fetch_replies_for_posts(db.connection, [post["post_id"] for post in posts])
+        # Author masking is applied once per row while building the response records
+        post_list = [post_record(post, is_admin, replies_by_post.get(post["post_id"], []) if include_replies else None)
+                     for post in posts]
+        return _feed_response({"status": "success", "posts": post_list, "next_cursor": next_cursor}, cache_key, db,
+                              if_none_match)
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
 @app.get("/get-post-replies")
-async def get_post_replies(post_id: int, requester_school_id: str = Query(None)):
-    connection = None
-    cursor = None
+@offload
+def get_post_replies(post_id: int, requester_school_id: str = Query(None),
+                     if_none_match: str = Header(None), session: dict = Depends(get_session),
+                     db: DBSession = Depends(get_read_db)):
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         # Check if requester is privileged (teacher/admin)
-        if requester_school_id:
-            is_teacher, is_admin = _is_privileged(cursor, requester_school_id)
-        else:
-            is_teacher, is_admin = False, False
+        is_teacher, is_admin = _is_privileged(db, requester_school_id, session)
         # Only admins are treated as privileged for anonymity now
         is_privileged = is_admin
-        # First check if the post exists
-        cursor.execute("SELECT post_id FROM post WHERE post_id=%s", (post_id,))
-        post = cursor.fetchone()
-        if not post:
+        # Check the post exists and read its reply version in one aggregate query.
+        # Replies are never deleted or edited, so count, max id and the sum of validated
+        # ids change whenever a reply is added, blocked or validated.
+        cursor.execute("SELECT COUNT(r.reply_id) AS reply_count, MAX(r.reply_id) AS max_reply_id, "
+                       "SUM(r.reply_id * r.validated) AS validated_sum "
+                       "FROM post p LEFT JOIN reply r ON r.parent_post_id = p.post_id "
+                       "WHERE p.post_id=%s GROUP BY p.post_id", (post_id,))
+        version = cursor.fetchone()
+        if not version:
             return {"status": "error", "message": "Post not found"}
+        etag = _make_etag("replies", post_id, version["reply_count"], version["max_reply_id"],
+                          str(version["validated_sum"]), is_privileged)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
         # Get all replies for this post from the reply table
         cursor.execute("SELECT * FROM reply WHERE parent_post_id=%s ORDER BY upload_time ASC", (post_id,))
         replies = cursor.fetchall()
-        reply_list = []
-        for reply in replies:
-            if reply["anonymous"]:
-                display_author = reply["author_id"] if is_privileged else "Anonymous"
-            else:
-                display_author = reply["author_id"]
-            reply_list.append({
-                "reply_id": reply["reply_id"],
-                "parent_post_id": reply["parent_post_id"],
-                "author_id": display_author,
-                "upload_time": reply["upload_time"],
-                "anonymous": reply["anonymous"],
-                "content": reply["content"],
-                "validated": reply.get("validated", 1)
-            })
-        return {"status": "success", "replies": reply_list}
+        reply_list = [reply_record(reply, is_privileged) for reply in replies]
+        return _json_response({"status": "success", "replies": reply_list}, headers={"ETag": etag})
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 @app.post("/my-post-list")
-async def my_post_list(request: dict = Body(...)):
+@offload
+def my_post_list(request: dict = Body(...), session: dict = Depends(get_session), db: DBSession = Depends(get_read_db)):
     author = request.get("author_id")
     if not author:
         return {"status": "error", "message": "author_id is required"}
+    limit = request.get("limit") or FEED_DEFAULT_LIMIT
+    page_cursor = request.get("cursor")
+    include_replies = request.get("include_replies", True)
+    requester_school_id = request.get("requester_school_id")
 
-    connection = None
-    cursor = None
+    # Authors looking at their own list right after posting must be served by the primary
+    db.for_user(author, requester_school_id)
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
-        cursor.execute("SELECT * FROM post WHERE author_id=%s ", (author,))
-        my_posts = cursor.fetchall()
+        cursor = db.cursor()
+        # Full (unpaginated) dump is an admin-only opt-in
+        full = False
+        if request.get("full"):
+            _is_teacher, full = _is_privileged(db, requester_school_id, session)
+        try:
+            my_posts, next_cursor = _fetch_post_page(cursor, ["author_id=%s"], [author], limit, page_cursor, full=full)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        replies_by_post = {}
+        if include_replies:
+            replies_by_post = _fetch_replies_for_posts(db.connection, [post["post_id"] for post in my_posts])
         my_post_list = []
         for post in my_posts:
-            cursor2 = connection.cursor(dictionary=True, buffered=True)
-            cursor2.execute("SELECT * FROM reply WHERE parent_post_id = %s ORDER BY upload_time ASC", (post["post_id"],))
-            replies = cursor2.fetchall()
-            cursor2.close()
-            my_post_list.append({
+            post_item = {
                 "post_id": post["post_id"],
                 "upload_time": post["upload_time"],
                 "content": post["content"],
@@ -341,16 +797,14 @@ async def my_post_list(request: dict = Body(...)):
                 "category": post["category"],
                 "title": post["title"],
                 "validated": post["validated"],
-                "replies": replies
-            })
-        return {"status": "success", "posts": my_post_list}
+                "reply_count": post.get("reply_count", 0),
+            }
+            if include_replies:
+                post_item["replies"] = replies_by_post.get(post["post_id"], [])
+            my_post_list.append(post_item)
+        return _json_response({"status": "success", "posts": my_post_list, "next_cursor": next_cursor})
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 '''
 @app.post("/my-post-list")
@@ -422,75 +876,93 @@ async def post_by_category(category: str):
 '''
 
 @app.get("/post-by-category")
-async def post_by_category(category: str, requester_school_id: str = Query(None), show_pending: bool = Query(False)):
-    connection = None
-    cursor = None
+@offload
+def post_by_category(category: str, requester_school_id: str = Query(None), show_pending: bool = Query(False),
+                           limit: int = Query(FEED_DEFAULT_LIMIT), page_cursor: str = Query(None, alias="cursor"),
+                           full: bool = Query(False), include_replies: bool = Query(True),
+                           if_none_match: str = Header(None), session: dict = Depends(get_session),
+                           db: DBSession = Depends(get_read_db)):
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
         # Only admins can see unvalidated posts now
-        if requester_school_id:
-            _is_teacher, is_admin = _is_privileged(cursor, requester_school_id)
-        else:
-            _is_teacher, is_admin = False, False
-        if is_admin:
-            if show_pending:
-                cursor.execute("SELECT * FROM post WHERE category=%s", (category,))
-            else:
-                cursor.execute("SELECT * FROM post WHERE category=%s AND validated=1", (category,))
-        else:
-            cursor.execute("SELECT * FROM post WHERE category=%s AND validated=1", (category,))
-        posts = cursor.fetchall()
-        post_list = []
-        for post in posts:
-            # Fetch replies for this post
-            cursor2 = connection.cursor(dictionary=True, buffered=True)
-            cursor2.execute("SELECT * FROM reply WHERE parent_post_id = %s ORDER BY upload_time ASC", (post["post_id"],))
-            replies = cursor2.fetchall()
-            cursor2.close()
-            # Author display logic
-            if post["anonymous"]:
-                display_author = post["author_id"] if is_admin else "Anonymous"
-            else:
-                display_author = post["author_id"]
-            # Replies author display logic
-            processed_replies = []
-            for reply in replies:
-                if reply["anonymous"]:
-                    reply_author = reply["author_id"] if is_admin else "Anonymous"
-                else:
-                    reply_author = reply["author_id"]
-                processed_replies.append({
-                    "reply_id": reply["reply_id"],
-                    "parent_post_id": reply["parent_post_id"],
-                    "author_id": reply_author,
-                    "upload_time": reply["upload_time"],
-                    "anonymous": reply["anonymous"],
-                    "content": reply["content"]
-                })
-            post_list.append({
-                "post_id": post["post_id"],
-                "upload_time": post["upload_time"],
-                "content": post["content"],
-                "title": post["title"],
-                "author_id": display_author,
-                "anonymous": post["anonymous"],
-                "validated": post["validated"],
-                "category": post["category"],
-                "replies": processed_replies
-            })
-        return {"status": "success", "posts": post_list}
+        _is_teacher, is_admin = _is_privileged(db, requester_school_id, session)
+        cache_key = None
+        if not (full and is_admin):
+            limit = _clamp_feed_limit(limit)
+            cache_key = ("post-by-category", category, _feed_version(category), is_admin,
+                         is_admin and show_pending, limit, page_cursor, include_replies)
+            cached = _cached_feed(cache_key, if_none_match)
+            if cached is not None:
+                return cached
+        cursor = db.cursor()
+        conditions = ["category=%s"]
+        if not (is_admin and show_pending):
+            conditions.append("validated=1")
+        try:
+            posts, next_cursor = _fetch_post_page(cursor, conditions, [category], limit, page_cursor, full=full and is_admin)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        # Fetch replies for the whole page of posts at once, unless the caller only needs reply_count
+        replies_by_post = {}
+        if include_replies:
+            replies_by_post = _fetch_replies_for_posts(db.connection, [post["post_id"] for post in posts])
+        # Author masking is applied once per row while building the response records
+        post_list = [post_record(post, is_admin, replies_by_post.get(post["post_id"], []) if include_replies else None)
+                     for post in posts]
+        return _feed_response({"status": "success", "posts": post_list, "next_cursor": next_cursor}, cache_key, db,
+                              if_none_match)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+POST_COUNTS_MAX_CATEGORIES = 100
+
+@app.get("/post-counts")
+@offload
+def post_counts(category: list[str] = Query(...), requester_school_id: str = Query(None),
+                show_pending: bool = Query(False), session: dict = Depends(get_session),
+                db: DBSession = Depends(get_read_db)):
+    """Visible post totals for several categories in one query (?category=A&category=B),
+    so pickers don't walk every feed page to count it."""
+    if len(category) > POST_COUNTS_MAX_CATEGORIES:
+        return {"status": "error", "message": f"At most {POST_COUNTS_MAX_CATEGORIES} categories per request"}
+    try:
+        _is_teacher, is_admin = _is_privileged(db, requester_school_id, session)
+        cursor = db.cursor()
+        placeholders = ",".join(["%s"] * len(category))
+        # Same visibility as post_by_category: only admins can count pending posts
+        visibility = "" if (is_admin and show_pending) else " AND validated=1"
+        cursor.execute(f"SELECT category, COUNT(*) AS posts FROM post WHERE category IN ({placeholders}){visibility} "
+                       "GROUP BY category", tuple(category))
+        counts = dict.fromkeys(category, 0)
+        counts.update({row["category"]: row["posts"] for row in cursor.fetchall()})
+        return {"status": "success", "counts": counts}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/author-post-stats")
+@offload
+def author_post_stats(author_id: str, requester_school_id: str = Query(None), db: DBSession = Depends(get_read_db)):
+    """Totals over every post of an author (pending included, as in /my-post-list): posts,
+    replies received and posts per category, from one aggregate over the author's rows."""
+    # Authors looking at their own stats right after posting must be served by the primary
+    db.for_user(author_id, requester_school_id)
+    try:
+        cursor = db.cursor()
+        cursor.execute("SELECT category, COUNT(*) AS posts, COALESCE(SUM(reply_count), 0) AS replies "
+                       "FROM post WHERE author_id=%s GROUP BY category", (author_id,))
+        rows = cursor.fetchall()
+        return {
+            "status": "success",
+            "post_count": sum(int(row["posts"]) for row in rows),
+            "replies_received": sum(int(row["replies"]) for row in rows),
+            "categories": {row["category"]: int(row["posts"]) for row in rows},
+        }
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 
 @app.post("/post-reply")
-async def post_reply(request: dict = Body(...)):
+@offload
+def post_reply(request: dict = Body(...), db: DBSession = Depends(get_db)):
     time = request.get("upload_time")
     parent_post_id = request.get("parent_post_id")
     content = request.get("content")
@@ -508,59 +980,58 @@ async def post_reply(request: dict = Body(...)):
     except Exception as e:
         return {"status": "error", "message": f"Invalid datetime format: {str(e)}"}
 
-    connection = None
-    cursor = None
+    limited = _rate_limited(reply_rate_limiter, author)
+    if limited is not None:
+        return limited
+
+    db.for_user(*_identities(db, author))
+
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
 
         # First check if the parent post exists
-        cursor.execute("SELECT post_id FROM post WHERE post_id=%s", (parent_post_id,))
+        cursor.execute("SELECT post_id, category FROM post WHERE post_id=%s", (parent_post_id,))
         parent_post = cursor.fetchone()
 
         if not parent_post:
             return {"status": "error", "message": "Parent post not found"}
 
         # Insert the reply into the reply table
-        cursor.execute("INSERT INTO reply (parent_post_id, author_id, upload_time, anonymous, content) VALUES (%s, %s, %s, %s, %s)",
-                      (parent_post_id, author, mysql_time, anonymous, content))
+        if WRITE_BATCHING:
+            reply_id = _submit_write("reply", (parent_post["post_id"], author, mysql_time, anonymous, content))
+            db.note_write()
+        else:
+            cursor.execute("INSERT INTO reply (parent_post_id, author_id, upload_time, anonymous, content, validated) VALUES (%s, %s, %s, %s, %s, %s)",
+                          (parent_post_id, author, mysql_time, anonymous, content, 1))
+            reply_id = cursor.lastrowid
+            _adjust_reply_counts(cursor, {parent_post["post_id"]: 1})
 
-        connection.commit()
-        return {"status": "success", "message": "Reply posted successfully!"}
+            db.commit()
+        _content_changed("reply_created", parent_post["category"], post_id=parent_post["post_id"], reply_id=reply_id)
+        post_index.add_reply(reply_id, parent_post["post_id"], content, 1)
+        return {"status": "success", "message": "Reply posted successfully!", "reply_id": reply_id}
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.get("/get-post")
-async def get_post(post_id: int, requester_school_id: str = Query(None)):
-    connection = None
-    cursor = None
+@offload
+def get_post(post_id: int, response: Response, requester_school_id: str = Query(None),
+             if_none_match: str = Header(None), session: dict = Depends(get_session),
+             db: DBSession = Depends(get_read_db)):
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
-        # Get the post first
-        cursor.execute("SELECT * FROM post WHERE post_id=%s", (post_id,))
+        cursor = db.cursor()
+        # Read only the version columns first; the body is fetched when the ETag misses
+        cursor.execute("SELECT post_id, validated, author_id, reply_count FROM post WHERE post_id=%s", (post_id,))
         post = cursor.fetchone()
         if not post:
             return {"status": "error", "message": "Post not found"}
-        # Determine privilege (teacher/admin) using helper
-        if requester_school_id:
-            _is_teacher, is_admin = _is_privileged(cursor, requester_school_id)
-        else:
-            _is_teacher, is_admin = False, False
-        # Get the requester's user_id if they exist
-        requester_user_id = None
+        # Determine privilege (teacher/admin) and the requester's user_id using the cached resolver
+        is_admin = False
         is_author = False
-        if requester_school_id:
-            cursor.execute("SELECT user_id FROM personal_info WHERE school_id=%s", (requester_school_id,))
-            requester_info = cursor.fetchone()
-            if requester_info:
-                requester_user_id = requester_info["user_id"]
-                is_author = requester_user_id == post["author_id"]
+        role = _requester_role(db, requester_school_id, session)
+        if role is not None:
+            is_admin = role["is_admin"]
+            is_author = role["user_id"] is not None and role["user_id"] == post["author_id"]
         # SIMPLIFIED ACCESS CONTROL:
         # Privileged users (teacher/admin) can see everything
         # Access rules:
@@ -573,6 +1044,15 @@ async def get_post(post_id: int, requester_school_id: str = Query(None)):
             pass
         else:
             return {"status": "error", "message": "Post not found"}
+        # Posts are immutable apart from moderation state and the reply counter shown in the body
+        etag = _make_etag("post", post_id, post["validated"], post["reply_count"], is_admin)
+        if _etag_matches(if_none_match, etag):
+            return _not_modified(etag)
+        cursor.execute("SELECT * FROM post WHERE post_id=%s", (post_id,))
+        post = cursor.fetchone()
+        if not post:
+            return {"status": "error", "message": "Post not found"}
+        response.headers["ETag"] = etag
         # For privileged (teacher/admin), show real author even if anonymous
         if post["anonymous"]:
             display_author = post["author_id"] if is_admin else "Anonymous"
@@ -588,24 +1068,161 @@ async def get_post(post_id: int, requester_school_id: str = Query(None)):
             "validated": post["validated"],
             "category": post["category"],
             "author_id": display_author,
+            "reply_count": post.get("reply_count", 0),
         }
         return {"status": "success", "post": post_data, "is_admin": is_admin}
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+# Posts are searched through an in-memory BM25 index over titles, bodies and validated replies.
+# It is loaded on first use, kept current by the post/reply write and moderation handlers and
+# rebuilt in the background every POST_INDEX_REFRESH seconds to pick up other workers' writes.
+POST_INDEX_REFRESH = 600
+POST_SEARCH_DEFAULT_LIMIT = 20
+POST_SEARCH_MAX_LIMIT = 100
+post_index = PostIndex()
+_post_index_lock = threading.Lock()
+_post_index_refreshing = False
+
+def _load_post_index(db):
+    cursor = db.cursor()
+    cursor.execute("SELECT post_id, title, content, category, validated FROM post")
+    posts = cursor.fetchall()
+    cursor.execute("SELECT reply_id, parent_post_id, content, validated FROM reply")
+    replies = cursor.fetchall()
+    index = PostIndex()
+    index.build(posts, replies, built_at=time.monotonic())
+    return index
+
+def _refresh_post_index():
+    global post_index, _post_index_refreshing
+    session = DBSession()
+    try:
+        post_index = _load_post_index(session)
+    except Exception:
+        pass
     finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+        session.close()
+        _post_index_refreshing = False
+
+def _ensure_post_index(db):
+    global post_index, _post_index_refreshing
+    if post_index.built_at is None:
+        with _post_index_lock:
+            if post_index.built_at is None:
+                post_index = _load_post_index(db)
+    elif time.monotonic() - post_index.built_at > POST_INDEX_REFRESH:
+        with _post_index_lock:
+            if _post_index_refreshing:
+                return
+            _post_index_refreshing = True
+        threading.Thread(target=_refresh_post_index, daemon=True).start()
+
+def _decode_offset_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        offset = int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+def _encode_offset_cursor(offset):
+    return base64.urlsafe_b64encode(str(offset).encode()).decode().rstrip("=")
+
+@app.get("/search-posts")
+@offload
+def search_posts(q: str, category: str = Query(None), requester_school_id: str = Query(None),
+                 show_pending: bool = Query(False), limit: int = Query(POST_SEARCH_DEFAULT_LIMIT),
+                 page_cursor: str = Query(None, alias="cursor"), session: dict = Depends(get_session),
+                 db: DBSession = Depends(get_read_db)):
+    try:
+        if not q.strip():
+            return {"status": "error", "message": "Please provide search terms"}
+        is_teacher, is_admin = _is_privileged(db, requester_school_id, session)
+        # Same visibility as post_list: only admins can include pending posts
+        include_pending = is_admin and show_pending
+        limit = max(1, min(int(limit), POST_SEARCH_MAX_LIMIT))
+        try:
+            offset = _decode_offset_cursor(page_cursor) if page_cursor else 0
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        _ensure_post_index(db)
+        cursor = db.cursor()
+        # The DB row is authoritative in case another worker moderated a post since the last rebuild.
+        # Hidden hits are dropped before paging: keep reading hits until `limit` posts survive, and
+        # make the cursor the offset of the first hit not yet consumed.
+        post_list, has_more = [], True
+        while has_more and len(post_list) < limit:
+            hits, has_more = post_index.search(q, limit=limit - len(post_list), offset=offset, category=category,
+                                               include_pending=include_pending)
+            if not hits:
+                break
+            offset += len(hits)
+            placeholders = ",".join(["%s"] * len(hits))
+            cursor.execute(f"SELECT * FROM post WHERE post_id IN ({placeholders})",
+                           tuple(post_id for post_id, _ in hits))
+            rows = {post["post_id"]: post for post in cursor.fetchall()}
+            for post_id, score in hits:
+                post = rows.get(post_id)
+                if post is None or (post["validated"] != 1 and not include_pending):
+                    continue
+                record = post_record(post, is_admin)
+                record["score"] = round(score, 4)
+                post_list.append(record)
+        next_cursor = _encode_offset_cursor(offset) if has_more else None
+        return _json_response({"status": "success", "posts": post_list, "next_cursor": next_cursor})
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+#== Live Events START ===
+EVENTS_HEARTBEAT_SECONDS = 15
+
+@app.get("/events")
+async def events(request: Request, category: str = Query(None), post_id: int = Query(None),
+                 last_event_id: int = Header(None)):
+    """Server-Sent Events stream of new posts, replies and moderation changes.
+    Events carry only ids, type, category and timestamp; clients fetch content they care about.
+    """
+    subscriber = broadcaster.subscribe(category=category, post_id=post_id, last_event_id=last_event_id)
+
+    async def stream():
+        try:
+            yield f"retry: {EVENTS_HEARTBEAT_SECONDS * 1000}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), EVENTS_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+                    continue
+                if event is None:
+                    # Evicted for falling behind; the client reconnects with Last-Event-ID
+                    break
+                yield f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broadcaster.unsubscribe(subscriber)
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/write-batcher/stats")
+async def write_batcher_stats():
+    return {"status": "success", "stats": write_batcher.stats()}
+
+@app.get("/events/stats")
+async def events_stats():
+    return {"status": "success", "stats": broadcaster.stats()}
+#== Live Events END ===
 
 #== Teacher Exclusive START ===
 @app.post("/login-check-teacher")
-async def login_check_teacher(username=Body("user_id"), password=Body("password")):
-    connection = None
-    cursor = None
+@offload
+def login_check_teacher(username=Body("user_id"), password=Body("password"), db: DBSession = Depends(get_db)):
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         # Step 1: Find user in personal_info
         cursor.execute("SELECT * FROM personal_info WHERE user_id=%s AND password=%s", (username, password))
         user = cursor.fetchone()
@@ -615,49 +1232,52 @@ async def login_check_teacher(username=Body("user_id"), password=Body("password"
         if not school_id:
             return {"status": "error", "message": "No school_id found for this user"}
         # Step 2: Check if school_id exists in teacher_data
-        cursor.execute("SELECT * FROM teacher_data WHERE teacher_id=%s", (school_id,))
-        teacher = cursor.fetchone()
-        if teacher:
+        role = _resolve_role(db, school_id)
+        if role["is_teacher"]:
             # Remove password from response for security
             if 'password' in user:
                 del user['password']
             user['is_teacher'] = True
-            return {"status": "success", "message": "Login successful", "user": user}
+            return _session_response(user, role)
         else:
             return {"status": "error", "message": "Not a teacher account"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+
+def _fetch_class_members(cursor, class_ids):
+    """Return {class_id: [school_id, ...]} from class_membership in one query."""
+    members_by_class = {class_id: [] for class_id in class_ids}
+    if not class_ids:
+        return members_by_class
+    placeholders = ",".join(["%s"] * len(class_ids))
+    cursor.execute(f"SELECT class_id, school_id FROM class_membership WHERE class_id IN ({placeholders}) "
+                   "ORDER BY added_at ASC, school_id ASC", tuple(class_ids))
+    for row in cursor.fetchall():
+        members_by_class.setdefault(row["class_id"], []).append(str(row["school_id"]))
+    return members_by_class
 
 @app.get("/get-classes")
-async def get_classes(school_id: str = Query(...)):
-    connection = None
-    cursor = None
+@offload
+def get_classes(school_id: str = Query(...), db: DBSession = Depends(get_read_db)):
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         
         # First check if this school_id exists in teacher_data (verify it's a teacher)
-        cursor.execute("SELECT teacher_id FROM teacher_data WHERE teacher_id=%s", (school_id,))
-        teacher = cursor.fetchone()
-        
-        if not teacher:
+        if not _resolve_role(db, school_id)["is_teacher"]:
             return {"status": "error", "message": "Access denied: Not a teacher account", "is_teacher": False}
         
         # If it's a valid teacher, get all classes where creator_id matches the school_id
-        cursor.execute("SELECT * FROM classes WHERE creator_id=%s", (school_id,))
+        cursor.execute("SELECT class_id, creator_id, name FROM classes WHERE creator_id=%s", (school_id,))
         classes = cursor.fetchall()
+        members_by_class = _fetch_class_members(cursor, [class_item["class_id"] for class_item in classes])
         
         class_list = []
         for class_item in classes:
             class_list.append({
                 "class_id": class_item["class_id"],
                 "creator_id": class_item["creator_id"], 
-                "students": class_item["students"],
+                # Same comma-separated shape the frontend has always received
+                "students": ",".join(members_by_class.get(class_item["class_id"], [])),
                 "name": class_item["name"]
             })
         
@@ -665,19 +1285,12 @@ async def get_classes(school_id: str = Query(...)):
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.get("/get-student-info")
-async def get_student_info(school_id: str):
-    connection = None
-    cursor = None
+@offload
+def get_student_info(school_id: str, db: DBSession = Depends(get_read_db)):
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         
         # Get student personal info from personal_info table
         cursor.execute("SELECT given_name, surname, user_id, school_id FROM personal_info WHERE school_id=%s", (school_id,))
@@ -690,50 +1303,79 @@ async def get_student_info(school_id: str):
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.get("/get-student-post-count")
-async def get_student_post_count(author_id: str):
-    connection = None
-    cursor = None
+@offload
+def get_student_post_count(author_id: str, db: DBSession = Depends(get_read_db)):
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         
-        # Count posts by this student
-        cursor.execute("SELECT COUNT(*) as post_count FROM post WHERE author_id=%s", (author_id,))
+        # post_count is every post by this student, as before the counters existed;
+        # validated_post_count leaves out blocked and pending ones. Both are kept up to date on write.
+        cursor.execute("SELECT post_count, total_posts FROM author_stats WHERE author_id=%s", (author_id,))
         result = cursor.fetchone()
         
-        post_count = result["post_count"] if result else 0
+        post_count = result["total_posts"] if result else 0
+        validated_post_count = result["post_count"] if result else 0
         
-        return {"status": "success", "post_count": post_count}
+        return {"status": "success", "post_count": post_count, "validated_post_count": validated_post_count}
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+# Student names are searched in memory; the index is loaded on first use, updated by /sign-up
+# and rebuilt in the background every STUDENT_INDEX_REFRESH seconds to pick up changes
+# made by other workers or directly in the DB.
+STUDENT_INDEX_REFRESH = 300
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+student_index = NameIndex()
+_student_index_lock = threading.Lock()
+_student_index_refreshing = False
+
+def _load_student_index(db):
+    cursor = db.cursor()
+    cursor.execute("SELECT p.school_id, p.given_name, p.surname, p.email, p.class FROM personal_info p "
+                   "INNER JOIN student_data s ON p.school_id = s.school_id")
+    index = NameIndex()
+    index.build(cursor.fetchall(), built_at=time.monotonic())
+    return index
+
+def _refresh_student_index():
+    global student_index, _student_index_refreshing
+    session = DBSession()
+    try:
+        student_index = _load_student_index(session)
+    except Exception:
+        pass
     finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+        session.close()
+        _student_index_refreshing = False
+
+def _ensure_student_index(db):
+    global student_index, _student_index_refreshing
+    if student_index.built_at is None:
+        with _student_index_lock:
+            if student_index.built_at is None:
+                student_index = _load_student_index(db)
+    elif time.monotonic() - student_index.built_at > STUDENT_INDEX_REFRESH:
+        with _student_index_lock:
+            if _student_index_refreshing:
+                return
+            _student_index_refreshing = True
+        threading.Thread(target=_refresh_student_index, daemon=True).start()
 
 @app.get("/search-students")
-async def search_students(name: str):
-    connection = None
-    cursor = None
+@offload
+def search_students(name: str, limit: int = Query(SEARCH_DEFAULT_LIMIT), db: DBSession = Depends(get_read_db)):
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
-        
         query_term = name.strip()
         if not query_term:
             return {"status": "error", "message": "Please provide a name or student ID to search"}
         
         # Check if the query is a number (school_id search)
         if query_term.isdigit():
+            cursor = db.cursor()
             # First check if this school_id exists in student_data (to verify it's a student)
             cursor.execute("SELECT school_id FROM student_data WHERE school_id=%s", (query_term,))
             student_exists = cursor.fetchone()
@@ -745,162 +1387,211 @@ async def search_students(name: str):
             cursor.execute("SELECT school_id, given_name, surname, email, class FROM personal_info WHERE school_id=%s", (query_term,))
             students = cursor.fetchall()
         else:
-            # Search by name - split the name into parts for flexible searching
-            name_parts = query_term.split()
-            search_conditions = []
-            params = []
-            
-            if len(name_parts) == 1:
-                # Single name - search in both given_name and surname
-                search_conditions.append("(given_name LIKE %s OR surname LIKE %s)")
-                params.extend([f"%{name_parts[0]}%", f"%{name_parts[0]}%"])
-            else:
-                # Multiple parts - search various combinations
-                first_name = name_parts[0]
-                last_name = " ".join(name_parts[1:])
-                search_conditions.append("(given_name LIKE %s AND surname LIKE %s)")
-                params.extend([f"%{first_name}%", f"%{last_name}%"])
-                
-                # Also try reversed order
-                search_conditions.append("(given_name LIKE %s AND surname LIKE %s)")
-                params.extend([f"%{last_name}%", f"%{first_name}%"])
-            
-            # Only search for students (those who exist in student_data)
-            query = f"""
-            SELECT p.school_id, p.given_name, p.surname, p.email, p.class 
-            FROM personal_info p 
-            INNER JOIN student_data s ON p.school_id = s.school_id 
-            WHERE {' OR '.join(search_conditions)}
-            """
-            cursor.execute(query, params)
-            students = cursor.fetchall()
+            # Search by name: ranked prefix / substring / typo-tolerant match from the in-memory index
+            _ensure_student_index(db)
+            limit = max(1, min(int(limit), SEARCH_MAX_LIMIT))
+            students = student_index.search(query_term, limit=limit)
         
         return {"status": "success", "students": students}
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.post("/add-student-to-class")
-async def add_student_to_class(request: dict = Body(...)):
+@offload
+def add_student_to_class(request: dict = Body(...), db: DBSession = Depends(get_db)):
     class_id = request.get("class_id")
     school_id = request.get("school_id")
     
     if not class_id or not school_id:
         return {"status": "error", "message": "class_id and school_id are required"}
     
-    connection = None
-    cursor = None
+    db.for_user(school_id)
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         
-        # Get current students list
-        cursor.execute("SELECT students FROM classes WHERE class_id=%s", (class_id,))
+        cursor.execute("SELECT class_id, creator_id FROM classes WHERE class_id=%s", (class_id,))
         class_data = cursor.fetchone()
         
         if not class_data:
             return {"status": "error", "message": "Class not found"}
+        # The teacher reads the roster back through get-classes?school_id=<teacher>
+        db.for_user(*_identities(db, class_data["creator_id"]))
         
-        current_students = class_data["students"] or ""
-        student_ids = [id.strip() for id in current_students.split(",") if id.strip()]
-        
-        # Convert school_id to string to ensure consistency
-        school_id_str = str(school_id)
-        
-        # Check if student is already in the class
-        if school_id_str in student_ids:
+        # The (class_id, school_id) primary key makes this a single atomic check-and-insert,
+        # so concurrent edits to the same class can't overwrite each other
+        cursor.execute("INSERT IGNORE INTO class_membership (class_id, school_id) VALUES (%s, %s)",
+                       (class_id, str(school_id)))
+        if cursor.rowcount == 0:
             return {"status": "error", "message": "Student is already in this class"}
-        
-        # Add the new student
-        student_ids.append(school_id_str)
-        updated_students = ",".join(student_ids)
-        
-        # Update the class
-        cursor.execute("UPDATE classes SET students=%s WHERE class_id=%s", (updated_students, class_id))
-        connection.commit()
+        db.commit()
         
         return {"status": "success", "message": "Student added to class successfully"}
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.post("/remove-student-from-class")
-async def remove_student_from_class(request: dict = Body(...)):
+@offload
+def remove_student_from_class(request: dict = Body(...), db: DBSession = Depends(get_db)):
     class_id = request.get("class_id")
     school_id = request.get("school_id")
     
     if not class_id or not school_id:
         return {"status": "error", "message": "class_id and school_id are required"}
     
-    connection = None
-    cursor = None
+    db.for_user(school_id)
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         
-        # Get current students list
-        cursor.execute("SELECT students FROM classes WHERE class_id=%s", (class_id,))
+        cursor.execute("SELECT class_id, creator_id FROM classes WHERE class_id=%s", (class_id,))
         class_data = cursor.fetchone()
         
         if not class_data:
             return {"status": "error", "message": "Class not found"}
+        # The teacher reads the roster back through get-classes?school_id=<teacher>
+        db.for_user(*_identities(db, class_data["creator_id"]))
         
-        current_students = class_data["students"] or ""
-        student_ids = [id.strip() for id in current_students.split(",") if id.strip()]
-        
-        # Convert school_id to string to ensure consistency
-        school_id_str = str(school_id)
-        
-        # Check if student is in the class
-        if school_id_str not in student_ids:
+        cursor.execute("DELETE FROM class_membership WHERE class_id=%s AND school_id=%s", (class_id, str(school_id)))
+        if cursor.rowcount == 0:
             return {"status": "error", "message": "Student is not in this class"}
-        
-        # Remove the student
-        student_ids.remove(school_id_str)
-        updated_students = ",".join(student_ids)
-        
-        # Update the class
-        cursor.execute("UPDATE classes SET students=%s WHERE class_id=%s", (updated_students, class_id))
-        connection.commit()
+        db.commit()
         
         return {"status": "success", "message": "Student removed from class successfully"}
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+
+ROSTER_BULK_MAX_IDS = 5000
+ROSTER_IN_CHUNK = 1000
+
+def _select_existing_ids(cursor, query_prefix, params, ids):
+    """Run `query_prefix IN (...)` over ids in bounded chunks; returns the set of school_ids found."""
+    found = set()
+    for start in range(0, len(ids), ROSTER_IN_CHUNK):
+        chunk = ids[start:start + ROSTER_IN_CHUNK]
+        placeholders = ",".join(["%s"] * len(chunk))
+        cursor.execute(f"{query_prefix} IN ({placeholders})", tuple(params) + tuple(chunk))
+        found.update(str(row["school_id"]) for row in cursor.fetchall())
+    return found
+
+def _normalize_ids(values):
+    """Stringify, strip and de-duplicate ids while keeping request order."""
+    ids = []
+    seen = set()
+    for value in values or []:
+        value = str(value).strip()
+        if value and value not in seen:
+            seen.add(value)
+            ids.append(value)
+    return ids
+
+@app.post("/class-roster/bulk")
+@offload
+def class_roster_bulk(request: dict = Body(...), db: DBSession = Depends(get_db)):
+    """Add and remove many students in one transaction.
+    Body: {"class_id", "creator_id", "add": [school_id, ...], "remove": [school_id, ...]}
+    """
+    class_id = request.get("class_id")
+    creator_id = request.get("creator_id")
+    add_ids = _normalize_ids(request.get("add"))
+    remove_ids = _normalize_ids(request.get("remove"))
+
+    if not class_id or not creator_id:
+        return {"status": "error", "message": "class_id and creator_id are required"}
+    if not add_ids and not remove_ids:
+        return {"status": "error", "message": "Nothing to add or remove"}
+    if len(add_ids) + len(remove_ids) > ROSTER_BULK_MAX_IDS:
+        return {"status": "error", "message": f"At most {ROSTER_BULK_MAX_IDS} ids per request"}
+
+    db.for_user(*_identities(db, creator_id), *add_ids, *remove_ids)
+    try:
+        cursor = db.cursor()
+
+        # Verify the teacher owns this class; the row lock serializes concurrent bulk edits
+        cursor.execute("SELECT class_id FROM classes WHERE class_id=%s AND creator_id=%s FOR UPDATE", (class_id, creator_id))
+        if not cursor.fetchone():
+            return {"status": "error", "message": "Class not found or you don't have permission to edit it"}
+
+        conflicts = set(add_ids) & set(remove_ids)
+        add_ids = [i for i in add_ids if i not in conflicts]
+        remove_ids = [i for i in remove_ids if i not in conflicts]
+
+        students = _select_existing_ids(cursor, "SELECT school_id FROM student_data WHERE school_id", [], add_ids)
+        members = _select_existing_ids(cursor, "SELECT school_id FROM class_membership WHERE class_id=%s AND school_id",
+                                       [class_id], add_ids + remove_ids)
+
+        results = {}
+        to_insert = []
+        for school_id in add_ids:
+            if school_id not in students:
+                results[school_id] = "not_a_student"
+            elif school_id in members:
+                results[school_id] = "already_member"
+            else:
+                results[school_id] = "added"
+                to_insert.append((class_id, school_id))
+        to_delete = []
+        for school_id in remove_ids:
+            if school_id in members:
+                results[school_id] = "removed"
+                to_delete.append(school_id)
+            else:
+                results[school_id] = "not_member"
+        for school_id in conflicts:
+            results[school_id] = "conflict"
+
+        if to_insert:
+            cursor.executemany("INSERT IGNORE INTO class_membership (class_id, school_id) VALUES (%s, %s)", to_insert)
+        for start in range(0, len(to_delete), ROSTER_IN_CHUNK):
+            chunk = to_delete[start:start + ROSTER_IN_CHUNK]
+            placeholders = ",".join(["%s"] * len(chunk))
+            cursor.execute(f"DELETE FROM class_membership WHERE class_id=%s AND school_id IN ({placeholders})",
+                           (class_id,) + tuple(chunk))
+        db.commit()
+
+        return {
+            "status": "success",
+            "message": f"{len(to_insert)} added, {len(to_delete)} removed",
+            "added": len(to_insert),
+            "removed": len(to_delete),
+            "results": results,
+        }
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/get-student-classes")
+@offload
+def get_student_classes(school_id: str = Query(...), db: DBSession = Depends(get_read_db)):
+    try:
+        cursor = db.cursor()
+        # Served by the school_id index on class_membership instead of scanning every roster
+        cursor.execute("SELECT c.class_id, c.creator_id, c.name FROM class_membership m "
+                       "INNER JOIN classes c ON c.class_id = m.class_id "
+                       "WHERE m.school_id=%s ORDER BY c.name ASC", (school_id,))
+        classes = cursor.fetchall()
+        return {"status": "success", "classes": classes}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
 @app.post("/create-class")
-async def create_class(request: dict = Body(...)):
+@offload
+def create_class(request: dict = Body(...), db: DBSession = Depends(get_db)):
     creator_id = request.get("creator_id")
     name = request.get("name")
     
     if not creator_id or not name:
         return {"status": "error", "message": "creator_id and name are required"}
     
-    connection = None
-    cursor = None
+    db.for_user(*_identities(db, creator_id))
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         
         # Insert new class
         cursor.execute("INSERT INTO classes (creator_id, name, students) VALUES (%s, %s, %s)", 
                       (creator_id, name, ""))
-        connection.commit()
+        db.commit()
         
         # Get the created class ID
         class_id = cursor.lastrowid
@@ -909,25 +1600,19 @@ async def create_class(request: dict = Body(...)):
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.post("/delete-class")
-async def delete_class(request: dict = Body(...)):
+@offload
+def delete_class(request: dict = Body(...), db: DBSession = Depends(get_db)):
     class_id = request.get("class_id")
     creator_id = request.get("creator_id")
     
     if not class_id or not creator_id:
         return {"status": "error", "message": "class_id and creator_id are required"}
     
-    connection = None
-    cursor = None
+    db.for_user(*_identities(db, creator_id))
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         
         # Verify the teacher owns this class
         cursor.execute("SELECT class_id FROM classes WHERE class_id=%s AND creator_id=%s", (class_id, creator_id))
@@ -936,22 +1621,19 @@ async def delete_class(request: dict = Body(...)):
         if not class_data:
             return {"status": "error", "message": "Class not found or you don't have permission to delete it"}
         
-        # Delete the class
+        # Delete the class and its roster together
+        cursor.execute("DELETE FROM class_membership WHERE class_id=%s", (class_id,))
         cursor.execute("DELETE FROM classes WHERE class_id=%s", (class_id,))
-        connection.commit()
+        db.commit()
         
         return {"status": "success", "message": "Class deleted successfully"}
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.post("/rename-class")
-async def rename_class(request: dict = Body(...)):
+@offload
+def rename_class(request: dict = Body(...), db: DBSession = Depends(get_db)):
     class_id = request.get("class_id")
     creator_id = request.get("creator_id")
     new_name = request.get("new_name")
@@ -959,11 +1641,9 @@ async def rename_class(request: dict = Body(...)):
     if not class_id or not creator_id or not new_name:
         return {"status": "error", "message": "class_id, creator_id, and new_name are required"}
     
-    connection = None
-    cursor = None
+    db.for_user(*_identities(db, creator_id))
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         
         # Verify the teacher owns this class
         cursor.execute("SELECT class_id FROM classes WHERE class_id=%s AND creator_id=%s", (class_id, creator_id))
@@ -974,114 +1654,99 @@ async def rename_class(request: dict = Body(...)):
         
         # Update the class name
         cursor.execute("UPDATE classes SET name=%s WHERE class_id=%s", (new_name.strip(), class_id))
-        connection.commit()
+        db.commit()
         
         return {"status": "success", "message": "Class renamed successfully"}
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.post("/block-post")
-async def block_post(request: dict = Body(...)):
+@offload
+def block_post(request: dict = Body(...), session: dict = Depends(get_session), db: DBSession = Depends(get_db)):
     post_id = request.get("post_id")
     requester_school_id = request.get("requester_school_id")
     
-    if not post_id or not requester_school_id:
+    if not post_id or not (requester_school_id or session):
         return {"status": "error", "message": "post_id and requester_school_id are required"}
     
-    connection = None
-    cursor = None
+    db.for_user(*_identities(db, requester_school_id))
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         
         # Verify the requester is a teacher or admin
-        cursor.execute("SELECT teacher_id FROM teacher_data WHERE teacher_id=%s", (requester_school_id,))
-        teacher = cursor.fetchone()
-        cursor.execute("SELECT admin_id FROM admin_data WHERE admin_id=%s", (requester_school_id,))
-        admin = cursor.fetchone()
-        if not teacher and not admin:
+        is_teacher, is_admin = _session_privileges(session)
+        if not (is_teacher or is_admin):
             return {"status": "error", "message": "Access denied: Only teachers or admins can block posts"}
         
         # Check if the post exists
-        cursor.execute("SELECT post_id, validated FROM post WHERE post_id=%s", (post_id,))
+        cursor.execute("SELECT post_id, validated, category, author_id FROM post WHERE post_id=%s", (post_id,))
         post = cursor.fetchone()
         
         if not post:
             return {"status": "error", "message": "Post not found"}
         
         # Update the post validation status to 0 (blocked)
-        cursor.execute("UPDATE post SET validated=0 WHERE post_id=%s", (post_id,))
-        connection.commit()
+        cursor.execute("UPDATE post SET validated=0 WHERE post_id=%s AND validated<>0", (post_id,))
+        if cursor.rowcount:
+            _adjust_pending_counts(cursor, posts=1)
+            _adjust_post_counts(cursor, {post["author_id"]: -1})
+        db.commit()
+        _content_changed("post_blocked", post["category"], post_id=post["post_id"])
+        post_index.set_post_validated(post["post_id"], 0)
         
         return {"status": "success", "message": "Post blocked successfully"}
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.post("/validate-post")
-async def validate_post(request: dict = Body(...)):
+@offload
+def validate_post(request: dict = Body(...), session: dict = Depends(get_session), db: DBSession = Depends(get_db)):
     post_id = request.get("post_id")
     requester_school_id = request.get("requester_school_id")
     
-    if not post_id or not requester_school_id:
+    if not post_id or not (requester_school_id or session):
         return {"status": "error", "message": "post_id and requester_school_id are required"}
     
-    connection = None
-    cursor = None
+    db.for_user(*_identities(db, requester_school_id))
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         
         # Verify the requester is a teacher or admin
-        cursor.execute("SELECT teacher_id FROM teacher_data WHERE teacher_id=%s", (requester_school_id,))
-        teacher = cursor.fetchone()
-        cursor.execute("SELECT admin_id FROM admin_data WHERE admin_id=%s", (requester_school_id,))
-        admin = cursor.fetchone()
-        if not teacher and not admin:
+        is_teacher, is_admin = _session_privileges(session)
+        if not (is_teacher or is_admin):
             return {"status": "error", "message": "Access denied: Only teachers or admins can validate posts"}
         
         # Check if the post exists
-        cursor.execute("SELECT post_id, validated FROM post WHERE post_id=%s", (post_id,))
+        cursor.execute("SELECT post_id, validated, category, author_id FROM post WHERE post_id=%s", (post_id,))
         post = cursor.fetchone()
         
         if not post:
             return {"status": "error", "message": "Post not found"}
         
         # Update the post validation status to 1 (validated)
-        cursor.execute("UPDATE post SET validated=1 WHERE post_id=%s", (post_id,))
-        connection.commit()
+        cursor.execute("UPDATE post SET validated=1 WHERE post_id=%s AND validated<>1", (post_id,))
+        if cursor.rowcount:
+            _adjust_pending_counts(cursor, posts=-1)
+            _adjust_post_counts(cursor, {post["author_id"]: 1})
+        db.commit()
+        _content_changed("post_validated", post["category"], post_id=post["post_id"])
+        post_index.set_post_validated(post["post_id"], 1)
         
         return {"status": "success", "message": "Post validated successfully"}
         
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 #== Teacher Exclusive END ===
 
 #=== Admin & Extended Moderation START ===
 @app.post("/login-check-admin")
-async def login_check_admin(username=Body("user_id"), password=Body("password")):
+@offload
+def login_check_admin(username=Body("user_id"), password=Body("password"), db: DBSession = Depends(get_db)):
     """Authenticate an admin (must exist in personal_info + admin_data)."""
-    connection = None
-    cursor = None
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
+        cursor = db.cursor()
         cursor.execute("SELECT * FROM personal_info WHERE user_id=%s AND password=%s", (username, password))
         user = cursor.fetchone()
         if not user:
@@ -1089,126 +1754,525 @@ async def login_check_admin(username=Body("user_id"), password=Body("password"))
         school_id = user.get("school_id")
         if not school_id:
             return {"status": "error", "message": "No school_id found for this user"}
-        cursor.execute("SELECT admin_id FROM admin_data WHERE admin_id=%s", (school_id,))
-        admin = cursor.fetchone()
-        if not admin:
+        role = _resolve_role(db, school_id)
+        if not role["is_admin"]:
             return {"status": "error", "message": "Not an admin account"}
         if 'password' in user:
             del user['password']
         user['is_admin'] = True
-        return {"status": "success", "message": "Login successful", "user": user}
+        return _session_response(user, role)
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
-def _is_privileged(cursor, school_id):
-    """Return (is_teacher, is_admin) for either a school_id OR user_id.
-    If the identifier is a user_id, resolve its school_id first via personal_info.
+ROLE_CACHE_TTL = 60
+role_cache = TTLCache(maxsize=4096, ttl=ROLE_CACHE_TTL)
+
+def _resolve_role(db, identifier):
+    """Resolve a school_id OR user_id to {"school_id", "user_id", "is_teacher", "is_admin"}.
+    Results are cached per identifier for ROLE_CACHE_TTL seconds; call invalidate_role()
+    whenever personal_info, teacher_data or admin_data change. A cache hit never touches `db`.
     """
-    if not school_id:
-        return False, False
+    identifier = str(identifier)
+    role = role_cache.get(identifier)
+    if role is not None:
+        return role
+    cursor = db.cursor()
     # First try direct match as school_id
-    cursor.execute("SELECT school_id FROM personal_info WHERE school_id=%s", (school_id,))
+    cursor.execute("SELECT school_id, user_id FROM personal_info WHERE school_id=%s", (identifier,))
     row = cursor.fetchone()
-    resolved = school_id
     if not row:
         # Try treat as user_id
-        cursor.execute("SELECT school_id FROM personal_info WHERE user_id=%s", (school_id,))
-        row2 = cursor.fetchone()
-        if row2:
-            resolved = row2['school_id']
+        cursor.execute("SELECT school_id, user_id FROM personal_info WHERE user_id=%s", (identifier,))
+        row = cursor.fetchone()
+    resolved = str(row["school_id"]) if row else identifier
     # Now privilege lookups with resolved school id
     cursor.execute("SELECT teacher_id FROM teacher_data WHERE teacher_id=%s", (resolved,))
     teacher = cursor.fetchone()
     cursor.execute("SELECT admin_id FROM admin_data WHERE admin_id=%s", (resolved,))
     admin = cursor.fetchone()
-    return bool(teacher), bool(admin)
+    role = {
+        "school_id": resolved,
+        "user_id": row["user_id"] if row else None,
+        "is_teacher": bool(teacher),
+        "is_admin": bool(admin),
+    }
+    role_cache.set(identifier, role)
+    return role
+
+def _identities(db, *identifiers):
+    """The school_id and user_id of each account. Writes mark both for read-your-writes, so a
+    later read matches whichever of the two the client sends."""
+    ids = set()
+    for identifier in identifiers:
+        if not identifier:
+            continue
+        ids.add(str(identifier))
+        try:
+            role = _resolve_role(db, identifier)
+        except Exception:
+            continue
+        ids.update(str(value) for value in (role["school_id"], role["user_id"]) if value)
+    return ids
+
+def invalidate_role(*identifiers):
+    """Drop cached roles for the given school_ids/user_ids, or every cached role if none given."""
+    if not identifiers:
+        role_cache.clear()
+        return
+    targets = {str(i) for i in identifiers if i is not None}
+    role_cache.discard_where(lambda key, role: key in targets
+                             or role["school_id"] in targets
+                             or str(role["user_id"]) in targets)
+
+def _requester_role(db, requester_school_id, session=None):
+    """The caller's role: from the verified session token when one was sent (no DB access),
+    otherwise resolved from the legacy requester_school_id. None for anonymous callers.
+    """
+    if session is not None:
+        return session
+    if not requester_school_id or SESSION_TOKENS_REQUIRED:
+        return None
+    return _resolve_role(db, requester_school_id)
+
+def _is_privileged(db, school_id, session=None):
+    """Return (is_teacher, is_admin) for the session, or for either a school_id OR user_id."""
+    role = _requester_role(db, school_id, session)
+    if role is None:
+        return False, False
+    return role["is_teacher"], role["is_admin"]
+
+def _session_privileges(session):
+    """(is_teacher, is_admin) from a verified session token alone. Moderation, export and admin
+    endpoints use this, so a spoofed requester_school_id can never act for a teacher or admin."""
+    if session is None:
+        return False, False
+    return session["is_teacher"], session["is_admin"]
+
+@app.post("/role-cache/invalidate")
+@offload
+def role_cache_invalidate(request: dict = Body(...), session: dict = Depends(get_session), db: DBSession = Depends(get_db)):
+    """Admin hook to call after editing teacher_data/admin_data/personal_info outside the app.
+    Pass "identifiers" to drop specific entries, or omit it to flush the whole cache.
+    """
+    requester_school_id = request.get("requester_school_id")
+    if not (requester_school_id or session):
+        return {"status": "error", "message": "requester_school_id is required"}
+    try:
+        _is_teacher, is_admin = _session_privileges(session)
+        if not is_admin:
+            return {"status": "error", "message": "Access denied"}
+        identifiers = request.get("identifiers") or []
+        invalidate_role(*identifiers)
+        return {"status": "success", "message": "Role cache invalidated", "stats": role_cache.stats()}
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/feed-cache/stats")
+async def feed_cache_stats():
+    return {"status": "success", "stats": feed_cache.stats()}
+
+@app.get("/role-cache/stats")
+async def role_cache_stats():
+    return {"status": "success", "stats": role_cache.stats()}
+
+@app.get("/debug/sql-profile")
+@offload
+def sql_profile(requester_school_id: str = Query(None), limit: int = Query(50), flagged_only: bool = Query(False),
+                reset: bool = Query(False), session: dict = Depends(get_session), db: DBSession = Depends(get_db)):
+    """Admin only: recent request profiles (statement fingerprints, N+1 flags, EXPLAIN of slow
+    statements) and the fingerprints with the most DB time. Needs SQL_PROFILE=1.
+    """
+    try:
+        _is_teacher, is_admin = _session_privileges(session)
+        if not is_admin:
+            return {"status": "error", "message": "Access denied"}
+        limit = max(1, min(int(limit), 500))
+        payload = {
+            "status": "success",
+            "stats": profiler.stats(),
+            "fingerprints": profiler.top(limit),
+            "requests": profiler.recent(limit, flagged_only),
+        }
+        if reset:
+            profiler.reset()
+        return _json_response(payload)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
 
 @app.post("/block-reply")
-async def block_reply(request: dict = Body(...)):
+@offload
+def block_reply(request: dict = Body(...), session: dict = Depends(get_session), db: DBSession = Depends(get_db)):
     reply_id = request.get("reply_id")
     requester_school_id = request.get("requester_school_id")
-    if not reply_id or not requester_school_id:
+    if not reply_id or not (requester_school_id or session):
         return {"status": "error", "message": "reply_id and requester_school_id are required"}
-    connection = None
-    cursor = None
+    db.for_user(*_identities(db, requester_school_id))
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
-        is_teacher, is_admin = _is_privileged(cursor, requester_school_id)
+        cursor = db.cursor()
+        is_teacher, is_admin = _session_privileges(session)
         if not (is_teacher or is_admin):
             return {"status": "error", "message": "Access denied"}
-        cursor.execute("SELECT reply_id FROM reply WHERE reply_id=%s", (reply_id,))
+        cursor.execute("SELECT r.reply_id, r.parent_post_id, p.category FROM reply r LEFT JOIN post p ON p.post_id = r.parent_post_id WHERE r.reply_id=%s", (reply_id,))
         reply = cursor.fetchone()
         if not reply:
             return {"status": "error", "message": "Reply not found"}
-        cursor.execute("UPDATE reply SET validated=0 WHERE reply_id=%s", (reply_id,))
-        connection.commit()
+        cursor.execute("UPDATE reply SET validated=0 WHERE reply_id=%s AND validated<>0", (reply_id,))
+        if cursor.rowcount:
+            _adjust_pending_counts(cursor, replies=1)
+            _adjust_reply_counts(cursor, {reply["parent_post_id"]: -1})
+        db.commit()
+        _content_changed("reply_blocked", reply["category"], post_id=reply["parent_post_id"], reply_id=reply["reply_id"])
+        post_index.set_reply_validated(reply["reply_id"], 0)
         return {"status": "success", "message": "Reply blocked successfully"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
 
 @app.post("/validate-reply")
-async def validate_reply(request: dict = Body(...)):
+@offload
+def validate_reply(request: dict = Body(...), session: dict = Depends(get_session), db: DBSession = Depends(get_db)):
     reply_id = request.get("reply_id")
     requester_school_id = request.get("requester_school_id")
-    if not reply_id or not requester_school_id:
+    if not reply_id or not (requester_school_id or session):
         return {"status": "error", "message": "reply_id and requester_school_id are required"}
-    connection = None
-    cursor = None
+    db.for_user(*_identities(db, requester_school_id))
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
-        is_teacher, is_admin = _is_privileged(cursor, requester_school_id)
+        cursor = db.cursor()
+        is_teacher, is_admin = _session_privileges(session)
         if not (is_teacher or is_admin):
             return {"status": "error", "message": "Access denied"}
-        cursor.execute("SELECT reply_id FROM reply WHERE reply_id=%s", (reply_id,))
+        cursor.execute("SELECT r.reply_id, r.parent_post_id, p.category FROM reply r LEFT JOIN post p ON p.post_id = r.parent_post_id WHERE r.reply_id=%s", (reply_id,))
         reply = cursor.fetchone()
         if not reply:
             return {"status": "error", "message": "Reply not found"}
-        cursor.execute("UPDATE reply SET validated=1 WHERE reply_id=%s", (reply_id,))
-        connection.commit()
+        cursor.execute("UPDATE reply SET validated=1 WHERE reply_id=%s AND validated<>1", (reply_id,))
+        if cursor.rowcount:
+            _adjust_pending_counts(cursor, replies=-1)
+            _adjust_reply_counts(cursor, {reply["parent_post_id"]: 1})
+        db.commit()
+        _content_changed("reply_validated", reply["category"], post_id=reply["parent_post_id"], reply_id=reply["reply_id"])
+        post_index.set_reply_validated(reply["reply_id"], 1)
         return {"status": "success", "message": "Reply validated successfully"}
     except Exception as e:
         return {"status": "error", "message": str(e)}
-    finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+
+MODERATION_BULK_MAX_ITEMS = 1000
+_MODERATION_ACTIONS = {"block": 0, "validate": 1}
+
+def _select_rows_in(cursor, query_prefix, ids, key, suffix=""):
+    """Run `query_prefix IN (...) suffix` over ids in bounded chunks; returns {row[key]: row}."""
+    rows = {}
+    for start in range(0, len(ids), ROSTER_IN_CHUNK):
+        chunk = ids[start:start + ROSTER_IN_CHUNK]
+        placeholders = ",".join(["%s"] * len(chunk))
+        cursor.execute(f"{query_prefix} IN ({placeholders}){suffix}", tuple(chunk))
+        rows.update((row[key], row) for row in cursor.fetchall())
+    return rows
+
+def _update_validated(cursor, table, id_column, ids, validated):
+    for start in range(0, len(ids), ROSTER_IN_CHUNK):
+        chunk = ids[start:start + ROSTER_IN_CHUNK]
+        placeholders = ",".join(["%s"] * len(chunk))
+        cursor.execute(f"UPDATE {table} SET validated=%s WHERE {id_column} IN ({placeholders})",
+                       (validated,) + tuple(chunk))
+
+@app.post("/moderate/bulk")
+@offload
+def moderate_bulk(request: dict = Body(...), session: dict = Depends(get_session), db: DBSession = Depends(get_db)):
+    """Block or validate many posts and replies in one transaction.
+    Body: {"requester_school_id", "items": [{"type": "post"|"reply", "id", "action": "block"|"validate"}, ...]}
+    """
+    requester_school_id = request.get("requester_school_id")
+    items = request.get("items")
+    if not (requester_school_id or session) or not isinstance(items, list) or not items:
+        return {"status": "error", "message": "requester_school_id and a non-empty items list are required"}
+    if len(items) > MODERATION_BULK_MAX_ITEMS:
+        return {"status": "error", "message": f"At most {MODERATION_BULK_MAX_ITEMS} items per request"}
+
+    db.for_user(*_identities(db, requester_school_id))
+    try:
+        is_teacher, is_admin = _session_privileges(session)
+        if not (is_teacher or is_admin):
+            return {"status": "error", "message": "Access denied"}
+
+        # Results are keyed "post:<id>" / "reply:<id>"; the same item asked to be both blocked
+        # and validated is a conflict and left alone
+        results = {}
+        wanted = {"post": {}, "reply": {}}
+        conflicts = set()
+        for item in items:
+            item = item if isinstance(item, dict) else {}
+            kind, action = item.get("type"), item.get("action")
+            try:
+                item_id = int(item.get("id"))
+            except (TypeError, ValueError):
+                item_id = None
+            if kind not in wanted or action not in _MODERATION_ACTIONS or item_id is None:
+                results[f"{kind}:{item.get('id')}"] = "invalid"
+                continue
+            validated = _MODERATION_ACTIONS[action]
+            if wanted[kind].setdefault(item_id, validated) != validated:
+                conflicts.add((kind, item_id))
+        for kind, item_id in conflicts:
+            del wanted[kind][item_id]
+            results[f"{kind}:{item_id}"] = "conflict"
+
+        cursor = db.cursor()
+        # Row locks keep the before/after states exact under concurrent moderation
+        posts = _select_rows_in(cursor, "SELECT post_id, validated, category, author_id FROM post WHERE post_id",
+                                list(wanted["post"]), "post_id", " FOR UPDATE")
+        replies = _select_rows_in(cursor, "SELECT r.reply_id, r.parent_post_id, r.validated, p.category "
+                                  "FROM reply r LEFT JOIN post p ON p.post_id = r.parent_post_id WHERE r.reply_id",
+                                  list(wanted["reply"]), "reply_id", " FOR UPDATE")
+
+        missing = {"post": [], "reply": []}
+        changes = {("post", 0): [], ("post", 1): [], ("reply", 0): [], ("reply", 1): []}
+        for kind, rows in (("post", posts), ("reply", replies)):
+            for item_id, validated in wanted[kind].items():
+                row = rows.get(item_id)
+                if row is None:
+                    missing[kind].append(item_id)
+                    results[f"{kind}:{item_id}"] = "not_found"
+                elif row["validated"] == validated:
+                    results[f"{kind}:{item_id}"] = "unchanged"
+                else:
+                    changes[(kind, validated)].append(row)
+                    results[f"{kind}:{item_id}"] = "validated" if validated else "blocked"
+
+        for (kind, validated), rows in changes.items():
+            if kind == "post":
+                _update_validated(cursor, "post", "post_id", [row["post_id"] for row in rows], validated)
+            else:
+                _update_validated(cursor, "reply", "reply_id", [row["reply_id"] for row in rows], validated)
+        _adjust_pending_counts(cursor,
+                               posts=len(changes[("post", 0)]) - len(changes[("post", 1)]),
+                               replies=len(changes[("reply", 0)]) - len(changes[("reply", 1)]))
+        post_deltas, reply_deltas = {}, {}
+        for validated in (0, 1):
+            step = 1 if validated else -1
+            for row in changes[("post", validated)]:
+                post_deltas[row["author_id"]] = post_deltas.get(row["author_id"], 0) + step
+            for row in changes[("reply", validated)]:
+                reply_deltas[row["parent_post_id"]] = reply_deltas.get(row["parent_post_id"], 0) + step
+        _adjust_post_counts(cursor, post_deltas)
+        _adjust_reply_counts(cursor, reply_deltas)
+        db.commit()
+
+        for (kind, validated), rows in changes.items():
+            event_type = f"{kind}_{'validated' if validated else 'blocked'}"
+            for row in rows:
+                if kind == "post":
+                    _content_changed(event_type, row["category"], post_id=row["post_id"])
+                    post_index.set_post_validated(row["post_id"], validated)
+                else:
+                    _content_changed(event_type, row["category"], post_id=row["parent_post_id"], reply_id=row["reply_id"])
+                    post_index.set_reply_validated(row["reply_id"], validated)
+
+        blocked = len(changes[("post", 0)]) + len(changes[("reply", 0)])
+        validated_count = len(changes[("post", 1)]) + len(changes[("reply", 1)])
+        return {
+            "status": "success",
+            "message": f"{blocked} blocked, {validated_count} validated",
+            "blocked": blocked,
+            "validated": validated_count,
+            "missing": {"posts": missing["post"], "replies": missing["reply"]},
+            "results": results,
+        }
+
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+# Pending (unvalidated) totals live in moderation_counts (created by `python migrations.py
+# moderation-counts`) and are adjusted in the same transaction as every moderation state change.
+PENDING_DEFAULT_LIMIT = 50
+PENDING_MAX_LIMIT = 200
+
+def _adjust_pending_counts(cursor, posts=0, replies=0):
+    """Apply pending-count deltas; call inside the transaction that changed the validated flags."""
+    for kind, delta in (("post", posts), ("reply", replies)):
+        if delta:
+            cursor.execute("UPDATE moderation_counts SET pending = pending + %s WHERE kind=%s", (delta, kind))
+
+def _pending_counts(cursor):
+    cursor.execute("SELECT kind, pending FROM moderation_counts")
+    counts = {row["kind"]: row["pending"] for row in cursor.fetchall()}
+    return {"posts": counts.get("post", 0), "replies": counts.get("reply", 0)}
+
+def _fetch_pending_page(cursor, query, conditions, params, time_column, id_column, limit, page_cursor, oldest_first):
+    """Keyset page over pending rows ordered by (upload_time, id) in either direction.
+    Returns (rows, next_cursor); raises ValueError on a malformed cursor.
+    """
+    conditions = list(conditions)
+    params = list(params)
+    direction, compare = ("ASC", ">") if oldest_first else ("DESC", "<")
+    if page_cursor:
+        after_time, after_id = _decode_feed_cursor(page_cursor)
+        conditions.append(f"({time_column} {compare} %s OR ({time_column} = %s AND {id_column} {compare} %s))")
+        params.extend([after_time, after_time, after_id])
+    cursor.execute(f"{query} WHERE {' AND '.join(conditions)} "
+                   f"ORDER BY {time_column} {direction}, {id_column} {direction} LIMIT %s",
+                   tuple(params) + (limit + 1,))
+    rows = cursor.fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        return rows, _encode_keyset_cursor(last["upload_time"], last[id_column.split(".")[-1]])
+    return rows, None
 
 @app.get("/pending-content")
-async def pending_content(requester_school_id: str = Query(...)):
-    connection = None
-    cursor = None
+@offload
+def pending_content(requester_school_id: str = Query(None), kind: str = Query(None),
+                    order: str = Query("newest"), category: str = Query(None), author_id: str = Query(None),
+                    limit: int = Query(PENDING_DEFAULT_LIMIT), post_cursor: str = Query(None),
+                    reply_cursor: str = Query(None), session: dict = Depends(get_session),
+                    db: DBSession = Depends(get_db)):
+    """One page of the moderation queue. kind=post|reply limits it to one list (default both);
+    each list pages independently with its own cursor.
+    """
+    if kind not in (None, "post", "reply"):
+        return {"status": "error", "message": "kind must be 'post' or 'reply'"}
+    if order not in ("newest", "oldest"):
+        return {"status": "error", "message": "order must be 'newest' or 'oldest'"}
     try:
-        connection = get_connection()
-        cursor = connection.cursor(dictionary=True, buffered=True)
-        is_teacher, is_admin = _is_privileged(cursor, requester_school_id)
+        is_teacher, is_admin = _session_privileges(session)
         if not (is_teacher or is_admin):
             return {"status": "error", "message": "Access denied"}
-        cursor.execute("SELECT * FROM post WHERE validated=0 ORDER BY upload_time DESC")
-        posts = cursor.fetchall()
-        cursor.execute("SELECT * FROM reply WHERE validated=0 ORDER BY upload_time DESC")
-        replies = cursor.fetchall()
-        return {"status": "success", "posts": posts, "replies": replies}
+        cursor = db.cursor()
+        limit = max(1, min(int(limit), PENDING_MAX_LIMIT))
+        oldest_first = order == "oldest"
+        posts, next_post_cursor = [], None
+        replies, next_reply_cursor = [], None
+        try:
+            if kind in (None, "post"):
+                conditions, params = ["validated=0"], []
+                if category:
+                    conditions.append("category=%s")
+                    params.append(category)
+                if author_id:
+                    conditions.append("author_id=%s")
+                    params.append(author_id)
+                posts, next_post_cursor = _fetch_pending_page(
+                    cursor, "SELECT * FROM post", conditions, params, "upload_time", "post_id",
+                    limit, post_cursor, oldest_first)
+            if kind in (None, "reply"):
+                conditions, params = ["r.validated=0"], []
+                if category:
+                    conditions.append("p.category=%s")
+                    params.append(category)
+                if author_id:
+                    conditions.append("r.author_id=%s")
+                    params.append(author_id)
+                replies, next_reply_cursor = _fetch_pending_page(
+                    cursor, "SELECT r.*, p.category FROM reply r LEFT JOIN post p ON p.post_id = r.parent_post_id",
+                    conditions, params, "r.upload_time", "r.reply_id", limit, reply_cursor, oldest_first)
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        return {
+            "status": "success",
+            "posts": posts,
+            "replies": replies,
+            "next_post_cursor": next_post_cursor,
+            "next_reply_cursor": next_reply_cursor,
+            "counts": _pending_counts(cursor),
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+@app.get("/pending-content/counts")
+@offload
+def pending_content_counts(requester_school_id: str = Query(None), session: dict = Depends(get_session),
+                           db: DBSession = Depends(get_db)):
+    """Pending totals for the dashboard badge; no bodies, no COUNT(*)."""
+    try:
+        is_teacher, is_admin = _session_privileges(session)
+        if not (is_teacher or is_admin):
+            return {"status": "error", "message": "Access denied"}
+        cursor = db.cursor()
+        return {"status": "success", "counts": _pending_counts(cursor)}
     except Exception as e:
         return {"status": "error", "message": str(e)}
+
+# Admin data export. Rows are streamed from an unbuffered (server-side) cursor in
+# EXPORT_BATCH_SIZE batches on a dedicated connection, so memory use is independent of table size.
+EXPORT_BATCH_SIZE = 1000
+_EXPORT_QUERIES = {
+    "post": ("SELECT * FROM post", "upload_time", "category", "post_id"),
+    "reply": ("SELECT r.*, p.category FROM reply r LEFT JOIN post p ON p.post_id = r.parent_post_id",
+              "r.upload_time", "p.category", "r.reply_id"),
+}
+
+def _parse_export_time(value, name):
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).strftime("%Y-%m-%d %H:%M:%S")
+    except Exception:
+        raise ValueError(f"Invalid {name}: expected an ISO datetime")
+
+def _export_rows(query, params, export_format):
+    """Yield the export body batch by batch; runs in Starlette's threadpool while the client reads."""
+    session = DBSession()
+    try:
+        cursor = session.cursor(buffered=False)
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+        while True:
+            rows = cursor.fetchmany(EXPORT_BATCH_SIZE)
+            if not rows:
+                break
+            if export_format == "csv":
+                writer.writerows([row.get(column) for column in columns] for row in rows)
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+            else:
+                yield b"".join(dumps(row) + b"\n" for row in rows)
+        if export_format == "csv" and buffer.tell():
+            yield buffer.getvalue().encode()
     finally:
-        if cursor:
-            cursor.close()
-        if connection:
-            connection.close()
+        session.close()
+
+@app.get("/export")
+async def export_content(table: str = Query("post"), format: str = Query("ndjson"), since: str = Query(None),
+                         until: str = Query(None), category: str = Query(None),
+                         requester_school_id: str = Query(None), session: dict = Depends(get_session)):
+    """Admin only: stream every post or reply as NDJSON or CSV, optionally filtered by
+    upload_time range [since, until) and category. The stream opens its own connection, so the
+    handler itself takes neither a pooled connection nor a DB executor thread.
+    """
+    if table not in _EXPORT_QUERIES:
+        return {"status": "error", "message": "table must be 'post' or 'reply'"}
+    if format not in ("ndjson", "csv"):
+        return {"status": "error", "message": "format must be 'ndjson' or 'csv'"}
+    try:
+        _is_teacher, is_admin = _session_privileges(session)
+        if not is_admin:
+            return {"status": "error", "message": "Access denied"}
+        query, time_column, category_column, id_column = _EXPORT_QUERIES[table]
+        conditions, params = [], []
+        try:
+            if since:
+                conditions.append(f"{time_column} >= %s")
+                params.append(_parse_export_time(since, "since"))
+            if until:
+                conditions.append(f"{time_column} < %s")
+                params.append(_parse_export_time(until, "until"))
+        except ValueError as e:
+            return {"status": "error", "message": str(e)}
+        if category:
+            conditions.append(f"{category_column} = %s")
+            params.append(category)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += f" ORDER BY {id_column}"
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+        filename = f"{table}-export-{datetime.now().strftime('%Y%m%d-%H%M%S')}.{format}"
+        return StreamingResponse(_export_rows(query, tuple(params), format), media_type=media_type,
+                                 headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
 
 #=== Admin & Extended Moderation END ===
 
@@ -0,0 +1,231 @@
+"""Admission control: per-route-class concurrency limits, bounded wait queues and token buckets.
+
+AdmissionMiddleware sorts each request into a route class (read, write, moderation, login, ...)
+before it reaches the handler. A class admits up to `limit` requests at once. The next `queue`
+requests wait in FIFO order for at most ADMISSION_QUEUE_TIMEOUT seconds, and anything beyond
+that gets an immediate 503 with Retry-After. While the controller's saturated() check
+reports a backed-up database, classes marked `shed_when_saturated` get a 503 up front. A slow
+database then produces fast refusals instead of a growing queue on get_connection().
+The limiter state lives on the event loop, so admission needs no locks. TokenBucketLimiter
+is thread-safe and is called from handlers to rate-limit individual users.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from collections import deque
+
+ADMISSION_CONTROL = os.environ.get("ADMISSION_CONTROL", "1") not in ("0", "false", "False")
+# Longest a request waits in its class queue before it is refused
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "2"))
+# Seconds suggested to refused clients in the Retry-After header
+ADMISSION_RETRY_AFTER = int(os.environ.get("ADMISSION_RETRY_AFTER", "1"))
+# Handlers waiting for a DB worker thread at which reads start being shed
+ADMISSION_SATURATION_QUEUE = int(os.environ.get("ADMISSION_SATURATION_QUEUE", "16"))
+# Per-author token buckets for new posts and replies: refill rate per second and bucket size
+POST_RATE = float(os.environ.get("POST_RATE", "0.2"))
+POST_BURST = float(os.environ.get("POST_BURST", "5"))
+REPLY_RATE = float(os.environ.get("REPLY_RATE", "0.5"))
+REPLY_BURST = float(os.environ.get("REPLY_BURST", "10"))
+
+
+class Rejected(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class ClassLimiter:
+    """At most `limit` holders; up to `queue` more wait in FIFO order."""
+
+    def __init__(self, name, limit, queue, shed_when_saturated=False):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.shed_when_saturated = shed_when_saturated
+        self.in_flight = 0
+        self._waiters = deque()
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected = {"queue_full": 0, "timeout": 0, "saturated": 0}
+
+    async def acquire(self, timeout, saturated=False):
+        if self.shed_when_saturated and saturated:
+            self.rejected["saturated"] += 1
+            raise Rejected("saturated")
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            self.admitted += 1
+            return
+        if len(self._waiters) >= self.queue:
+            self.rejected["queue_full"] += 1
+            raise Rejected("queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued_total += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except asyncio.TimeoutError:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait timed out; keep it
+                self.admitted += 1
+                return
+            waiter.cancel()
+            self._discard(waiter)
+            self.rejected["timeout"] += 1
+            raise Rejected("timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            else:
+                waiter.cancel()
+                self._discard(waiter)
+            raise
+        self.admitted += 1
+
+    def _discard(self, waiter):
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self):
+        # Hand the slot straight to the oldest waiter so in_flight never dips below the queue
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "queue_size": self.queue,
+            "in_flight": self.in_flight,
+            "queued": len(self._waiters),
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected": dict(self.rejected),
+            "shed_when_saturated": self.shed_when_saturated,
+        }
+
+
+def class_limiter(name, limit, queue, shed_when_saturated=False):
+    """ClassLimiter with defaults overridable by ADMISSION_<NAME>_LIMIT and ADMISSION_<NAME>_QUEUE."""
+    prefix = f"ADMISSION_{name.upper()}"
+    return ClassLimiter(name, int(os.environ.get(f"{prefix}_LIMIT", limit)),
+                        int(os.environ.get(f"{prefix}_QUEUE", queue)), shed_when_saturated)
+
+
+class AdmissionController:
+    def __init__(self, limiters, classify, saturated=None, queue_timeout=ADMISSION_QUEUE_TIMEOUT,
+                 retry_after=ADMISSION_RETRY_AFTER):
+        """limiters: {class name: ClassLimiter}; classify(method, path) -> class name or None
+        (None means unlimited); saturated() -> True while the DB pool has waiting callers."""
+        self.limiters = limiters
+        self.classify = classify
+        self.saturated = saturated or (lambda: False)
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+    def limiter_for(self, method, path):
+        route_class = self.classify(method, path)
+        return self.limiters.get(route_class) if route_class else None
+
+    async def acquire(self, limiter):
+        saturated = limiter.shed_when_saturated and self.saturated()
+        await limiter.acquire(self.queue_timeout, saturated)
+
+    def stats(self):
+        return {
+            "enabled": ADMISSION_CONTROL,
+            "queue_timeout_seconds": self.queue_timeout,
+            "retry_after_seconds": self.retry_after,
+            "pool_saturated": self.saturated(),
+            "classes": {name: limiter.stats() for name, limiter in self.limiters.items()},
+        }
+
+
+_REJECT_MESSAGES = {
+    "queue_full": "Server busy, please retry shortly",
+    "timeout": "Server busy, please retry shortly",
+    "saturated": "Database busy, please retry shortly",
+}
+
+
+class AdmissionMiddleware:
+    def __init__(self, app, controller):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        limiter = self.controller.limiter_for(scope["method"], scope["path"])
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.controller.acquire(limiter)
+        except Rejected as e:
+            body = json.dumps({"status": "error", "message": _REJECT_MESSAGES[e.reason],
+                               "reason": e.reason, "route_class": limiter.name}).encode()
+            await send({"type": "http.response.start", "status": 503, "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(self.controller.retry_after).encode()),
+            ]})
+            await send({"type": "http.response.body", "body": body})
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release()
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets: `rate` tokens per second, holding at most `burst`."""
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    def take(self, key, now=None):
+        """Spend one token for key. Returns 0 when allowed, otherwise seconds until a token is free."""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                self.allowed += 1
+                if len(self._buckets) > self.max_keys:
+                    self._prune(now)
+                return 0
+            self._buckets[key] = (tokens, now)
+            self.limited += 1
+            return (1 - tokens) / self.rate
+
+    def _prune(self, now):
+        # A bucket that would have refilled completely carries no state worth keeping
+        full_after = self.burst / self.rate
+        for key in [key for key, (_tokens, updated) in self._buckets.items() if now - updated >= full_after]:
+            del self._buckets[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "rate_per_second": self.rate,
+                "burst": self.burst,
+                "keys": len(self._buckets),
+                "allowed": self.allowed,
+                "limited": self.limited,
+            }
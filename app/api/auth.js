@@ -1,4 +1,12 @@
-import { apiRequest } from './config.js';
+import { apiRequest, setSessionToken } from './config.js';
+
+// Keep the session token from a successful login for later requests
+function rememberSession(response) {
+  if (response && response.status === 'success' && response.token) {
+    setSessionToken(response.token);
+  }
+  return response;
+}
 
 /**
  * Student login check
@@ -7,13 +15,13 @@ import { apiRequest } from './config.js';
  * @returns {Promise<Object>} Login response
  */
 export async function loginCheckStudent(username, password) {
-  return await apiRequest('/login-check-student', {
+  return rememberSession(await apiRequest('/login-check-student', {
     method: 'POST',
     body: JSON.stringify({
       user_id: username,
       password: password
     })
-  });
+  }));
 }
 
 /**
@@ -23,13 +31,13 @@ export async function loginCheckStudent(username, password) {
  * @returns {Promise<Object>} Login response
  */
 export async function loginCheckTeacher(username, password) {
-  return await apiRequest('/login-check-teacher', {
+  return rememberSession(await apiRequest('/login-check-teacher', {
     method: 'POST',
     body: JSON.stringify({
       user_id: username,
       password: password
     })
-  });
+  }));
 }
 
 /**
@@ -39,13 +47,13 @@ export async function loginCheckTeacher(username, password) {
  * @returns {Promise<Object>} Login response
  */
 export async function loginCheckAdmin(username, password) {
-  return await apiRequest('/login-check-admin', {
+  return rememberSession(await apiRequest('/login-check-admin', {
     method: 'POST',
     body: JSON.stringify({
       user_id: username,
       password: password
     })
-  });
+  }));
 }
 
 /**
@@ -12,19 +12,38 @@ console.log('API Configuration:', {
   NEXT_PUBLIC_API_BASE_URL: process.env.NEXT_PUBLIC_API_BASE_URL
 });
 
+const SESSION_TOKEN_KEY = 'sessionToken';
+
+// Session token returned by the login endpoints; sent as a bearer token on every request
+export function setSessionToken(token) {
+  if (typeof window === 'undefined') return;
+  if (token) {
+    window.localStorage.setItem(SESSION_TOKEN_KEY, token);
+  } else {
+    window.localStorage.removeItem(SESSION_TOKEN_KEY);
+  }
+}
+
+export function getSessionToken() {
+  if (typeof window === 'undefined') return null;
+  return window.localStorage.getItem(SESSION_TOKEN_KEY);
+}
+
 // Helper function to make API requests
 export async function apiRequest(endpoint, options = {}) {
   // Use the proxy route with endpoint as query parameter
   const url = `${API_BASE_URL}?endpoint=${encodeURIComponent(endpoint)}`;
   
-  const defaultOptions = {
-    headers: {
-      'Content-Type': 'application/json',
-      'Accept': 'application/json',
-    },
+  const headers = {
+    'Content-Type': 'application/json',
+    'Accept': 'application/json',
   };
+  const token = getSessionToken();
+  if (token) {
+    headers['Authorization'] = `Bearer ${token}`;
+  }
   
-  const mergedOptions = { ...defaultOptions, ...options };
+  const mergedOptions = { ...options, headers: { ...headers, ...(options.headers || {}) } };
   
   try {
     console.log(`Making API request via proxy to: ${endpoint}`, { options: mergedOptions }); // Debug log
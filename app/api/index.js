@@ -2,7 +2,7 @@
 export * from './auth.js';
 export * from './posts.js';
 export * from './replies.js';
-export { apiRequest } from './config.js';
+export { apiRequest, getSessionToken, setSessionToken } from './config.js';
 
 // Example usage:
 /*
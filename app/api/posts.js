@@ -1,19 +1,41 @@
 import { apiRequest } from './config.js';
 
 /**
- * Get all posts
+ * Build the `limit`/`cursor` query string for paginated feeds
+ * @param {Object} page - Optional: { limit, cursor, includeReplies } where cursor is a previous response's
+ *   next_cursor; includeReplies: false returns only each post's reply_count
+ * @returns {string} Query string fragment starting with '&', or ''
+ */
+function pageParams(page = {}) {
+  let q = '';
+  if (page.limit) {
+    q += `&limit=${encodeURIComponent(page.limit)}`;
+  }
+  if (page.cursor) {
+    q += `&cursor=${encodeURIComponent(page.cursor)}`;
+  }
+  if (page.includeReplies === false) {
+    q += '&include_replies=false';
+  }
+  return q;
+}
+
+/**
+ * Get all posts (one page; pass the returned next_cursor to fetch the next one)
  * @param {string} requesterSchoolId - Optional: Requester's school ID (for teacher view)
  * @param {boolean} showPending - Optional: For teachers, whether to show pending (unvalidated) posts
+ * @param {Object} page - Optional: { limit, cursor }
  * @returns {Promise<Object>} All posts response
  */
-export async function getPostList(requesterSchoolId = null, showPending = false) {
+export async function getPostList(requesterSchoolId = null, showPending = false, page = {}) {
   let url = requesterSchoolId 
     ? `/post-list?requester_school_id=${encodeURIComponent(requesterSchoolId)}`
-    : '/post-list';
+    : '/post-list?';
   
   if (requesterSchoolId && typeof showPending === 'boolean') {
     url += `&show_pending=${showPending ? 'true' : 'false'}`;
   }
+  url += pageParams(page);
   
   return await apiRequest(url, {
     method: 'GET'
@@ -53,9 +75,10 @@ export async function postUpload(postData) {
  * @param {string} category - Category name
  * @param {string} requesterSchoolId - Optional: Requester's school ID (for teacher view)
  * @param {boolean} showPending - Optional: For teachers, whether to show pending (unvalidated) posts
+ * @param {Object} page - Optional: { limit, cursor }
  * @returns {Promise<Object>} Filtered posts response
  */
-export async function getPostsByCategory(category, requesterSchoolId = null, showPending = false) {
+export async function getPostsByCategory(category, requesterSchoolId = null, showPending = false, page = {}) {
   let url = `/post-by-category?category=${encodeURIComponent(category)}`;
   if (requesterSchoolId) {
     url += `&requester_school_id=${encodeURIComponent(requesterSchoolId)}`;
@@ -63,6 +86,27 @@ export async function getPostsByCategory(category, requesterSchoolId = null, sho
   if (requesterSchoolId && typeof showPending === 'boolean') {
     url += `&show_pending=${showPending ? 'true' : 'false'}`;
   }
+  url += pageParams(page);
+  return await apiRequest(url, {
+    method: 'GET'
+  });
+}
+
+/**
+ * Count the visible posts of several categories in one request
+ * @param {Array<string>} categories - Category names
+ * @param {string} requesterSchoolId - Optional: Requester's school ID (for teacher view)
+ * @param {boolean} showPending - Optional: For admins, whether to count pending (unvalidated) posts
+ * @returns {Promise<Object>} { status, counts: { category: number } } response
+ */
+export async function getPostCounts(categories, requesterSchoolId = null, showPending = false) {
+  let url = '/post-counts?' + categories.map((category) => `category=${encodeURIComponent(category)}`).join('&');
+  if (requesterSchoolId) {
+    url += `&requester_school_id=${encodeURIComponent(requesterSchoolId)}`;
+    if (showPending) {
+      url += '&show_pending=true';
+    }
+  }
   return await apiRequest(url, {
     method: 'GET'
   });
@@ -71,17 +115,37 @@ export async function getPostsByCategory(category, requesterSchoolId = null, sho
 /**
  * Get user's own posts
  * @param {string} authorId - Author ID
+ * @param {Object} page - Optional: { limit, cursor }
  * @returns {Promise<Object>} User's posts response
  */
-export async function getMyPosts(authorId) {
+export async function getMyPosts(authorId, page = {}) {
   return await apiRequest('/my-post-list', {
     method: 'POST',
     body: JSON.stringify({
-      author_id: authorId
+      author_id: authorId,
+      limit: page.limit,
+      cursor: page.cursor,
+      include_replies: page.includeReplies !== false
     })
   });
 }
 
+/**
+ * Get totals over all of a user's posts: post_count, replies_received and per-category post counts
+ * @param {string} authorId - Author ID
+ * @param {string} requesterSchoolId - Optional: Requester's school ID
+ * @returns {Promise<Object>} { status, post_count, replies_received, categories } response
+ */
+export async function getAuthorPostStats(authorId, requesterSchoolId = null) {
+  let url = `/author-post-stats?author_id=${encodeURIComponent(authorId)}`;
+  if (requesterSchoolId) {
+    url += `&requester_school_id=${encodeURIComponent(requesterSchoolId)}`;
+  }
+  return await apiRequest(url, {
+    method: 'GET'
+  });
+}
+
 /**
  * Get a specific post by ID
  * @param {number} postId - Post ID
@@ -99,6 +163,31 @@ export async function getPost(postId, requesterSchoolId = null) {
   });
 }
 
+/**
+ * Full-text search over post titles, contents and replies (ranked, one page at a time)
+ * @param {string} query - Search terms
+ * @param {Object} options - Optional: { category, requesterSchoolId, showPending }
+ * @param {Object} page - Optional: { limit, cursor }
+ * @returns {Promise<Object>} Matching posts response
+ */
+export async function searchPosts(query, options = {}, page = {}) {
+  let url = `/search-posts?q=${encodeURIComponent(query)}`;
+  if (options.category) {
+    url += `&category=${encodeURIComponent(options.category)}`;
+  }
+  if (options.requesterSchoolId) {
+    url += `&requester_school_id=${encodeURIComponent(options.requesterSchoolId)}`;
+    if (options.showPending) {
+      url += '&show_pending=true';
+    }
+  }
+  url += pageParams(page);
+
+  return await apiRequest(url, {
+    method: 'GET'
+  });
+}
+
 /**
  * Get classes for a teacher
  * @param {string} schoolId - Teacher's school ID
@@ -125,7 +214,7 @@ export async function getStudentInfo(schoolId, requesterSchoolId = null) {
 /**
  * Get student post count by author ID
  * @param {string} authorId - Student's author ID
- * @returns {Promise<Object>} Post count response
+ * @returns {Promise<Object>} { post_count: every post by the student, validated_post_count: validated posts only }
  */
 export async function getStudentPostCount(authorId) {
   return await apiRequest(`/get-student-post-count?author_id=${authorId}`, {
@@ -177,6 +266,26 @@ export async function removeStudentFromClass(classId, schoolId) {
   });
 }
 
+/**
+ * Add and remove many students in one request (applied atomically)
+ * @param {number} classId - Class ID
+ * @param {string} creatorId - Teacher's school ID (must own the class)
+ * @param {string[]} add - School IDs to add
+ * @param {string[]} remove - School IDs to remove
+ * @returns {Promise<Object>} Bulk roster response with per-id results
+ */
+export async function bulkUpdateClassRoster(classId, creatorId, add = [], remove = []) {
+  return await apiRequest('/class-roster/bulk', {
+    method: 'POST',
+    body: JSON.stringify({
+      class_id: classId,
+      creator_id: creatorId,
+      add: add,
+      remove: remove
+    })
+  });
+}
+
 /**
  * Create a new class
  * @param {number} creatorId - Teacher's school ID
@@ -260,11 +369,54 @@ export async function validatePost(postId, requesterSchoolId) {
 }
 
 /**
- * Get pending posts and replies (admin/teacher only)
+ * Block or validate many posts and replies in one request (teacher/admin only)
+ * @param {Array<Object>} items - [{ type: 'post'|'reply', id, action: 'block'|'validate' }, ...]
+ * @param {string} requesterSchoolId - Teacher's school ID
+ * @returns {Promise<Object>} Per-item results plus the ids that were not found
+ */
+export async function moderateBulk(items, requesterSchoolId) {
+  return await apiRequest('/moderate/bulk', {
+    method: 'POST',
+    body: JSON.stringify({
+      items,
+      requester_school_id: requesterSchoolId
+    })
+  });
+}
+
+/**
+ * Get one page of pending posts and replies (admin/teacher only)
+ * @param {string} requesterSchoolId - School ID of requester
+ * @param {Object} options - Optional: { kind: 'post'|'reply', order: 'newest'|'oldest', category, authorId,
+ *   limit, postCursor, replyCursor } where the cursors are a previous response's next_post_cursor / next_reply_cursor
+ */
+export async function getPendingContent(requesterSchoolId, options = {}) {
+  let url = `/pending-content?requester_school_id=${encodeURIComponent(requesterSchoolId)}`;
+  const params = {
+    kind: options.kind,
+    order: options.order,
+    category: options.category,
+    author_id: options.authorId,
+    limit: options.limit,
+    post_cursor: options.postCursor,
+    reply_cursor: options.replyCursor
+  };
+  for (const [key, value] of Object.entries(params)) {
+    if (value) {
+      url += `&${key}=${encodeURIComponent(value)}`;
+    }
+  }
+  return await apiRequest(url, {
+    method: 'GET'
+  });
+}
+
+/**
+ * Get pending post/reply totals for the moderation badge (admin/teacher only)
  * @param {string} requesterSchoolId - School ID of requester
  */
-export async function getPendingContent(requesterSchoolId) {
-  return await apiRequest(`/pending-content?requester_school_id=${encodeURIComponent(requesterSchoolId)}`, {
+export async function getPendingCounts(requesterSchoolId) {
+  return await apiRequest(`/pending-content/counts?requester_school_id=${encodeURIComponent(requesterSchoolId)}`, {
     method: 'GET'
   });
 }
@@ -15,14 +15,31 @@ export async function GET(request: NextRequest) {
     const url = `${API_BASE_URL}${endpoint}`;
     console.log(`Proxying GET request to: ${url}`);
     
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/json',
+      'Accept': 'application/json',
+    };
+    // Pass conditional requests through so the backend can answer 304 Not Modified
+    const ifNoneMatch = request.headers.get('if-none-match');
+    if (ifNoneMatch) {
+      headers['If-None-Match'] = ifNoneMatch;
+    }
+    const authorization = request.headers.get('authorization');
+    if (authorization) {
+      headers['Authorization'] = authorization;
+    }
+
     const response = await fetch(url, {
       method: 'GET',
-      headers: {
-        'Content-Type': 'application/json',
-        'Accept': 'application/json',
-      },
+      headers,
+      cache: 'no-store',
     });
 
+    const etag = response.headers.get('etag');
+    if (response.status === 304) {
+      return new NextResponse(null, { status: 304, headers: etag ? { ETag: etag } : undefined });
+    }
+
     if (!response.ok) {
       const errorText = await response.text();
       console.error(`API Error ${response.status}:`, errorText);
@@ -30,7 +47,7 @@ export async function GET(request: NextRequest) {
     }
 
     const data = await response.json();
-    return NextResponse.json(data);
+    return NextResponse.json(data, { headers: etag ? { ETag: etag } : undefined });
   } catch (error) {
     console.error('Proxy request failed:', error);
     return NextResponse.json(
@@ -54,12 +71,19 @@ export async function POST(request: NextRequest) {
     // Debug: Log the body being sent to the backend
     console.log(`[PROXY LOGIN DEBUG] POST to ${url} with body:`, JSON.stringify(body));
 
+    const headers: Record<string, string> = {
+      'Content-Type': 'application/json',
+      'Accept': 'application/json',
+    };
+    // Forward the session token issued at login
+    const authorization = request.headers.get('authorization');
+    if (authorization) {
+      headers['Authorization'] = authorization;
+    }
+
     const response = await fetch(url, {
       method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-        'Accept': 'application/json',
-      },
+      headers,
       body: JSON.stringify(body),
     });
 
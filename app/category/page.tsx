@@ -4,7 +4,7 @@ import Navbar from '../../components/Navbar';
 import { useRouter } from 'next/navigation';
 import { allPosts } from '../centralData';
 import { PostWithReplies } from '../types';
-import { getPostsByCategory } from '../api/posts';
+import { getPostCounts, getPostsByCategory } from '../api/posts';
 
 const categoryGroups = {
   "School Life": [
@@ -101,6 +101,9 @@ export default function Categories() {
   const [showReplies, setShowReplies] = useState<{ [key: number]: boolean }>({});
   const [classPosts, setClassPosts] = useState<PostWithReplies[]>([]);
   const [loading, setLoading] = useState<boolean>(false);
+  // Cursor for the next page of the selected class; null once the last page has been loaded
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const [postCounts, setPostCounts] = useState<{ [key: string]: number }>({});
   const [currentUser, setCurrentUser] = useState<any>(null);
   const [showPending, setShowPending] = useState<boolean>(false); // Teacher toggle for pending posts
@@ -140,57 +143,59 @@ export default function Categories() {
     }));
   };
 
-  const loadPostsForClass = async (className: string) => {
+  // With a cursor, the next page is appended to the posts already shown
+  const loadPostsForClass = async (className: string, cursor?: string | null) => {
     try {
-      setLoading(true);
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+      }
       const requesterSchoolId = currentUser?.school_id;
       // For teachers use the toggle value, for non-teachers use false (don't show pending)
   const showPendingParam = (isTeacher || isAdmin) ? showPending : false;
       console.log('Loading posts for class:', className, 'showPending:', showPendingParam, 'isTeacher:', isTeacher);
-      const response: any = await getPostsByCategory(className, requesterSchoolId, showPendingParam);
+      const response: any = await getPostsByCategory(className, requesterSchoolId, showPendingParam, { cursor });
       if (response.status === 'success') {
         const posts = response.posts.map((post: any) => ({
           ...post,
           replies: post.replies || []
         }));
         console.log('Loaded posts:', posts.length, 'posts for class:', className);
-        setClassPosts(posts);
+        setClassPosts(prevPosts => cursor ? [...prevPosts, ...posts] : posts);
+        setNextCursor(response.next_cursor || null);
       } else {
         throw new Error(response.message || 'Failed to load posts');
       }
     } catch (error) {
       console.error('Error loading posts for class:', error);
+      if (cursor) {
+        // Keep the posts already shown; the button stays so the page can be retried
+        return;
+      }
+      setNextCursor(null);
       // Fall back to local data
       const fallbackPosts = allPosts.filter(post => post.category === className);
       setClassPosts(fallbackPosts);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
   // Load post counts for all classes in a subject
   const loadPostCountsForSubject = async (subject: keyof typeof categoryGroups) => {
     const classes = categoryGroups[subject];
-    const counts: { [key: string]: number } = {};
     try {
-      // Load counts for all classes in parallel
+      // One request counts every class in the subject
       const requesterSchoolId = currentUser?.school_id;
   const showPendingParam = (isTeacher || isAdmin) ? showPending : false;
       console.log('Loading post counts for subject:', subject, 'showPending:', showPendingParam, 'isTeacher:', isTeacher);
-      const countPromises = classes.map(async (className) => {
-        try {
-          const response: any = await getPostsByCategory(className, requesterSchoolId, showPendingParam);
-          if (response.status === 'success') {
-            counts[className] = response.posts.length;
-          } else {
-            counts[className] = 0;
-          }
-        } catch (error) {
-          console.error(`Error loading count for ${className}:`, error);
-          counts[className] = 0;
-        }
-      });
-      await Promise.all(countPromises);
+      const response: any = await getPostCounts(classes, requesterSchoolId, showPendingParam);
+      if (response.status !== 'success') {
+        throw new Error(response.message || 'Failed to load post counts');
+      }
+      const counts: { [key: string]: number } = response.counts;
       console.log('Loaded post counts:', counts);
       setPostCounts(prevCounts => ({ ...prevCounts, ...counts }));
     } catch (error) {
@@ -407,6 +412,17 @@ export default function Categories() {
                     </div>
                   ))
                 )}
+                {!loading && nextCursor && (
+                  <div className="text-center">
+                    <button
+                      onClick={() => loadPostsForClass(selectedClass, nextCursor)}
+                      disabled={loadingMore}
+                      className="bg-blue-600 hover:bg-blue-700 text-white px-6 py-2 rounded-lg font-medium transition-colors disabled:opacity-50"
+                    >
+                      {loadingMore ? 'Loading...' : 'Load more posts'}
+                    </button>
+                  </div>
+                )}
               </div>
             </div>
           )}
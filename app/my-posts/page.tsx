@@ -16,6 +16,9 @@ export default function MyPosts() {
   const [showReplies, setShowReplies] = useState<{ [key: number]: boolean }>({});
   const [userPosts, setUserPosts] = useState<PostWithReplies[]>([]);
   const [loading, setLoading] = useState<boolean>(true);
+  // Cursor for the next page of posts; null once the last page has been loaded
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const [error, setError] = useState<string>("");
   const [currentUser, setCurrentUser] = useState<any>(null);
   const [isTeacher, setIsTeacher] = useState<boolean>(false);
@@ -48,19 +51,25 @@ export default function MyPosts() {
     }
   }, [currentUser]);
 
-  const loadMyPosts = async (userId: string) => {
+  // With a cursor, the next page is appended to the posts already shown
+  const loadMyPosts = async (userId: string, cursor?: string | null) => {
     try {
-      setLoading(true);
+      if (cursor) {
+        setLoadingMore(true);
+      } else {
+        setLoading(true);
+      }
       setError("");
-      console.log('Loading my posts for user:', userId);
-      const response: any = await getMyPosts(userId);
+      console.log('Loading my posts for user:', userId, 'cursor:', cursor);
+      const response: any = await getMyPosts(userId, { cursor });
       
       if (response.status === 'success') {
         const posts = response.posts.map((post: any) => ({
           ...post,
           replies: post.replies || []
         }));
-        setUserPosts(posts);
+        setUserPosts(prevPosts => cursor ? [...prevPosts, ...posts] : posts);
+        setNextCursor(response.next_cursor || null);
         if (response.message && response.message.includes('fallback')) {
           setError(`Note: ${response.message}`);
         }
@@ -72,6 +81,7 @@ export default function MyPosts() {
       setError(`Failed to load your posts: ${error instanceof Error ? error.message : 'Unknown error'}. Please try again.`);
     } finally {
       setLoading(false);
+      setLoadingMore(false);
     }
   };
 
@@ -214,6 +224,17 @@ export default function MyPosts() {
                   )}
                 </div>
               ))}
+              {nextCursor && (
+                <div className="text-center">
+                  <button
+                    onClick={() => currentUser?.user_id && loadMyPosts(currentUser.user_id, nextCursor)}
+                    disabled={loadingMore}
+                    className="bg-blue-600 hover:bg-blue-700 disabled:bg-gray-400 text-white px-6 py-2 rounded-lg font-medium transition-colors"
+                  >
+                    {loadingMore ? 'Loading...' : 'Load more posts'}
+                  </button>
+                </div>
+              )}
             </div>
           )}
         </main>
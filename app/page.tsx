@@ -142,6 +142,9 @@ function HomeContent() {
   const [isTeacher, setIsTeacher] = useState<boolean>(false);
 	const [isAdmin, setIsAdmin] = useState<boolean>(false);
   const [teacherLoading, setTeacherLoading] = useState<boolean>(true);
+  // Cursor for the next page of the feed; null once the last page has been loaded
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState<boolean>(false);
   const router = useRouter();
   const searchParams = useSearchParams();
 
@@ -188,23 +191,27 @@ useEffect(() => {
   // eslint-disable-next-line
 }, [currentUser, showPending, isTeacher, teacherLoading, selectedCategory]);
 
-// Function to load posts from API
-const loadPosts = async (category?: string) => {
+// Function to load posts from API; with a cursor, the next page is appended to the loaded posts
+const loadPosts = async (category?: string, cursor?: string | null) => {
   try {
-	console.log('Loading posts with:', { category, isTeacher, showPending });
-	setLoading(true);
+	console.log('Loading posts with:', { category, isTeacher, showPending, cursor });
+	if (cursor) {
+	  setLoadingMore(true);
+	} else {
+	  setLoading(true);
+	}
 	let response: any;
 	const requesterSchoolId = currentUser?.school_id;
 	if (category && category !== "All") {
 	  // Pass showPending for category-specific requests - for teachers use the toggle value, for non-teachers use false
 	const showPendingParam = (isTeacher || isAdmin) ? showPending : false;
 	  console.log('Loading category posts with showPending:', showPendingParam);
-	  response = await getPostsByCategory(category, requesterSchoolId, showPendingParam);
+	  response = await getPostsByCategory(category, requesterSchoolId, showPendingParam, { cursor });
 	} else {
 	  // For home page (All posts), pass showPending for teachers, false for non-teachers
 	const showPendingParam = (isTeacher || isAdmin) ? showPending : false;
 	  console.log('Loading all posts with showPending:', showPendingParam);
-	  response = await getPostList(requesterSchoolId, showPendingParam);
+	  response = await getPostList(requesterSchoolId, showPendingParam, { cursor });
 	}
 	if (response.status === 'success') {
 	  console.log('Posts loaded successfully:', response.posts.length, 'posts');
@@ -222,12 +229,18 @@ const loadPosts = async (category?: string) => {
 	  const validatedCount = posts.filter((p: any) => p.validated === 1).length;
 	  const pendingCount = posts.filter((p: any) => p.validated === 0).length;
 	  console.log('Validated posts:', validatedCount, 'Pending posts:', pendingCount);
-	  setFilteredPosts(posts);
+	  setFilteredPosts(prevPosts => cursor ? [...prevPosts, ...posts] : posts);
+	  setNextCursor(response.next_cursor || null);
 	} else {
 	  throw new Error(response.message || 'Failed to load posts');
 	}
   } catch (error) {
 	console.error('Error loading posts:', error);
+	if (cursor) {
+	  // Keep the posts already shown; the button stays so the page can be retried
+	  return;
+	}
+	setNextCursor(null);
 	if (category && category !== "All") {
 	  setFilteredPosts(allPosts.filter(post => post.category === category));
 	} else {
@@ -235,6 +248,7 @@ const loadPosts = async (category?: string) => {
 	}
   } finally {
 	setLoading(false);
+	setLoadingMore(false);
   }
 };
 
@@ -424,6 +438,18 @@ const loadPosts = async (category?: string) => {
 							</div>
 						))
 					)}
+					{/* Load the next page of the feed (search filters only the posts already loaded) */}
+					{!loading && !teacherLoading && !searchQuery && nextCursor && (
+						<div className="text-center mt-2 mb-6">
+							<button
+								className="px-6 py-2 bg-blue-600 text-white rounded-lg font-semibold hover:bg-blue-700 disabled:opacity-50"
+								disabled={loadingMore}
+								onClick={() => loadPosts(selectedCategory, nextCursor)}
+							>
+								{loadingMore ? "Loading..." : "Load more posts"}
+							</button>
+						</div>
+					)}
 				</main>
 			</div>
 		</div>
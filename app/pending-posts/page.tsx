@@ -1,7 +1,7 @@
 "use client";
 import React, { useEffect, useState } from 'react';
 import Navbar from '../../components/Navbar';
-import { getPendingContent, validatePost, blockPost } from '../api/posts';
+import { getPendingContent, getPendingCounts, validatePost, blockPost } from '../api/posts';
 import { validateReply, blockReply } from '../api/replies';
 
 interface PendingPost { post_id:number; title:string; content:string; author_id:string; upload_time:string; anonymous:number; category:string; validated:number; }
@@ -13,6 +13,12 @@ export default function PendingPostsPage(){
   const [posts,setPosts]=useState<PendingPost[]>([]);
   const [replies,setReplies]=useState<PendingReply[]>([]);
   const [error,setError]=useState<string>('');
+  // Keyset cursors for the next page of each list; null once that list is fully loaded
+  const [postCursor,setPostCursor]=useState<string|null>(null);
+  const [replyCursor,setReplyCursor]=useState<string|null>(null);
+  const [loadingMore,setLoadingMore]=useState<'post'|'reply'|null>(null);
+  // Queue totals from the maintained counters; the lists above only hold the loaded pages
+  const [counts,setCounts]=useState<{posts:number; replies:number}|null>(null);
 
   useEffect(()=>{
     if (typeof window === 'undefined' || typeof window.localStorage === 'undefined') return;
@@ -29,30 +35,62 @@ export default function PendingPostsPage(){
       const res:any = await getPendingContent(currentUser.school_id);
       if(res.status==='success'){
         setPosts(res.posts||[]); setReplies(res.replies||[]);
+        setPostCursor(res.next_post_cursor||null); setReplyCursor(res.next_reply_cursor||null);
       } else { setError(res.message||'Failed to load'); }
+      await loadCounts();
     } catch(e:any){ setError(e.message||'Failed to load'); }
     finally { setLoading(false); }
   };
 
+  const loadCounts = async ()=>{
+    if(!currentUser?.school_id) return;
+    try {
+      const res:any = await getPendingCounts(currentUser.school_id);
+      if(res.status==='success'){ setCounts(res.counts); }
+    } catch(e:any){ console.error('Failed to load pending counts', e); }
+  };
+
+  // Append the next page of one list; the other list and its cursor are left alone
+  const loadMore = async (kind:'post'|'reply')=>{
+    if(!currentUser?.school_id) return;
+    setLoadingMore(kind);
+    try {
+      const res:any = kind==='post'
+        ? await getPendingContent(currentUser.school_id,{ kind, postCursor: postCursor||undefined })
+        : await getPendingContent(currentUser.school_id,{ kind, replyCursor: replyCursor||undefined });
+      if(res.status!=='success'){ alert(res.message||'Failed to load more'); return; }
+      if(kind==='post'){
+        setPosts(prev=>[...prev,...(res.posts||[])]); setPostCursor(res.next_post_cursor||null);
+      } else {
+        setReplies(prev=>[...prev,...(res.replies||[])]); setReplyCursor(res.next_reply_cursor||null);
+      }
+    } catch(e:any){ alert(e.message||'Failed to load more'); }
+    finally { setLoadingMore(null); }
+  };
+
+  // A moderated item leaves the queue; drop it locally so the loaded pages and cursors stay valid
+  const removePost = async (postId:number)=>{ setPosts(prev=>prev.filter(p=>p.post_id!==postId)); await loadCounts(); };
+  const removeReply = async (replyId:number)=>{ setReplies(prev=>prev.filter(r=>r.reply_id!==replyId)); await loadCounts(); };
+
   const handleValidatePost = async (postId:number)=>{
     if(!currentUser?.school_id) return;
     const res:any = await validatePost(postId,currentUser.school_id);
-    if(res.status==='success'){ await loadPending(); } else { alert(res.message||'Failed to validate post'); }
+    if(res.status==='success'){ await removePost(postId); } else { alert(res.message||'Failed to validate post'); }
   };
   const handleBlockPost = async (postId:number)=>{
     if(!currentUser?.school_id) return;
     const res:any = await blockPost(postId,currentUser.school_id);
-    if(res.status==='success'){ await loadPending(); } else { alert(res.message||'Failed to block post'); }
+    if(res.status==='success'){ await removePost(postId); } else { alert(res.message||'Failed to block post'); }
   };
   const handleValidateReply = async (replyId:number)=>{
     if(!currentUser?.school_id) return;
     const res:any = await validateReply(replyId,currentUser.school_id);
-    if(res.status==='success'){ await loadPending(); } else { alert(res.message||'Failed to validate reply'); }
+    if(res.status==='success'){ await removeReply(replyId); } else { alert(res.message||'Failed to validate reply'); }
   };
   const handleBlockReply = async (replyId:number)=>{
     if(!currentUser?.school_id) return;
     const res:any = await blockReply(replyId,currentUser.school_id);
-    if(res.status==='success'){ await loadPending(); } else { alert(res.message||'Failed to block reply'); }
+    if(res.status==='success'){ await removeReply(replyId); } else { alert(res.message||'Failed to block reply'); }
   };
 
   const getAuthorDisplay = (anon:number, author:string)=> anon ? author + ' (Anon)' : author;
@@ -76,7 +114,7 @@ export default function PendingPostsPage(){
           {!loading && !error && (
             <div className='space-y-10'>
               <section>
-                <h2 className='text-2xl font-semibold text-blue-700 mb-4'>Posts Awaiting Validation ({posts.length})</h2>
+                <h2 className='text-2xl font-semibold text-blue-700 mb-4'>Posts Awaiting Validation ({counts ? counts.posts : posts.length})</h2>
                 {posts.length===0 && <div className='bg-white p-4 rounded border text-gray-500'>No pending posts.</div>}
                 <div className='space-y-4'>
                   {posts.map(p=> (
@@ -94,10 +132,15 @@ export default function PendingPostsPage(){
                     </div>
                   ))}
                 </div>
+                {postCursor && (
+                  <button onClick={()=>loadMore('post')} disabled={loadingMore==='post'} className='mt-4 bg-blue-600 hover:bg-blue-700 disabled:opacity-50 text-white px-4 py-2 rounded text-sm font-semibold'>
+                    {loadingMore==='post' ? 'Loading...' : `Load more posts (${posts.length} shown)`}
+                  </button>
+                )}
               </section>
 
               <section>
-                <h2 className='text-2xl font-semibold text-blue-700 mb-4'>Replies Awaiting Validation ({replies.length})</h2>
+                <h2 className='text-2xl font-semibold text-blue-700 mb-4'>Replies Awaiting Validation ({counts ? counts.replies : replies.length})</h2>
                 {replies.length===0 && <div className='bg-white p-4 rounded border text-gray-500'>No pending replies.</div>}
                 <div className='space-y-4'>
                   {replies.map(r=> (
@@ -115,6 +158,11 @@ export default function PendingPostsPage(){
                     </div>
                   ))}
                 </div>
+                {replyCursor && (
+                  <button onClick={()=>loadMore('reply')} disabled={loadingMore==='reply'} className='mt-4 bg-blue-600 hover:bg-blue-700 disabled:opacity-50 text-white px-4 py-2 rounded text-sm font-semibold'>
+                    {loadingMore==='reply' ? 'Loading...' : `Load more replies (${replies.length} shown)`}
+                  </button>
+                )}
               </section>
             </div>
           )}
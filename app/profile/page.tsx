@@ -3,7 +3,8 @@ import React, { useState, useEffect } from 'react';
 import Navbar from '../../components/Navbar';
 import { useRouter } from 'next/navigation';
 // No import of currentUser; we'll use localStorage
-import { getMyPosts } from "../api/posts";
+import { getAuthorPostStats, getMyPosts } from "../api/posts";
+import { setSessionToken } from "../api/config";
 import { PostWithReplies } from "../types";
 
 function getAuthorDisplay(isAnonymous: boolean | number, authorId: string, isAdminView: boolean) {
@@ -17,6 +18,8 @@ function getAuthorDisplay(isAnonymous: boolean | number, authorId: string, isAdm
 
 export default function Profile() {
   const [userPosts, setUserPosts] = useState<PostWithReplies[]>([]);
+  // Totals over every post, computed by the server rather than from pages of posts
+  const [postStats, setPostStats] = useState<{ post_count: number; replies_received: number; categories: { [key: string]: number } } | null>(null);
   const [loading, setLoading] = useState<boolean>(true);
   const [userLoading, setUserLoading] = useState<boolean>(true);
   const [error, setError] = useState<string>("");
@@ -51,17 +54,24 @@ export default function Profile() {
       setLoading(true);
       setError("");
       console.log('Loading my posts for user:', userId);
-      const response: any = await getMyPosts(userId);
+      // Only the five most recent posts are listed; the stats come from one aggregate request
+      const [response, statsResponse]: any[] = await Promise.all([
+        getMyPosts(userId, { limit: 5, includeReplies: false }),
+        getAuthorPostStats(userId, currentUser?.school_id)
+      ]);
       
-      if (response.status === 'success') {
-        const posts = response.posts.map((post: any) => ({
-          ...post,
-          replies: post.replies || []
-        }));
-        setUserPosts(posts);
-      } else {
+      if (response.status !== 'success') {
         throw new Error(response.message || 'Failed to load posts');
       }
+      if (statsResponse.status !== 'success') {
+        throw new Error(statsResponse.message || 'Failed to load post stats');
+      }
+      const posts = response.posts.map((post: any) => ({
+        ...post,
+        replies: post.replies || []
+      }));
+      setUserPosts(posts);
+      setPostStats(statsResponse);
     } catch (error) {
       console.error('Error loading user posts:', error);
       setError(`Failed to load your posts: ${error instanceof Error ? error.message : 'Unknown error'}. Please try again.`);
@@ -75,18 +85,16 @@ export default function Profile() {
     if (typeof window !== "undefined") {
       localStorage.removeItem("isLoggedIn");
       localStorage.removeItem("currentUser");
+      // The bearer token carries this user's role; never leave it for the next person on this browser
+      setSessionToken(null);
       router.push("/login");
     }
   };
 
   // Calculate stats
-  const totalReplies = userPosts.reduce((total: number, post: PostWithReplies) => total + (post.replies?.length || 0), 0);
-  const mostActiveSubject = userPosts.length > 0 
-    ? userPosts.reduce((acc: { [key: string]: number }, post) => {
-        acc[post.category] = (acc[post.category] || 0) + 1;
-        return acc;
-      }, {})
-    : {};
+  const totalPosts = postStats ? postStats.post_count : userPosts.length;
+  const totalReplies = postStats ? postStats.replies_received : 0;
+  const mostActiveSubject: { [key: string]: number } = postStats ? postStats.categories : {};
   const mostActiveSubjectName = Object.keys(mostActiveSubject).length > 0 
     ? Object.keys(mostActiveSubject).reduce((a, b) => mostActiveSubject[a] > mostActiveSubject[b] ? a : b)
     : "None yet";
@@ -211,7 +219,7 @@ export default function Profile() {
                 <div>
                   <span className="text-gray-600 font-semibold">Total Posts:</span>
                   <span className="text-yellow-600 ml-2 font-bold">
-                    {loading ? "..." : userPosts.length}
+                    {loading ? "..." : totalPosts}
                   </span>
                 </div>
                 <div>
@@ -264,7 +272,7 @@ export default function Profile() {
                   <div className="text-gray-600">
                     <span className="font-semibold text-yellow-600 bg-yellow-50 px-2 py-1 rounded">{post.category}</span> • 
                     <span className="text-gray-500 ml-1">{new Date(post.upload_time).toLocaleDateString()}</span> • 
-                    <span className="text-blue-600 ml-1 font-semibold">{post.replies?.length || 0} replies</span>
+                    <span className="text-blue-600 ml-1 font-semibold">{post.reply_count || 0} replies</span>
                     {post.anonymous === 1 && <span className="text-orange-600 ml-1 font-semibold">• Posted Anonymously</span>}
                     {post.validated === 0 && <span className="text-red-600 ml-1 font-semibold">• Pending Validation</span>}
                   </div>
@@ -11,6 +11,7 @@ export interface Post {
   reply?: string; // longtext - for backwards compatibility, but we'll use Reply[] instead
   title: string; // varchar(100)
   validated: number; // tinyint(1) - 0 or 1
+  reply_count?: number; // maintained counter, sent with every feed record
 }
 
 export interface Reply {
@@ -0,0 +1,70 @@
+"""Check that concurrent /post-list requests overlap instead of queuing on the event loop.
+
+Run against a live server:
+    python bench/concurrent_post_list.py --base-url http://localhost:8000 --concurrency 16
+
+It prints the sequential and concurrent wall times and an overlap factor
+(sum of per-request latencies / concurrent wall time). A factor close to 1
+means requests are being serialized; close to --concurrency means they overlap.
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+
+def timed_get(session, url, params):
+    start = time.perf_counter()
+    response = session.get(url, params=params, timeout=60)
+    response.raise_for_status()
+    return time.perf_counter() - start
+
+
+def run(base_url, concurrency, rounds, params):
+    url = base_url.rstrip("/") + "/post-list"
+    session = requests.Session()
+    # Warm up connections and any server-side caches
+    timed_get(session, url, params)
+
+    start = time.perf_counter()
+    sequential = [timed_get(session, url, params) for _ in range(concurrency)]
+    sequential_wall = time.perf_counter() - start
+
+    concurrent = []
+    concurrent_wall = 0.0
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        sessions = [requests.Session() for _ in range(concurrency)]
+        for _ in range(rounds):
+            start = time.perf_counter()
+            concurrent.extend(pool.map(lambda s: timed_get(s, url, params), sessions))
+            concurrent_wall += time.perf_counter() - start
+
+    return {
+        "concurrency": concurrency,
+        "rounds": rounds,
+        "sequential_wall_s": round(sequential_wall, 4),
+        "sequential_mean_latency_s": round(sum(sequential) / len(sequential), 4),
+        "concurrent_wall_per_round_s": round(concurrent_wall / rounds, 4),
+        "concurrent_mean_latency_s": round(sum(concurrent) / len(concurrent), 4),
+        "overlap_factor": round(sum(concurrent) / concurrent_wall, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--requester-school-id", default=None)
+    args = parser.parse_args()
+    params = {"limit": args.limit}
+    if args.requester_school_id:
+        params["requester_school_id"] = args.requester_school_id
+    print(json.dumps(run(args.base_url, args.concurrency, args.rounds, params), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""Offline load test: seed a local database, then drive mixed traffic at the real app.
+
+    python bench/loadtest.py --posts 20000 --concurrency 32 --duration 30 --output before.json
+    python bench/loadtest.py --database /tmp/forum.sqlite --reuse --compare before.json
+    python bench/loadtest.py --database /tmp/forum.sqlite --reuse --indexes --compare before.json
+    python bench/loadtest.py --db mysql --seed-only          # DB_HOST/DB_USER/DB_PASSWORD/DB_NAME from the env
+    python bench/loadtest.py --db mysql --reuse --base-url http://localhost:8000
+    python bench/loadtest.py --database /tmp/forum.sqlite --reuse --replicas 2 --replica-lag 1
+
+By default the database is the SQLite stand-in (bench/standin.py) in a fresh file. The app
+runs in this process behind httpx's ASGI transport, so latencies cover routing, validation,
+the DB executor and serialization, but no network. --base-url sends the same traffic to a
+running server instead; seed that server's database first. --replicas gives the stand-in
+lagging read replicas; for MySQL, set DB_REPLICA_HOSTS.
+Throughput and p50/p95/p99 latency per route are printed and written to --output as JSON.
+--compare prints the change from an earlier result file.
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+import schema  # noqa: E402
+import standin  # noqa: E402
+
+# Handlers report failures as 200 {"status": "error", ...}; the status key always comes first
+_ERROR_RE = re.compile(rb'^\{"status":\s*"error"')
+
+
+def _student(rng, targets):
+    return rng.choice(targets["students"])
+
+
+def _post_id(rng, targets):
+    first_id, last_id = targets["post_ids"]
+    return rng.randint(first_id, last_id)
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def _post_list(rng, targets):
+    return "GET", "/post-list", {"requester_school_id": _student(rng, targets)["school_id"]}, None
+
+
+def _post_list_admin(rng, targets):
+    return "GET", "/post-list", {"requester_school_id": rng.choice(targets["admins"]), "show_pending": "true"}, None
+
+
+def _post_by_category(rng, targets):
+    return "GET", "/post-by-category", {"category": rng.choice(targets["categories"]),
+                                        "requester_school_id": _student(rng, targets)["school_id"]}, None
+
+
+def _get_post(rng, targets):
+    return "GET", "/get-post", {"post_id": _post_id(rng, targets),
+                                "requester_school_id": _student(rng, targets)["school_id"]}, None
+
+
+def _get_post_replies(rng, targets):
+    return "GET", "/get-post-replies", {"post_id": _post_id(rng, targets),
+                                        "requester_school_id": _student(rng, targets)["school_id"]}, None
+
+
+def _search_posts(rng, targets):
+    return "GET", "/search-posts", {"q": " ".join(rng.sample(schema.WORDS, rng.randint(1, 2))),
+                                    "requester_school_id": _student(rng, targets)["school_id"]}, None
+
+
+def _search_students(rng, targets):
+    student = _student(rng, targets)
+    name = student["surname"] if rng.random() < 0.5 else student["given_name"][:3]
+    return "GET", "/search-students", {"name": name}, None
+
+
+def _student_post_count(rng, targets):
+    return "GET", "/get-student-post-count", {"author_id": _student(rng, targets)["user_id"]}, None
+
+
+def _get_classes(rng, targets):
+    return "GET", "/get-classes", {"school_id": rng.choice(targets["teachers"])}, None
+
+
+def _post_upload(rng, targets):
+    return "POST", "/post-upload", None, {
+        "upload_time": _now(),
+        "title": " ".join(rng.sample(schema.WORDS, 4)).capitalize(),
+        "content": " ".join(rng.choice(schema.WORDS) for _ in range(40)),
+        "author_id": _student(rng, targets)["user_id"],
+        "anonymous": rng.random() < 0.2,
+        "category": rng.choice(targets["categories"]),
+    }
+
+
+def _post_reply(rng, targets):
+    return "POST", "/post-reply", None, {
+        "upload_time": _now(),
+        "parent_post_id": _post_id(rng, targets),
+        "content": rng.choice(schema.REPLIES),
+        "author_id": _student(rng, targets)["user_id"],
+        "anonymous": rng.random() < 0.2,
+    }
+
+
+ROUTES = {
+    "post-list": _post_list,
+    "post-list (admin)": _post_list_admin,
+    "post-by-category": _post_by_category,
+    "get-post": _get_post,
+    "get-post-replies": _get_post_replies,
+    "search-posts": _search_posts,
+    "search-students": _search_students,
+    "get-student-post-count": _student_post_count,
+    "get-classes": _get_classes,
+    "post-upload": _post_upload,
+    "post-reply": _post_reply,
+}
+
+# Relative request weights per route. "mixed" approximates the production access log:
+# mostly feed and post reads, with roughly one write in eight requests.
+PROFILES = {
+    "mixed": {
+        "post-list": 30, "post-list (admin)": 3, "post-by-category": 12, "get-post": 12,
+        "get-post-replies": 10, "search-posts": 6, "search-students": 5, "get-student-post-count": 5,
+        "get-classes": 3, "post-upload": 6, "post-reply": 8,
+    },
+    "read": {
+        "post-list": 35, "post-list (admin)": 3, "post-by-category": 15, "get-post": 15,
+        "get-post-replies": 12, "search-posts": 7, "search-students": 6, "get-student-post-count": 4,
+        "get-classes": 3,
+    },
+    "write": {"post-upload": 1, "post-reply": 1},
+}
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self.statuses = {}
+
+    def add(self, route, elapsed, ok, status):
+        self.latencies.setdefault(route, []).append(elapsed)
+        if not ok:
+            self.errors[route] = self.errors.get(route, 0) + 1
+        statuses = self.statuses.setdefault(route, {})
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+
+async def _worker(client, targets, routes, weights, deadline, recorder, rng):
+    while time.perf_counter() < deadline:
+        route = rng.choices(routes, weights)[0]
+        method, path, params, body = ROUTES[route](rng, targets)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, params=params, json=body)
+            status = response.status_code
+            ok = status < 400 and not _ERROR_RE.match(response.content[:64])
+        except httpx.HTTPError:
+            status, ok = None, False
+        recorder.add(route, time.perf_counter() - start, ok, status)
+        if status in (429, 503):
+            # Back off like a well-behaved client; retrying at once just spins on refusals
+            retry_after = float(response.headers.get("Retry-After", 1))
+            await asyncio.sleep(max(0.0, min(retry_after, deadline - time.perf_counter())))
+
+
+async def _drive(client, targets, profile, concurrency, seconds, random_seed):
+    routes = list(PROFILES[profile])
+    weights = [PROFILES[profile][route] for route in routes]
+    recorder = Recorder()
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker(client, targets, routes, weights, deadline, recorder,
+                                   random.Random(random_seed * 1000 + i))
+                           for i in range(concurrency)))
+    return recorder, time.perf_counter() - started
+
+
+def _percentile(ordered, pct):
+    # Nearest-rank percentile
+    index = max(0, math.ceil(pct / 100 * len(ordered)) - 1)
+    return ordered[index]
+
+
+def _summary(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    if not ordered:
+        return {"requests": 0, "errors": errors}
+    return {
+        "requests": len(ordered),
+        "errors": errors,
+        "throughput_rps": round(len(ordered) / elapsed, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50_ms": round(_percentile(ordered, 50) * 1000, 2),
+        "p95_ms": round(_percentile(ordered, 95) * 1000, 2),
+        "p99_ms": round(_percentile(ordered, 99) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run_load(args, targets):
+    """Warm up, then measure. Returns (recorder, elapsed seconds, pool stats or None)."""
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    if args.base_url:
+        async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+            if args.warmup:
+                await _drive(client, targets, args.profile, args.concurrency, args.warmup, args.random_seed + 1)
+            recorder, elapsed = await _drive(client, targets, args.profile, args.concurrency, args.duration,
+                                             args.random_seed)
+            return recorder, elapsed, None
+
+    import importlib
+    server = importlib.import_module("SchoolWebServer_Sep6")
+    from db import pool_stats, replica_stats
+    transport = httpx.ASGITransport(app=server.app)
+    async with server.app.router.lifespan_context(server.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=args.timeout,
+                                     limits=limits) as client:
+            # The warm-up also triggers the lazy builds of the search indexes
+            if args.warmup:
+                await _drive(client, targets, args.profile, args.concurrency, args.warmup, args.random_seed + 1)
+            recorder, elapsed = await _drive(client, targets, args.profile, args.concurrency, args.duration,
+                                             args.random_seed)
+            return recorder, elapsed, {**pool_stats(), "replicas": replica_stats()}
+
+
+def prepare_database(args):
+    """Point the app at the chosen database, create and seed it unless --reuse.
+    Returns (seeded row counts or None, load targets)."""
+    if args.db == "standin":
+        # The app imports the untracked pool.py when DB_HOST is unset; the stand-in takes its place
+        os.environ.pop("DB_HOST", None)
+        path = args.database or os.path.join(tempfile.mkdtemp(prefix="forum-loadtest-"), "forum.sqlite")
+        if not args.reuse:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+        standin.configure(path, replicas=args.replicas, replica_lag=args.replica_lag)
+        sys.modules["pool"] = standin
+        args.database = path
+    elif not os.environ.get("DB_HOST"):
+        raise SystemExit("--db mysql needs DB_HOST (and DB_USER, DB_PASSWORD, DB_NAME) in the environment")
+
+    import db
+    connection = db.get_connection()
+    try:
+        seeded = None
+        if not args.reuse:
+            schema.create_schema(connection, "sqlite" if args.db == "standin" else "mysql")
+            started = time.perf_counter()
+            seeded = schema.seed(connection, students=args.students, teachers=args.teachers, admins=args.admins,
+                                 posts=args.posts, replies_per_post=args.replies, classes=args.classes,
+                                 class_size=args.class_size, random_seed=args.random_seed)
+            print(f"seeded {seeded} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        if args.indexes:
+            indexes = schema.create_indexes(connection, "sqlite" if args.db == "standin" else "mysql")
+            print(f"indexes: {', '.join(indexes) or 'already present'}", file=sys.stderr)
+        targets = schema.load_targets(connection)
+    finally:
+        connection.close()
+    if not targets["students"] or not targets["post_ids"][1]:
+        raise SystemExit("The database has no students or posts; seed it first")
+    if not targets["teachers"] or not targets["admins"]:
+        raise SystemExit("The database needs at least one teacher and one admin")
+    return seeded, targets
+
+
+def _change(before, after):
+    if not before or after is None:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def print_report(result, baseline=None):
+    columns = ("requests", "errors", "throughput_rps", "p50_ms", "p95_ms", "p99_ms")
+    print(f"{'route':<24}" + "".join(f"{column:>16}" for column in columns))
+    rows = list(result["routes"].items()) + [("overall", result["overall"])]
+    for route, summary in rows:
+        print(f"{route:<24}" + "".join(f"{summary.get(column, ''):>16}" for column in columns))
+        if baseline is not None:
+            before = baseline["overall"] if route == "overall" else baseline["routes"].get(route)
+            if before:
+                print(f"{'  vs baseline':<24}{'':>32}" + "".join(
+                    f"{_change(before.get(column), summary.get(column)):>16}" for column in columns[2:]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", choices=("standin", "mysql"), default="standin")
+    parser.add_argument("--database", help="SQLite file for the stand-in (default: a new temporary file)")
+    parser.add_argument("--reuse", action="store_true", help="use the existing data instead of creating and seeding")
+    parser.add_argument("--seed-only", action="store_true", help="create and seed the database, then exit")
+    parser.add_argument("--students", type=int, default=2000)
+    parser.add_argument("--teachers", type=int, default=40)
+    parser.add_argument("--admins", type=int, default=3)
+    parser.add_argument("--posts", type=int, default=20000)
+    parser.add_argument("--replies", type=int, default=3, help="average replies per post")
+    parser.add_argument("--classes", type=int, default=80)
+    parser.add_argument("--class-size", type=int, default=25)
+    parser.add_argument("--random-seed", type=int, default=1)
+    parser.add_argument("--indexes", action="store_true", help="add migrations.HOT_PATH_INDEXES before the run")
+    parser.add_argument("--replicas", type=int, default=0, help="stand-in read replicas")
+    parser.add_argument("--replica-lag", type=float, default=0, help="seconds each stand-in replica lags behind")
+    parser.add_argument("--base-url", help="send traffic to a running server instead of the in-process app")
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="mixed")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the measurement")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--output", help="result file (default: bench/results/loadtest-<time>.json)")
+    parser.add_argument("--compare", help="earlier result file to compare against")
+    args = parser.parse_args()
+
+    seeded, targets = prepare_database(args)
+    if args.seed_only:
+        print(json.dumps({"database": args.database, "seeded": seeded}, indent=2))
+        return
+
+    started_at = datetime.datetime.now().replace(microsecond=0)
+    recorder, elapsed, pool = asyncio.run(run_load(args, targets))
+    routes = {route: _summary(recorder.latencies[route], recorder.errors.get(route, 0), elapsed)
+              for route in PROFILES[args.profile] if route in recorder.latencies}
+    for route, summary in routes.items():
+        summary["statuses"] = recorder.statuses[route]
+    all_latencies = [latency for latencies in recorder.latencies.values() for latency in latencies]
+    result = {
+        "started_at": started_at.isoformat(),
+        "git_commit": _git_commit(),
+        "config": vars(args),
+        "seeded": seeded,
+        "elapsed_s": round(elapsed, 3),
+        "overall": _summary(all_latencies, sum(recorder.errors.values()), elapsed),
+        "routes": routes,
+        "pool": pool,
+    }
+
+    output = args.output or os.path.join(BENCH_DIR, "results", f"loadtest-{started_at:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as handle:
+        json.dump(result, handle, indent=2, default=str)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as handle:
+            baseline = json.load(handle)
+    print_report(result, baseline)
+    print(f"results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
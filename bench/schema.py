@@ -0,0 +1,276 @@
+"""Schema and synthetic data for local benchmark databases.
+
+create_schema() builds the tables the server reads: the original forum tables plus the ones
+migrations.py adds. Only primary keys are declared, so the tables match a deployment that
+has never been indexed; create_indexes() adds migrations.HOT_PATH_INDEXES. seed() fills an empty database with deterministic data, and
+load_targets() reads back the ids a load generator needs. That works for a database seeded
+by an earlier run too.
+"""
+import datetime
+import random
+
+from migrations import (AUTHOR_STATS_DDL, CLASS_MEMBERSHIP_DDL, HOT_PATH_INDEXES, MODERATION_COUNTS_DDL,
+                        SESSION_REVOCATIONS_DDL, migrate_hot_path_indexes)
+
+MYSQL_TABLES = [
+    """
+CREATE TABLE IF NOT EXISTS personal_info (
+    user_id VARCHAR(50) NOT NULL PRIMARY KEY,
+    password VARCHAR(100) NOT NULL,
+    given_name VARCHAR(50),
+    surname VARCHAR(50),
+    age VARCHAR(3),
+    school_id VARCHAR(20),
+    intended_major VARCHAR(100),
+    email VARCHAR(100),
+    class VARCHAR(20)
+)
+""",
+    """
+CREATE TABLE IF NOT EXISTS student_data (
+    school_id VARCHAR(20) NOT NULL PRIMARY KEY,
+    user_id VARCHAR(50),
+    password VARCHAR(100),
+    point VARCHAR(10),
+    validated VARCHAR(1)
+)
+""",
+    "CREATE TABLE IF NOT EXISTS teacher_data (teacher_id VARCHAR(20) NOT NULL PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS admin_data (admin_id VARCHAR(20) NOT NULL PRIMARY KEY)",
+    """
+CREATE TABLE IF NOT EXISTS post (
+    post_id INT AUTO_INCREMENT PRIMARY KEY,
+    upload_time DATETIME NOT NULL,
+    title VARCHAR(200),
+    content TEXT,
+    author_id VARCHAR(50),
+    anonymous TINYINT NOT NULL DEFAULT 0,
+    category VARCHAR(50),
+    validated TINYINT NOT NULL DEFAULT 1,
+    reply_count INT NOT NULL DEFAULT 0
+)
+""",
+    """
+CREATE TABLE IF NOT EXISTS reply (
+    reply_id INT AUTO_INCREMENT PRIMARY KEY,
+    parent_post_id INT NOT NULL,
+    author_id VARCHAR(50),
+    upload_time DATETIME NOT NULL,
+    anonymous TINYINT NOT NULL DEFAULT 0,
+    content TEXT,
+    validated TINYINT NOT NULL DEFAULT 1
+)
+""",
+    """
+CREATE TABLE IF NOT EXISTS classes (
+    class_id INT AUTO_INCREMENT PRIMARY KEY,
+    creator_id VARCHAR(20),
+    name VARCHAR(100),
+    students TEXT
+)
+""",
+    CLASS_MEMBERSHIP_DDL,
+    MODERATION_COUNTS_DDL,
+    AUTHOR_STATS_DDL,
+    SESSION_REVOCATIONS_DDL,
+]
+
+# Same tables for bench/standin.py; DATETIME columns come back as datetime objects there
+SQLITE_TABLES = [
+    "CREATE TABLE IF NOT EXISTS personal_info (user_id TEXT NOT NULL PRIMARY KEY, password TEXT NOT NULL, "
+    "given_name TEXT, surname TEXT, age TEXT, school_id TEXT, intended_major TEXT, email TEXT, class TEXT)",
+    "CREATE TABLE IF NOT EXISTS student_data (school_id TEXT NOT NULL PRIMARY KEY, user_id TEXT, password TEXT, "
+    "point TEXT, validated TEXT)",
+    "CREATE TABLE IF NOT EXISTS teacher_data (teacher_id TEXT NOT NULL PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS admin_data (admin_id TEXT NOT NULL PRIMARY KEY)",
+    "CREATE TABLE IF NOT EXISTS post (post_id INTEGER PRIMARY KEY AUTOINCREMENT, upload_time DATETIME NOT NULL, "
+    "title TEXT, content TEXT, author_id TEXT, anonymous INTEGER NOT NULL DEFAULT 0, category TEXT, "
+    "validated INTEGER NOT NULL DEFAULT 1, reply_count INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS reply (reply_id INTEGER PRIMARY KEY AUTOINCREMENT, parent_post_id INTEGER NOT NULL, "
+    "author_id TEXT, upload_time DATETIME NOT NULL, anonymous INTEGER NOT NULL DEFAULT 0, content TEXT, "
+    "validated INTEGER NOT NULL DEFAULT 1)",
+    "CREATE TABLE IF NOT EXISTS classes (class_id INTEGER PRIMARY KEY AUTOINCREMENT, creator_id TEXT, name TEXT, "
+    "students TEXT)",
+    "CREATE TABLE IF NOT EXISTS class_membership (class_id INTEGER NOT NULL, school_id TEXT NOT NULL, "
+    "added_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, PRIMARY KEY (class_id, school_id))",
+    "CREATE TABLE IF NOT EXISTS moderation_counts (kind TEXT NOT NULL PRIMARY KEY, pending INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS author_stats (author_id TEXT NOT NULL PRIMARY KEY, post_count INTEGER NOT NULL DEFAULT 0, "
+    "total_posts INTEGER NOT NULL DEFAULT 0)",
+    "CREATE TABLE IF NOT EXISTS session_revocations (school_id TEXT NOT NULL PRIMARY KEY, revoked_at REAL NOT NULL)",
+]
+
+CATEGORIES = ["General", "Dorm", "Math", "AP Calculus AB", "AP Calculus BC", "Algebra 2", "Geometry",
+              "Statistics", "Science", "Chemistry", "Physics", "English", "History", "Clubs"]
+GIVEN_NAMES = ["Emma", "Liam", "Olivia", "Noah", "Ava", "Ethan", "Sophia", "Mason", "Mia", "Lucas",
+               "Chloé", "José", "Zoë", "Mateo", "Aisha", "Hiroshi", "지민", "서연", "Ngozi", "Björn"]
+SURNAMES = ["Kim", "Lee", "Park", "Smith", "Johnson", "Garcia", "Martínez", "Nguyen", "Chen", "Müller",
+            "O'Brien", "Okafor", "Tanaka", "Rossi", "Novak", "Silva", "최", "정", "Dubois", "Andersson"]
+MAJORS = ["Computer Science", "Biology", "Economics", "History", "Mathematics", "Physics", "Undecided"]
+WORDS = ("homework assignment exam quiz notes lab report chemistry physics calculus derivative integral "
+         "essay history project deadline teacher club meeting dorm laundry cafeteria schedule library "
+         "study group tutoring practice problem solution chapter review semester grade question answer "
+         "deadline extension presentation volleyball robotics debate orchestra weekend").split()
+REPLIES = ["I can share mine after class.", "Same question here!", "Check the review sheet on the portal.",
+           "The answer is in chapter 4.", "Ask during office hours tomorrow.", "Thanks, that helped a lot."]
+
+SEED_BATCH_SIZE = 1000
+
+
+def create_schema(connection, dialect="mysql"):
+    tables = SQLITE_TABLES if dialect == "sqlite" else MYSQL_TABLES
+    cursor = connection.cursor()
+    try:
+        for ddl in tables:
+            cursor.execute(ddl)
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def create_indexes(connection, dialect="mysql"):
+    """Add the hot-path indexes, so runs with and without them can be compared."""
+    if dialect != "sqlite":
+        return migrate_hot_path_indexes(connection)
+    cursor = connection.cursor()
+    try:
+        for name, table, columns, _needed in HOT_PATH_INDEXES:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+        connection.commit()
+        return [name for name, _table, _columns, _needed in HOT_PATH_INDEXES]
+    finally:
+        cursor.close()
+
+
+def _sentence(rng, low, high):
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _insert_batches(connection, cursor, query, rows):
+    for start in range(0, len(rows), SEED_BATCH_SIZE):
+        cursor.executemany(query, rows[start:start + SEED_BATCH_SIZE])
+        connection.commit()
+
+
+def seed(connection, students=2000, teachers=40, admins=3, posts=20000, replies_per_post=3, classes=80,
+         class_size=25, pending_ratio=0.05, anonymous_ratio=0.2, days=180, random_seed=1, now=None):
+    """Fill an empty database with synthetic users, posts, replies and classes.
+    The same random_seed and now always produce the same rows. The maintained counters (post.reply_count,
+    author_stats, moderation_counts) are written consistently with the data, as the app would.
+    Returns the number of rows inserted per table.
+    """
+    rng = random.Random(random_seed)
+    if not teachers:
+        classes = 0
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute("SELECT COUNT(*) AS posts FROM post")
+        if cursor.fetchone()["posts"]:
+            raise RuntimeError("Refusing to seed a database that already has posts")
+
+        people, student_rows, student_ids = [], [], []
+        for kind, count, first_id in (("student", students, 100000), ("teacher", teachers, 200000),
+                                      ("admin", admins, 300000)):
+            for i in range(count):
+                given, surname = rng.choice(GIVEN_NAMES), rng.choice(SURNAMES)
+                school_id = str(first_id + i)
+                user_id = f"{kind}{i}"
+                people.append((user_id, "password", given, surname, str(rng.randint(14, 18) if kind == "student" else 40),
+                               school_id, rng.choice(MAJORS), f"{user_id}@school.example", str(rng.randint(2026, 2029))))
+                if kind == "student":
+                    student_rows.append((school_id, user_id, "password", "0", "1"))
+                    student_ids.append((school_id, user_id))
+        _insert_batches(connection, cursor, "INSERT INTO personal_info (user_id, password, given_name, surname, age, "
+                        "school_id, intended_major, email, class) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)", people)
+        _insert_batches(connection, cursor, "INSERT INTO student_data (school_id, user_id, password, point, validated) "
+                        "VALUES (%s, %s, %s, %s, %s)", student_rows)
+        _insert_batches(connection, cursor, "INSERT INTO teacher_data (teacher_id) VALUES (%s)",
+                        [(str(200000 + i),) for i in range(teachers)])
+        _insert_batches(connection, cursor, "INSERT INTO admin_data (admin_id) VALUES (%s)",
+                        [(str(300000 + i),) for i in range(admins)])
+
+        now = (now or datetime.datetime.now()).replace(microsecond=0)
+        start = now - datetime.timedelta(days=days)
+        span = int((now - start).total_seconds())
+        post_times = sorted(start + datetime.timedelta(seconds=rng.randrange(span)) for _ in range(posts))
+        post_rows, reply_rows = [], []
+        post_counts, total_posts, pending = {}, {}, {"post": 0, "reply": 0}
+        authors = [user_id for _school_id, user_id in student_ids] or ["student0"]
+        for post_id, upload_time in enumerate(post_times, start=1):
+            author = rng.choice(authors)
+            validated = 0 if rng.random() < pending_ratio else 1
+            pending["post"] += 1 - validated
+            total_posts[author] = total_posts.get(author, 0) + 1
+            if validated:
+                post_counts[author] = post_counts.get(author, 0) + 1
+            reply_count = 0
+            for _ in range(rng.randint(0, 2 * replies_per_post) if replies_per_post else 0):
+                reply_validated = 0 if rng.random() < pending_ratio else 1
+                pending["reply"] += 1 - reply_validated
+                reply_count += reply_validated
+                reply_time = min(now, upload_time + datetime.timedelta(minutes=rng.randint(1, 3 * 24 * 60)))
+                reply_rows.append((post_id, rng.choice(authors), reply_time, int(rng.random() < anonymous_ratio),
+                                   rng.choice(REPLIES), reply_validated))
+            post_rows.append((post_id, upload_time, _sentence(rng, 3, 8).capitalize(), _sentence(rng, 15, 80),
+                              author, int(rng.random() < anonymous_ratio), rng.choice(CATEGORIES), validated,
+                              reply_count))
+        _insert_batches(connection, cursor, "INSERT INTO post (post_id, upload_time, title, content, author_id, "
+                        "anonymous, category, validated, reply_count) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)",
+                        post_rows)
+        reply_rows.sort(key=lambda row: row[2])
+        _insert_batches(connection, cursor, "INSERT INTO reply (parent_post_id, author_id, upload_time, anonymous, "
+                        "content, validated) VALUES (%s, %s, %s, %s, %s, %s)", reply_rows)
+
+        membership_rows = []
+        for class_id in range(1, classes + 1):
+            members = rng.sample(student_ids, min(class_size, len(student_ids)))
+            membership_rows.extend((class_id, school_id) for school_id, _user_id in members)
+        _insert_batches(connection, cursor, "INSERT INTO classes (class_id, creator_id, name, students) "
+                        "VALUES (%s, %s, %s, %s)",
+                        [(class_id, str(200000 + rng.randrange(teachers)), f"{rng.choice(CATEGORIES)} {class_id}", "")
+                         for class_id in range(1, classes + 1)])
+        _insert_batches(connection, cursor, "INSERT INTO class_membership (class_id, school_id) VALUES (%s, %s)",
+                        membership_rows)
+
+        _insert_batches(connection, cursor, "INSERT INTO author_stats (author_id, post_count, total_posts) "
+                        "VALUES (%s, %s, %s)",
+                        [(author, post_counts.get(author, 0), total) for author, total in sorted(total_posts.items())])
+        _insert_batches(connection, cursor, "INSERT INTO moderation_counts (kind, pending) VALUES (%s, %s)",
+                        sorted(pending.items()))
+        return {
+            "personal_info": len(people),
+            "student_data": len(student_rows),
+            "teacher_data": teachers,
+            "admin_data": admins,
+            "post": len(post_rows),
+            "reply": len(reply_rows),
+            "classes": classes,
+            "class_membership": len(membership_rows),
+        }
+    finally:
+        cursor.close()
+
+
+def load_targets(connection, sample=2000):
+    """Ids and values a load generator draws requests from, read from an already seeded database."""
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute("SELECT s.school_id, s.user_id, p.given_name, p.surname FROM student_data s "
+                       "INNER JOIN personal_info p ON p.school_id = s.school_id LIMIT %s", (sample,))
+        students = cursor.fetchall()
+        cursor.execute("SELECT teacher_id FROM teacher_data LIMIT %s", (sample,))
+        teachers = [row["teacher_id"] for row in cursor.fetchall()]
+        cursor.execute("SELECT admin_id FROM admin_data LIMIT %s", (sample,))
+        admins = [row["admin_id"] for row in cursor.fetchall()]
+        cursor.execute("SELECT MIN(post_id) AS first_id, MAX(post_id) AS last_id FROM post")
+        post_range = cursor.fetchone()
+        cursor.execute("SELECT DISTINCT category FROM post")
+        categories = [row["category"] for row in cursor.fetchall()]
+        return {
+            "students": students,
+            "teachers": teachers,
+            "admins": admins,
+            "post_ids": (post_range["first_id"] or 0, post_range["last_id"] or 0),
+            "categories": categories,
+        }
+    finally:
+        cursor.close()
@@ -0,0 +1,145 @@
+"""Compare the old and new feed serialization paths on a synthetic feed (no server or DB needed).
+
+    python bench/serialization_bench.py --posts 5000 --replies 3
+
+"legacy" rebuilds each row as a dict, runs FastAPI's jsonable_encoder and then json.dumps,
+which is what the feed handlers used to do. "fast" is serialization.post_record + dumps, the
+path the handlers use now; "fast_stdlib" is the same without orjson. Both outputs are
+checked to decode to the same document before timing.
+"""
+import argparse
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import serialization  # noqa: E402
+
+
+def make_feed(posts, replies):
+    start = datetime.datetime(2025, 1, 1, 8, 0, 0)
+    post_rows, replies_by_post = [], {}
+    for i in range(posts):
+        post_rows.append({
+            "post_id": i + 1,
+            "upload_time": start + datetime.timedelta(minutes=i),
+            "content": "Does anyone have notes from today's chemistry lab? " * 4,
+            "author_id": f"student{i % 300}",
+            "anonymous": i % 3 == 0,
+            "category": ("General", "Math", "Science", "Clubs")[i % 4],
+            "title": f"Question about assignment {i}",
+            "validated": 1,
+            "reply_count": replies,
+        })
+        replies_by_post[i + 1] = [{
+            "reply_id": (i * replies) + j + 1,
+            "parent_post_id": i + 1,
+            "author_id": f"student{(i + j) % 300}",
+            "upload_time": start + datetime.timedelta(minutes=i, seconds=30 * (j + 1)),
+            "anonymous": j % 2,
+            "content": "I can share mine after class.",
+            "validated": 1,
+        } for j in range(replies)]
+    return post_rows, replies_by_post
+
+
+def legacy(posts, replies_by_post, is_admin):
+    post_list = []
+    for post in posts:
+        if post["anonymous"]:
+            display_author = post["author_id"] if is_admin else "Anonymous"
+        else:
+            display_author = post["author_id"]
+        processed_replies = []
+        for reply in replies_by_post.get(post["post_id"], []):
+            if reply["anonymous"]:
+                reply_author = reply["author_id"] if is_admin else "Anonymous"
+            else:
+                reply_author = reply["author_id"]
+            processed_replies.append({
+                "reply_id": reply["reply_id"],
+                "parent_post_id": reply["parent_post_id"],
+                "author_id": reply_author,
+                "upload_time": reply["upload_time"],
+                "anonymous": reply["anonymous"],
+                "content": reply["content"],
+                "validated": reply.get("validated", 1),
+            })
+        post_list.append({
+            "post_id": post["post_id"],
+            "upload_time": post["upload_time"],
+            "content": post["content"],
+            "author_id": display_author,
+            "anonymous": post["anonymous"],
+            "category": post["category"],
+            "title": post["title"],
+            "validated": post["validated"],
+            "reply_count": post.get("reply_count", 0),
+            "replies": processed_replies,
+        })
+    payload = {"status": "success", "posts": post_list, "next_cursor": None}
+    return json.dumps(jsonable_encoder(payload)).encode()
+
+
+def fast(posts, replies_by_post, is_admin):
+    post_list = [serialization.post_record(post, is_admin, replies_by_post.get(post["post_id"], []))
+                 for post in posts]
+    return serialization.dumps({"status": "success", "posts": post_list, "next_cursor": None})
+
+
+def fast_stdlib(posts, replies_by_post, is_admin):
+    orjson, serialization.orjson = serialization.orjson, None
+    try:
+        return fast(posts, replies_by_post, is_admin)
+    finally:
+        serialization.orjson = orjson
+
+
+def measure(func, args, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = func(*args)
+        timings.append(time.perf_counter() - start)
+    return {
+        "median_ms": round(statistics.median(timings) * 1000, 2),
+        "min_ms": round(min(timings) * 1000, 2),
+        "bytes": len(body),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--replies", type=int, default=3, help="replies per post")
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--admin", action="store_true", help="serialize as an admin (no author masking)")
+    args = parser.parse_args()
+
+    posts, replies_by_post = make_feed(args.posts, args.replies)
+    call_args = (posts, replies_by_post, args.admin)
+    expected = json.loads(legacy(*call_args))
+    paths = {"legacy": legacy, "fast": fast, "fast_stdlib": fast_stdlib}
+    for name, func in paths.items():
+        if json.loads(func(*call_args)) != expected:
+            raise SystemExit(f"{name} output differs from legacy")
+
+    results = {name: measure(func, call_args, args.repeat) for name, func in paths.items()}
+    baseline = results["legacy"]["median_ms"]
+    for result in results.values():
+        result["speedup"] = round(baseline / result["median_ms"], 2) if result["median_ms"] else None
+    print(json.dumps({
+        "posts": args.posts,
+        "replies_per_post": args.replies,
+        "orjson": serialization.orjson is not None,
+        "results": results,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""SQLite stand-in for the forum's MySQL database, for local benchmarks only.
+
+It exposes the same get_connection() as the deployment's pool.py and covers the parts of the
+mysql.connector API that the server uses: dictionary/buffered cursors, %s parameters,
+lastrowid, rowcount, fetchmany, ping and connection_id. Statements are rewritten to SQLite
+syntax as they pass through. configure(path, replicas=N, replica_lag=S) also exposes N
+read-only "replicas" of the same file. Each one serves reads from a WAL snapshot up to S
+seconds old, like an asynchronous replica. The stand-in reproduces the app's query pattern and its
+Python-side costs, but not MySQL's planner or locking. Compare stand-in runs with each other,
+never with production numbers.
+"""
+import datetime
+import functools
+import itertools
+import os
+import re
+import sqlite3
+import time
+
+# Path of the SQLite file; set with configure() before the app opens its pool
+DATABASE_PATH = None
+# Read replicas offered to db.py, and how stale (in seconds) each may be
+REPLICA_COUNT = 0
+REPLICA_LAG = 0.0
+# FULL syncs the WAL on every commit, like innodb_flush_log_at_trx_commit=1; use it when
+# comparing write paths. NORMAL is faster and fine for read benchmarks.
+STANDIN_SYNCHRONOUS = os.environ.get("STANDIN_SYNCHRONOUS", "NORMAL").upper()
+
+# SQLite needs an explicit conflict target where MySQL infers it from the primary key
+_CONFLICT_TARGETS = {
+    "author_stats": "author_id",
+    "moderation_counts": "kind",
+    "session_revocations": "school_id",
+}
+_INSERT_TABLE_RE = re.compile(r"INSERT\s+(?:IGNORE\s+)?INTO\s+(\w+)", re.I)
+_UPSERT_RE = re.compile(r"\s+ON\s+DUPLICATE\s+KEY\s+UPDATE\s+", re.I)
+_VALUES_RE = re.compile(r"VALUES\((\w+)\)", re.I)
+_connection_ids = itertools.count(1)
+
+sqlite3.register_adapter(datetime.datetime, lambda value: value.strftime("%Y-%m-%d %H:%M:%S"))
+sqlite3.register_converter("DATETIME", lambda raw: datetime.datetime.fromisoformat(raw.decode()))
+
+
+def configure(path, replicas=0, replica_lag=0.0):
+    global DATABASE_PATH, REPLICA_COUNT, REPLICA_LAG
+    DATABASE_PATH = path
+    REPLICA_COUNT = replicas
+    REPLICA_LAG = replica_lag
+
+
+@functools.lru_cache(maxsize=1024)
+def translate(query):
+    """Rewrite one MySQL statement into SQLite syntax."""
+    query = query.replace("%s", "?")
+    query = re.sub(r"\bINSERT\s+IGNORE\b", "INSERT OR IGNORE", query, flags=re.I)
+    query = re.sub(r"\s+FOR\s+UPDATE\b", "", query, flags=re.I)
+    query = re.sub(r"\bGREATEST\(", "MAX(", query, flags=re.I)
+    query = re.sub(r"^\s*EXPLAIN\s+", "EXPLAIN QUERY PLAN ", query, flags=re.I)
+    query = query.replace("@@auto_increment_increment", "1")
+    parts = _UPSERT_RE.split(query, maxsplit=1)
+    if len(parts) == 2:
+        head, assignments = parts
+        target = _CONFLICT_TARGETS[_INSERT_TABLE_RE.search(head).group(1)]
+        query = f"{head} ON CONFLICT({target}) DO UPDATE SET " + _VALUES_RE.sub(r"excluded.\1", assignments)
+    return query
+
+
+class Cursor:
+    def __init__(self, connection, dictionary):
+        self._cursor = connection.cursor()
+        self._dictionary = dictionary
+        self._columns = None
+        self.lastrowid = None
+        self.rowcount = -1
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def execute(self, query, params=()):
+        if query.lstrip()[:4].upper() == "KILL":
+            # Nothing runs server-side, so there is no query to cancel
+            return
+        self._cursor.execute(translate(query), tuple(params or ()))
+        self._after_execute()
+
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(translate(query), [tuple(params) for params in seq_params])
+        self._after_execute()
+
+    def _after_execute(self):
+        self.lastrowid = self._cursor.lastrowid
+        self.rowcount = self._cursor.rowcount
+        if self.rowcount > 1 and self.lastrowid:
+            # MySQL reports the first id of a multi-row INSERT, SQLite the last
+            self.lastrowid -= self.rowcount - 1
+        description = self._cursor.description
+        self._columns = [column[0] for column in description] if description else None
+
+    def _row(self, row):
+        if row is None or not self._dictionary:
+            return row
+        return dict(zip(self._columns, row))
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._row(row) for row in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+
+class Connection:
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False,
+                                           detect_types=sqlite3.PARSE_DECLTYPES)
+        # WAL lets readers run alongside the single writer, closer to InnoDB than rollback journaling
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(f"PRAGMA synchronous={STANDIN_SYNCHRONOUS}")
+        self.connection_id = next(_connection_ids)
+
+    @property
+    def in_transaction(self):
+        return self._connection.in_transaction
+
+    def cursor(self, dictionary=False, buffered=False, **kwargs):
+        return Cursor(self._connection, dictionary)
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        self._connection.execute("SELECT 1")
+
+    def close(self):
+        self._connection.close()
+
+
+class ReplicaConnection(Connection):
+    """Read-only connection that holds each WAL read snapshot for `lag` seconds, so it misses
+    writes made in the meantime. Writes through it fail as they would on a read-only replica."""
+
+    def __init__(self, path, lag):
+        self._connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=30, check_same_thread=False,
+                                           detect_types=sqlite3.PARSE_DECLTYPES)
+        self.connection_id = next(_connection_ids)
+        self._lag = lag
+        self._snapshot_at = None
+
+    @property
+    def in_transaction(self):
+        # The open read transaction is the simulated lag, not caller state for the pool to roll back
+        return False
+
+    def cursor(self, dictionary=False, buffered=False, **kwargs):
+        if self._lag > 0 and (self._snapshot_at is None or time.monotonic() - self._snapshot_at >= self._lag):
+            if self._connection.in_transaction:
+                self._connection.rollback()
+            self._connection.execute("BEGIN")
+            # The snapshot is taken by the first read, not by BEGIN
+            self._connection.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+            self._snapshot_at = time.monotonic()
+        return Cursor(self._connection, dictionary)
+
+    def rollback(self):
+        pass
+
+
+def get_connection():
+    if DATABASE_PATH is None:
+        raise RuntimeError("standin.configure(path) must be called before get_connection()")
+    return Connection(DATABASE_PATH)
+
+
+def get_replica_connection(index):
+    if index >= REPLICA_COUNT:
+        raise RuntimeError(f"standin has {REPLICA_COUNT} replicas, not {index + 1}")
+    return ReplicaConnection(DATABASE_PATH, REPLICA_LAG)
@@ -3,6 +3,7 @@ import Link from 'next/link';
 import React, { useState, useEffect } from 'react';
 import { useRouter, usePathname } from 'next/navigation';
 import Image from 'next/image';
+import { getPendingCounts } from '../app/api/posts';
 
 interface NavbarProps {
   onSearch?: (query: string) => void;
@@ -92,6 +93,8 @@ const Navbar: React.FC<NavbarProps> = ({ onSearch }) => {
   const [currentUser, setCurrentUser] = useState<any>(null);
   const [isTeacher, setIsTeacher] = useState<boolean>(false);
   const [isAdmin, setIsAdmin] = useState<boolean>(false);
+  // Posts plus replies waiting in the moderation queue, shown as a badge on Pending Posts
+  const [pendingTotal, setPendingTotal] = useState<number>(0);
   const router = useRouter();
   const pathname = usePathname();
   // Page title helper for tab name
@@ -162,6 +165,18 @@ const Navbar: React.FC<NavbarProps> = ({ onSearch }) => {
 	}
   }, [hasMounted]);
 
+  // Admins get the moderation queue size from the maintained counters (one cheap query)
+  useEffect(() => {
+	if (!isAdmin || !currentUser?.school_id) return;
+	getPendingCounts(currentUser.school_id)
+	  .then((res: any) => {
+		if (res.status === 'success') {
+		  setPendingTotal(res.counts.posts + res.counts.replies);
+		}
+	  })
+	  .catch((e: any) => console.error('Navbar: Error loading pending counts', e));
+  }, [isAdmin, currentUser, pathname]);
+
   // After mount, load the persisted sidebar state and respect small screens (client-only)
   useEffect(() => {
 	if (!hasMounted) return;
@@ -394,6 +409,9 @@ const Navbar: React.FC<NavbarProps> = ({ onSearch }) => {
               >
                 <Icon name={item.icon} className="h-5 w-5 min-w-[1.25rem]" />
                 <span className="font-medium">{item.label}</span>
+                {item.href === '/pending-posts' && pendingTotal > 0 && (
+                  <span className="ml-auto bg-red-600 text-white text-xs font-semibold rounded-full px-2 py-0.5">{pendingTotal}</span>
+                )}
               </Link>
             );
           })}
@@ -0,0 +1,728 @@
+import asyncio
+import contextvars
+import functools
+import hashlib
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import Request
+from fastapi.responses import JSONResponse
+
+from cache import TTLCache
+from metrics import record_query
+from profiler import record_statement
+
+# Upper bound on DB work running at once per worker process; keep it <= DB_POOL_MAX_SIZE
+DB_MAX_WORKERS = int(os.environ.get("DB_MAX_WORKERS", "16"))
+# Seconds a handler may spend in the DB executor before the client gets a 504
+DB_REQUEST_TIMEOUT = float(os.environ.get("DB_REQUEST_TIMEOUT", "10"))
+
+DB_POOL_MIN_SIZE = int(os.environ.get("DB_POOL_MIN_SIZE", "2"))
+DB_POOL_MAX_SIZE = int(os.environ.get("DB_POOL_MAX_SIZE", "20"))
+# Connections older than this many seconds are closed instead of reused
+DB_POOL_RECYCLE = float(os.environ.get("DB_POOL_RECYCLE", "3600"))
+# Idle connections above DB_POOL_MIN_SIZE are closed after this many seconds
+DB_POOL_IDLE_TIMEOUT = float(os.environ.get("DB_POOL_IDLE_TIMEOUT", "300"))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") not in ("0", "false", "False")
+DB_POOL_ACQUIRE_TIMEOUT = float(os.environ.get("DB_POOL_ACQUIRE_TIMEOUT", "5"))
+
+# Read replicas as comma-separated host[:port], with the primary's credentials. The deployment's
+# pool.py can instead define REPLICA_COUNT and get_replica_connection(index). With neither,
+# reads go to the primary like everything else.
+DB_REPLICA_HOSTS = [host.strip() for host in os.environ.get("DB_REPLICA_HOSTS", "").split(",") if host.strip()]
+DB_REPLICA_POOL_MAX_SIZE = int(os.environ.get("DB_REPLICA_POOL_MAX_SIZE", str(DB_POOL_MAX_SIZE)))
+# A read waits this long for a busy replica before trying the next one, then the primary
+DB_REPLICA_ACQUIRE_TIMEOUT = float(os.environ.get("DB_REPLICA_ACQUIRE_TIMEOUT", "1"))
+# A replica that could not be reached is skipped for this many seconds
+DB_REPLICA_RETRY = float(os.environ.get("DB_REPLICA_RETRY", "10"))
+# Reads from a session that wrote within this many seconds stay on the primary; keep it above
+# the worst replication lag you expect
+DB_READ_YOUR_WRITES_WINDOW = float(os.environ.get("DB_READ_YOUR_WRITES_WINDOW", "5"))
+
+_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="db")
+_current_request = contextvars.ContextVar("db_request", default=None)
+
+
+class RequestCancelled(Exception):
+    pass
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _connect():
+    """Open one raw DB connection.
+    Uses DB_HOST/DB_PORT/DB_USER/DB_PASSWORD/DB_NAME when set; otherwise falls back to the
+    deployment's untracked pool.py so existing servers keep their credentials where they are.
+    """
+    host = os.environ.get("DB_HOST")
+    if host:
+        return _connect_mysql(host, int(os.environ.get("DB_PORT", "3306")))
+    import pool
+    return pool.get_connection()
+
+
+def _connect_mysql(host, port):
+    import mysql.connector
+    return mysql.connector.connect(
+        host=host,
+        port=port,
+        user=os.environ.get("DB_USER"),
+        password=os.environ.get("DB_PASSWORD"),
+        database=os.environ.get("DB_NAME"),
+    )
+
+
+def _replica_connectors():
+    """(name, connect) for each configured read replica."""
+    if DB_REPLICA_HOSTS:
+        connectors = []
+        for address in DB_REPLICA_HOSTS:
+            host, _sep, port = address.partition(":")
+            port = int(port or os.environ.get("DB_PORT", "3306"))
+            connectors.append((f"{host}:{port}", functools.partial(_connect_mysql, host, port)))
+        return connectors
+    if os.environ.get("DB_HOST"):
+        return []
+    import pool
+    return [(f"replica{index}", functools.partial(pool.get_replica_connection, index))
+            for index in range(getattr(pool, "REPLICA_COUNT", 0))]
+
+
+class _Entry:
+    __slots__ = ("raw", "created_at", "last_used")
+
+    def __init__(self, raw):
+        self.raw = raw
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class InstrumentedCursor:
+    """Cursor proxy that reports the wall time of every statement and fetch to metrics,
+    and each statement to the SQL profiler when it is enabled."""
+
+    __slots__ = ("_cursor",)
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, method, count, args, kwargs):
+        start = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            record_query(time.perf_counter() - start, count)
+
+    def _statement(self, method, operation, params, args, kwargs, many=False):
+        start = time.perf_counter()
+        try:
+            return method(operation, params, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            record_query(elapsed)
+            # A batch's parameter list isn't useful to the profiler (it can't EXPLAIN it)
+            record_statement(operation, None if many else params, elapsed, getattr(self._cursor, "rowcount", None))
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._statement(self._cursor.execute, operation, params, args, kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._statement(self._cursor.executemany, operation, seq_params, args, kwargs, many=True)
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone, 0, (), {})
+
+    def fetchmany(self, *args, **kwargs):
+        return self._timed(self._cursor.fetchmany, 0, args, kwargs)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall, 0, (), {})
+
+
+class PooledConnection:
+    """Proxy handed to handlers; close() returns the connection to the pool exactly once."""
+
+    def __init__(self, pool, entry):
+        self._pool = pool
+        self._entry = entry
+        self._state = None
+        self._released = False
+
+    def __getattr__(self, name):
+        return getattr(self._entry.raw, name)
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._entry.raw.cursor(*args, **kwargs))
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            self._entry.raw.commit()
+        finally:
+            record_query(time.perf_counter() - start, 0)
+
+    def close(self):
+        if self._state is not None:
+            with self._state.lock:
+                self._state.live.discard(self)
+        if not self._released:
+            self._released = True
+            self._pool.release(self._entry)
+
+
+class ConnectionPool:
+    """Bounded connection pool with idle recycling, pre-ping and live statistics."""
+
+    def __init__(self, connect=_connect, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 recycle=DB_POOL_RECYCLE, idle_timeout=DB_POOL_IDLE_TIMEOUT,
+                 pre_ping=DB_POOL_PRE_PING, acquire_timeout=DB_POOL_ACQUIRE_TIMEOUT, name="primary"):
+        self._connect = connect
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.recycle = recycle
+        self.idle_timeout = idle_timeout
+        self.pre_ping = pre_ping
+        self.acquire_timeout = acquire_timeout
+        self._cond = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiters = 0
+        self._closed = False
+        self.created = 0
+        self.destroyed = 0
+        self.acquires = 0
+        self.timeouts = 0
+        self.ping_failures = 0
+        self._acquire_wait_total = 0.0
+        self._acquire_wait_max = 0.0
+
+    def open(self):
+        """Pre-create min_size connections."""
+        entries = []
+        for _ in range(self.min_size):
+            entries.append(_Entry(self._connect()))
+        with self._cond:
+            self._idle.extend(entries)
+            self._size += len(entries)
+            self.created += len(entries)
+        return self
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            entries = list(self._idle)
+            self._idle.clear()
+            self._size -= len(entries)
+            self._cond.notify_all()
+        for entry in entries:
+            self._close_raw(entry)
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.acquire_timeout
+        while True:
+            entry = None
+            with self._cond:
+                while True:
+                    if self._closed:
+                        raise PoolTimeout("Connection pool is closed")
+                    if self._idle:
+                        # LIFO keeps hot connections hot and lets cold ones age out
+                        entry = self._idle.pop()
+                        self._in_use += 1
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        self._in_use += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeout("Timed out waiting for a database connection")
+                    self._waiters += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiters -= 1
+            if entry is None:
+                try:
+                    entry = _Entry(self._connect())
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._in_use -= 1
+                        self._cond.notify()
+                    raise
+                with self._cond:
+                    self.created += 1
+            elif self._expired(entry) or not self._healthy(entry):
+                self._discard(entry)
+                continue
+            waited = time.monotonic() - start
+            with self._cond:
+                self.acquires += 1
+                self._acquire_wait_total += waited
+                self._acquire_wait_max = max(self._acquire_wait_max, waited)
+            return PooledConnection(self, entry)
+
+    def release(self, entry):
+        raw = entry.raw
+        try:
+            # Never hand an open transaction to the next borrower
+            if getattr(raw, "in_transaction", True):
+                raw.rollback()
+        except Exception:
+            self._discard(entry)
+            return
+        if self._expired(entry):
+            self._discard(entry)
+            return
+        entry.last_used = time.monotonic()
+        with self._cond:
+            self._in_use -= 1
+            if self._closed:
+                self._size -= 1
+                stale = [entry]
+            else:
+                self._idle.append(entry)
+                stale = self._take_idle_expired()
+            self._cond.notify()
+        for old in stale:
+            self._close_raw(old)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiters": self._waiters,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                "created": self.created,
+                "destroyed": self.destroyed,
+                "acquires": self.acquires,
+                "acquire_timeouts": self.timeouts,
+                "ping_failures": self.ping_failures,
+                "avg_acquire_ms": round(self._acquire_wait_total / self.acquires * 1000, 3) if self.acquires else 0.0,
+                "max_acquire_ms": round(self._acquire_wait_max * 1000, 3),
+            }
+
+    def _expired(self, entry):
+        return self.recycle > 0 and time.monotonic() - entry.created_at > self.recycle
+
+    def _healthy(self, entry):
+        if not self.pre_ping:
+            return True
+        try:
+            entry.raw.ping()
+            return True
+        except Exception:
+            with self._cond:
+                self.ping_failures += 1
+            return False
+
+    def _take_idle_expired(self):
+        """Pop idle connections above min_size that sat unused past idle_timeout (caller holds the lock)."""
+        stale = []
+        now = time.monotonic()
+        while (self._idle and self._size > self.min_size
+               and now - self._idle[0].last_used > self.idle_timeout):
+            stale.append(self._idle.popleft())
+            self._size -= 1
+        return stale
+
+    def _discard(self, entry):
+        with self._cond:
+            self._size -= 1
+            self._in_use -= 1
+            self._cond.notify()
+        self._close_raw(entry)
+
+    def _close_raw(self, entry):
+        try:
+            entry.raw.close()
+        except Exception:
+            pass
+        with self._cond:
+            self.destroyed += 1
+
+
+class _Replica:
+    __slots__ = ("pool", "down_until", "reads", "failures")
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.down_until = 0.0
+        self.reads = 0
+        self.failures = 0
+
+
+class ReplicaSet:
+    """Read replicas, each with its own pool, used round-robin. A replica that can't be reached
+    is skipped for DB_REPLICA_RETRY seconds; one that is merely busy is passed over."""
+
+    def __init__(self, connectors=()):
+        self._replicas = [_Replica(ConnectionPool(connect, max_size=DB_REPLICA_POOL_MAX_SIZE,
+                                                  acquire_timeout=DB_REPLICA_ACQUIRE_TIMEOUT, name=name))
+                          for name, connect in connectors]
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self.primary_reads = {"sticky": 0, "fallback": 0}
+
+    def __bool__(self):
+        return bool(self._replicas)
+
+    def open(self):
+        for replica in self._replicas:
+            try:
+                replica.pool.open()
+            except Exception:
+                # A replica that is down at startup must not keep the worker from serving
+                self._mark_down(replica)
+        return self
+
+    def close(self):
+        for replica in self._replicas:
+            replica.pool.close()
+
+    def _mark_down(self, replica):
+        with self._lock:
+            replica.failures += 1
+            replica.down_until = time.monotonic() + DB_REPLICA_RETRY
+
+    def acquire(self):
+        """A connection from the next usable replica, or None when none can serve right now."""
+        count = len(self._replicas)
+        start = next(self._next)
+        for offset in range(count):
+            replica = self._replicas[(start + offset) % count]
+            if replica.down_until > time.monotonic():
+                continue
+            try:
+                connection = replica.pool.acquire()
+            except PoolTimeout:
+                continue
+            except Exception:
+                self._mark_down(replica)
+                continue
+            with self._lock:
+                replica.reads += 1
+            return connection
+        return None
+
+    def count_primary_read(self, reason):
+        with self._lock:
+            self.primary_reads[reason] += 1
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            replicas = [{"name": replica.pool.name, "up": replica.down_until <= now, "reads": replica.reads,
+                         "failures": replica.failures} for replica in self._replicas]
+            primary_reads = dict(self.primary_reads)
+        for entry, replica in zip(replicas, self._replicas):
+            entry["pool"] = replica.pool.stats()
+        return {"replicas": replicas, "primary_reads": primary_reads,
+                "read_your_writes_window_seconds": DB_READ_YOUR_WRITES_WINDOW,
+                "recent_writers": _recent_writes.stats()["size"]}
+
+
+_pool = None
+_replicas = ReplicaSet()
+_pool_lock = threading.Lock()
+
+
+def open_pool():
+    """Create the process-wide pool (and replica pools); called from the FastAPI lifespan."""
+    global _pool, _replicas
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool().open()
+            _replicas = ReplicaSet(_replica_connectors()).open()
+        return _pool
+
+
+def close_pool():
+    global _pool, _replicas
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+            _replicas.close()
+            _replicas = ReplicaSet()
+
+
+def get_pool():
+    return _pool if _pool is not None else open_pool()
+
+
+def pool_stats():
+    return get_pool().stats()
+
+
+def replica_stats():
+    get_pool()
+    return _replicas.stats()
+
+
+# Session keys that committed a write within DB_READ_YOUR_WRITES_WINDOW, mapped to the write's time
+_recent_writes = TTLCache(maxsize=100000, ttl=DB_READ_YOUR_WRITES_WINDOW)
+
+
+def mark_written(keys):
+    now = time.time()
+    for key in keys:
+        _recent_writes.set(key, now)
+
+
+def _wrote_recently(keys):
+    return any(_recent_writes.get(key) is not None for key in keys)
+
+
+class _RequestState:
+    """Connections and sessions used by one offloaded request, so a timeout can kill their queries."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.live = set()
+        self.sessions = []
+        self.cancelled = False
+        self.running = False
+
+
+def get_connection():
+    """Check a connection out of the pool; close() on it returns it."""
+    return _checkout(lambda: get_pool().acquire())
+
+
+def get_read_connection(sticky_keys=()):
+    """Check out a connection for read-only work: from a replica, unless there are none, none
+    can serve, or one of sticky_keys wrote recently and must read its own write."""
+    get_pool()
+    replicas = _replicas
+    if not replicas:
+        return get_connection()
+    if sticky_keys and _wrote_recently(sticky_keys):
+        replicas.count_primary_read("sticky")
+        return get_connection()
+
+    def acquire():
+        connection = replicas.acquire()
+        if connection is None:
+            replicas.count_primary_read("fallback")
+            connection = get_pool().acquire()
+        return connection
+
+    return _checkout(acquire)
+
+
+def _checkout(acquire):
+    state = _current_request.get()
+    if state is not None:
+        with state.lock:
+            if state.cancelled:
+                raise RequestCancelled("Request was cancelled")
+    connection = acquire()
+    if state is not None:
+        with state.lock:
+            if state.cancelled:
+                connection.close()
+                raise RequestCancelled("Request was cancelled")
+            connection._state = state
+            state.live.add(connection)
+    return connection
+
+
+class DBSession:
+    """Per-request DB handle given to routes by Depends(get_db) or Depends(get_read_db).
+    The connection is checked out on first use and always released when the request ends.
+    A read_only session is served by a replica unless one of its sticky keys wrote recently;
+    committing marks the keys so the same session's next reads stay on the primary.
+    """
+
+    def __init__(self, read_only=False, sticky_keys=()):
+        self.read_only = read_only
+        self._sticky_keys = set(sticky_keys)
+        self._connection = None
+        self._cursors = []
+        self._state = None
+        self._lock = threading.Lock()
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            if self.read_only:
+                self._connection = get_read_connection(self._sticky_keys)
+            else:
+                self._connection = get_connection()
+            self._state = _current_request.get()
+            if self._state is not None:
+                self._state.sessions.append(self)
+        return self._connection
+
+    def cursor(self, dictionary=True, buffered=True, **kwargs):
+        cursor = self.connection.cursor(dictionary=dictionary, buffered=buffered, **kwargs)
+        self._cursors.append(cursor)
+        return cursor
+
+    @property
+    def on_replica(self):
+        return self._connection is not None and self._connection._pool.name != "primary"
+
+    def for_user(self, *school_ids):
+        """Also key read-your-writes on these users, for callers identified only in the body.
+        Call before the first query: that is when a read-only session picks its server."""
+        self._sticky_keys.update(f"user:{school_id}" for school_id in school_ids if school_id)
+        return self
+
+    def commit(self):
+        self.connection.commit()
+        self.note_write()
+
+    def note_write(self):
+        """Record a write committed on this session's behalf elsewhere (e.g. by group commit)."""
+        mark_written(self._sticky_keys)
+
+    def close(self):
+        # An offloaded handler that timed out may still be using the connection;
+        # its worker thread releases the session when it finishes.
+        if self._state is not None and self._state.running:
+            return
+        self._release()
+
+    def _release(self):
+        with self._lock:
+            cursors, self._cursors = self._cursors, []
+            connection, self._connection = self._connection, None
+        for cursor in cursors:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        if connection is not None:
+            connection.close()
+
+
+# Query parameters naming the user a request acts for or about
+_USER_PARAMS = ("requester_school_id", "school_id", "author_id")
+
+
+def _sticky_keys(request):
+    """The bearer token identifies the session; user ids in the query cover legacy callers."""
+    keys = set()
+    authorization = request.headers.get("authorization")
+    if authorization:
+        keys.add("session:" + hashlib.sha1(authorization.encode()).hexdigest())
+    for name in _USER_PARAMS:
+        value = request.query_params.get(name)
+        if value:
+            keys.add(f"user:{value}")
+    return keys
+
+
+def get_db(request: Request):
+    """FastAPI dependency yielding a DBSession that is released however the handler exits."""
+    session = DBSession(sticky_keys=_sticky_keys(request))
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def get_read_db(request: Request):
+    """Like get_db, for handlers that never write: reads may be served by a replica."""
+    session = DBSession(read_only=True, sticky_keys=_sticky_keys(request))
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _kill_running_queries(state):
+    """Best effort KILL QUERY for every connection the cancelled request still holds.
+    The request lock is held throughout so none of them can go back to the pool mid-kill.
+    """
+    with state.lock:
+        state.cancelled = True
+        by_pool = {}
+        for connection in state.live:
+            # KILL only reaches queries on the server it is sent to
+            by_pool.setdefault(connection._pool, []).append(connection)
+        for pool, connections in by_pool.items():
+            killer = None
+            try:
+                killer = pool.acquire()
+                cursor = killer.cursor()
+                for connection in connections:
+                    try:
+                        cursor.execute("KILL QUERY %s", (connection.connection_id,))
+                    except Exception:
+                        pass
+                cursor.close()
+            except Exception:
+                pass
+            finally:
+                if killer:
+                    killer.close()
+
+
+def _run_request(state, func, args, kwargs):
+    state.running = True
+    try:
+        return func(*args, **kwargs)
+    finally:
+        state.running = False
+        for session in state.sessions:
+            session._release()
+
+
+def offload(func=None, *, timeout=None):
+    """Run a blocking handler on the bounded DB executor instead of the event loop.
+
+    Usage: put @offload between @app.get/@app.post and a plain `def` handler.
+    On timeout the client gets a 504 and the handler's in-flight queries are killed.
+    """
+    if func is None:
+        return functools.partial(offload, timeout=timeout)
+    limit = DB_REQUEST_TIMEOUT if timeout is None else timeout
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        state = _RequestState()
+        context = contextvars.copy_context()
+        context.run(_current_request.set, state)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            _executor, functools.partial(context.run, _run_request, state, func, args, kwargs))
+        try:
+            return await asyncio.wait_for(future, limit)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            threading.Thread(target=_kill_running_queries, args=(state,), daemon=True).start()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            return JSONResponse(status_code=504, content={"status": "error", "message": "Database request timed out"})
+
+    return wrapper
+
+
+def executor_stats():
+    return {
+        "max_workers": DB_MAX_WORKERS,
+        "queued": _executor._work_queue.qsize(),
+        "request_timeout_seconds": DB_REQUEST_TIMEOUT,
+    }
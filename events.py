@@ -0,0 +1,105 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+
+
+class Subscriber:
+    __slots__ = ("queue", "category", "post_id", "evicted")
+
+    def __init__(self, maxsize, category=None, post_id=None):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.category = category
+        self.post_id = post_id
+        self.evicted = False
+
+    def wants(self, event):
+        if self.category is not None and event.get("category") != self.category:
+            return False
+        if self.post_id is not None and event.get("post_id") != self.post_id:
+            return False
+        return True
+
+
+class Broadcaster:
+    """In-process fan-out of compact change events to SSE subscribers.
+
+    publish() is safe to call from DB worker threads; delivery happens on the event loop.
+    Each subscriber has a bounded queue and is evicted (not waited on) when it falls behind,
+    so idle or slow clients never cost DB work or block writers.
+    """
+
+    def __init__(self, queue_size=100, history=500):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._history = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._loop = None
+        self.published = 0
+        self.delivered = 0
+        self.evictions = 0
+
+    def bind(self, loop):
+        self._loop = loop
+
+    def subscribe(self, category=None, post_id=None, last_event_id=None):
+        subscriber = Subscriber(self.queue_size, category, post_id)
+        if last_event_id is not None:
+            # Replay what the client missed while reconnecting, as far as history allows
+            with self._lock:
+                missed = [e for e in self._history if e["id"] > last_event_id]
+            for event in missed[-self.queue_size:]:
+                if subscriber.wants(event):
+                    subscriber.queue.put_nowait(event)
+        self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    def publish(self, event_type, category=None, post_id=None, reply_id=None):
+        with self._lock:
+            event = {
+                "id": next(self._ids),
+                "type": event_type,
+                "category": category,
+                "post_id": post_id,
+                "reply_id": reply_id,
+                "timestamp": time.time(),
+            }
+            self._history.append(event)
+            self.published += 1
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._fan_out, event)
+        return event
+
+    def _fan_out(self, event):
+        for subscriber in list(self._subscribers):
+            if not subscriber.wants(event):
+                continue
+            try:
+                subscriber.queue.put_nowait(event)
+                self.delivered += 1
+            except asyncio.QueueFull:
+                self._evict(subscriber)
+
+    def _evict(self, subscriber):
+        self._subscribers.discard(subscriber)
+        subscriber.evicted = True
+        self.evictions += 1
+        # Drop the backlog and wake the reader with the end-of-stream marker
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def stats(self):
+        return {
+            "subscribers": len(self._subscribers),
+            "queue_size": self.queue_size,
+            "published": self.published,
+            "delivered": self.delivered,
+            "evictions": self.evictions,
+        }
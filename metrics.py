@@ -0,0 +1,200 @@
+"""Request and DB metrics in the Prometheus text exposition format.
+
+MetricsMiddleware is plain ASGI middleware, so it avoids BaseHTTPMiddleware's extra task
+and body buffering. It times each request and labels it with the matched route template,
+which keeps path parameters out of the series. db.py reports every SQL statement through
+record_query(). The time is added to the current request through a context variable, and
+offloaded handlers run in a copy of the request context, so their queries are counted too.
+Per request the cost is a few perf_counter calls and one locked dict update.
+"""
+import bisect
+import contextvars
+import os
+import threading
+import time
+
+# Set to 0 to skip the middleware entirely; /metrics then only reports pool and cache gauges
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") not in ("0", "false", "False")
+# Upper bounds, in seconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Handlers report failures as a 200 {"status": "error", ...}; the status key always comes first
+_APP_ERROR_PREFIXES = (b'{"status":"error"', b'{"status": "error"')
+
+
+class _RequestMetrics:
+    __slots__ = ("queries", "db_seconds")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+_current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class _RouteStats:
+    __slots__ = ("buckets", "count", "total", "statuses", "app_errors", "queries", "db_seconds")
+
+    def __init__(self, size):
+        self.buckets = [0] * size
+        self.count = 0
+        self.total = 0.0
+        self.statuses = {}
+        self.app_errors = 0
+        self.queries = 0
+        self.db_seconds = 0.0
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def format_family(name, kind, help_text, samples):
+    """One metric family. samples: [(labels dict, value)] or [(suffix, labels dict, value)]."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for sample in samples:
+        suffix, labels, value = sample if len(sample) == 3 else ("", *sample)
+        lines.append(f"{name}{suffix}{_labels(labels)} {_number(value)}")
+    return "\n".join(lines)
+
+
+class Registry:
+    """Per-route request counters and histograms plus DB time spent outside any request."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._routes = {}
+        self.in_progress = 0
+        self.background_queries = 0
+        self.background_db_seconds = 0.0
+
+    def started(self):
+        with self._lock:
+            self.in_progress += 1
+
+    def observe(self, method, route, status, seconds, app_error, request_metrics):
+        """Record one finished request (and end the in-progress count started by started())."""
+        index = bisect.bisect_left(self.buckets, seconds)
+        status_class = f"{status // 100}xx"
+        with self._lock:
+            self.in_progress -= 1
+            stats = self._routes.get((method, route))
+            if stats is None:
+                stats = self._routes[(method, route)] = _RouteStats(len(self.buckets) + 1)
+            stats.buckets[index] += 1
+            stats.count += 1
+            stats.total += seconds
+            stats.statuses[status_class] = stats.statuses.get(status_class, 0) + 1
+            stats.app_errors += app_error
+            stats.queries += request_metrics.queries
+            stats.db_seconds += request_metrics.db_seconds
+
+    def record_background(self, seconds, count):
+        with self._lock:
+            self.background_queries += count
+            self.background_db_seconds += seconds
+
+    def render(self, families=()):
+        """Prometheus text for the request metrics followed by any extra pre-formatted families."""
+        with self._lock:
+            routes = [(method, route, stats.count, stats.total, list(stats.buckets), dict(stats.statuses),
+                       stats.app_errors, stats.queries, stats.db_seconds)
+                      for (method, route), stats in sorted(self._routes.items())]
+            in_progress = self.in_progress
+            background = (self.background_queries, self.background_db_seconds)
+
+        requests, histogram, app_errors, queries, db_seconds = [], [], [], [], []
+        for method, route, count, total, buckets, statuses, errors, route_queries, route_db in routes:
+            labels = {"method": method, "route": route}
+            for status_class, value in sorted(statuses.items()):
+                requests.append(({**labels, "status": status_class}, value))
+            cumulative = 0
+            for bound, value in zip(self.buckets + (float("inf"),), buckets):
+                cumulative += value
+                histogram.append(("_bucket", {**labels, "le": _number(float(bound))}, cumulative))
+            histogram.append(("_sum", labels, total))
+            histogram.append(("_count", labels, count))
+            app_errors.append((labels, errors))
+            queries.append((labels, route_queries))
+            db_seconds.append((labels, route_db))
+        queries.append(({"method": "", "route": "background"}, background[0]))
+        db_seconds.append(({"method": "", "route": "background"}, background[1]))
+
+        parts = [
+            format_family("http_requests_total", "counter", "Requests by route and status class.", requests),
+            format_family("http_request_duration_seconds", "histogram", "Request latency by route.", histogram),
+            format_family("http_app_errors_total", "counter",
+                          'Responses whose body starts with {"status": "error"}.', app_errors),
+            format_family("http_requests_in_progress", "gauge", "Requests currently being handled.",
+                          [({}, in_progress)]),
+            format_family("db_queries_total", "counter", "SQL statements executed, by route.", queries),
+            format_family("db_query_duration_seconds_total", "counter",
+                          "Wall time spent in SQL statements and fetches, by route.", db_seconds),
+        ]
+        parts.extend(families)
+        return "\n".join(parts) + "\n"
+
+
+registry = Registry()
+
+
+def record_query(seconds, count=1):
+    """Attribute one SQL statement (count=0 for a fetch) to the current request, if any."""
+    current = _current.get()
+    if current is None:
+        registry.record_background(seconds, count)
+        return
+    current.queries += count
+    current.db_seconds += seconds
+
+
+class MetricsMiddleware:
+    def __init__(self, app, registry=registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_metrics = _RequestMetrics()
+        token = _current.set(request_metrics)
+        response = {"status": None, "app_error": False, "first_body": True}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body" and response["first_body"]:
+                response["first_body"] = False
+                response["app_error"] = message.get("body", b"").startswith(_APP_ERROR_PREFIXES)
+            await send(message)
+
+        self.registry.started()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            route = scope.get("route")
+            # Unmatched paths share one label so scanners can't create unbounded series
+            route_path = getattr(route, "path", None) or "unmatched"
+            self.registry.observe(scope["method"], route_path, response["status"] or 500, elapsed,
+                             response["app_error"], request_metrics)
@@ -0,0 +1,400 @@
+"""Versioned schema migrations for the forum database.
+
+Run from the server directory (uses the same connection settings as the app):
+    python migrations.py up [VERSION]   # apply pending steps (up to VERSION) in order
+    python migrations.py status         # applied and pending versions
+    python migrations.py check          # report hot-path indexes missing from the live database
+
+Applied versions are recorded in schema_version, so a deployment that already ran the older
+one-shot commands can simply run `up`. Steps 2-5 are idempotent. Step 1 copies the legacy
+classes.students CSV only while class_membership is empty; on a deployment that has already
+cut over it just records itself as applied. The one-shot commands are still available as
+repair tools (class-membership refuses to overwrite existing memberships without --force):
+    python migrations.py class-membership [--force]
+    python migrations.py moderation-counts
+    python migrations.py counters
+    python migrations.py session-revocations
+"""
+import sys
+
+from db import get_connection
+
+CLASS_MEMBERSHIP_DDL = """
+CREATE TABLE IF NOT EXISTS class_membership (
+    class_id INT NOT NULL,
+    school_id VARCHAR(20) NOT NULL,
+    added_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (class_id, school_id),
+    KEY idx_class_membership_school (school_id)
+)
+"""
+
+
+def _class_membership_populated(cursor):
+    cursor.execute(CLASS_MEMBERSHIP_DDL)
+    cursor.execute("SELECT 1 FROM class_membership LIMIT 1")
+    return cursor.fetchone() is not None
+
+
+def migrate_class_membership(connection, batch_size=1000, force=False):
+    """Create class_membership and copy every classes.students CSV entry into it.
+    The copy is one transaction, so a failed run leaves the table empty and can simply be re-run.
+    classes.students is left untouched for rollback but is no longer read or written by the app.
+    Once class_membership has rows it is the source of truth: copying the stale CSV again would
+    bring back every student removed since, so that is refused unless force=True.
+    Returns the number of membership rows inserted.
+    """
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        if _class_membership_populated(cursor) and not force:
+            raise RuntimeError("class_membership already has rows; re-copying classes.students would restore "
+                               "removed students (pass --force to do it anyway)")
+        cursor.execute("SELECT class_id, students FROM classes")
+        rows = []
+        for class_item in cursor.fetchall():
+            seen = set()
+            for school_id in (class_item["students"] or "").split(","):
+                school_id = school_id.strip()
+                if school_id and school_id not in seen:
+                    seen.add(school_id)
+                    rows.append((class_item["class_id"], school_id))
+        inserted = 0
+        for start in range(0, len(rows), batch_size):
+            cursor.executemany("INSERT IGNORE INTO class_membership (class_id, school_id) VALUES (%s, %s)",
+                               rows[start:start + batch_size])
+            inserted += max(cursor.rowcount, 0)
+        connection.commit()
+        return inserted
+    finally:
+        cursor.close()
+
+
+MODERATION_COUNTS_DDL = """
+CREATE TABLE IF NOT EXISTS moderation_counts (
+    kind VARCHAR(10) NOT NULL PRIMARY KEY,
+    pending INT NOT NULL DEFAULT 0
+)
+"""
+
+
+def migrate_moderation_counts(connection):
+    """Create moderation_counts and (re)compute the pending post/reply totals from the tables.
+    The app only applies deltas afterwards, so re-running this also repairs drift caused by
+    writes made outside the API. Returns the counts that were stored.
+    """
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute(MODERATION_COUNTS_DDL)
+        counts = {}
+        for kind, table in (("post", "post"), ("reply", "reply")):
+            cursor.execute(f"INSERT INTO moderation_counts (kind, pending) "
+                           f"SELECT %s, COUNT(*) FROM {table} WHERE validated=0 "
+                           f"ON DUPLICATE KEY UPDATE pending=VALUES(pending)", (kind,))
+            cursor.execute("SELECT pending FROM moderation_counts WHERE kind=%s", (kind,))
+            counts[kind] = cursor.fetchone()["pending"]
+        connection.commit()
+        return counts
+    finally:
+        cursor.close()
+
+
+AUTHOR_STATS_DDL = """
+CREATE TABLE IF NOT EXISTS author_stats (
+    author_id VARCHAR(50) NOT NULL PRIMARY KEY,
+    post_count INT NOT NULL DEFAULT 0,
+    total_posts INT NOT NULL DEFAULT 0
+)
+"""
+
+
+def _column_exists(cursor, table, column):
+    cursor.execute("SELECT 1 FROM information_schema.columns "
+                   "WHERE table_schema = DATABASE() AND table_name=%s AND column_name=%s", (table, column))
+    return cursor.fetchone() is not None
+
+
+def migrate_counters(connection, batch_size=5000):
+    """Add post.reply_count and author_stats, then (re)compute them from the rows: reply_count and
+    author_stats.post_count count validated rows, author_stats.total_posts every post of the author.
+    Safe to re-run at any time as a repair: reply counts are rebuilt in post_id ranges of
+    batch_size, each committed on its own so no long lock is held on the post table.
+    Returns {"posts": rows updated, "authors": authors counted}.
+    """
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        if not _column_exists(cursor, "post", "reply_count"):
+            cursor.execute("ALTER TABLE post ADD COLUMN reply_count INT NOT NULL DEFAULT 0")
+        cursor.execute(AUTHOR_STATS_DDL)
+        if not _column_exists(cursor, "author_stats", "total_posts"):
+            cursor.execute("ALTER TABLE author_stats ADD COLUMN total_posts INT NOT NULL DEFAULT 0")
+
+        cursor.execute("SELECT COALESCE(MAX(post_id), 0) AS max_id FROM post")
+        max_id = cursor.fetchone()["max_id"]
+        updated = 0
+        for start in range(0, max_id + 1, batch_size):
+            cursor.execute(
+                "UPDATE post p LEFT JOIN ("
+                "  SELECT parent_post_id, COUNT(*) AS replies FROM reply"
+                "  WHERE validated=1 AND parent_post_id >= %s AND parent_post_id < %s GROUP BY parent_post_id"
+                ") r ON r.parent_post_id = p.post_id "
+                "SET p.reply_count = COALESCE(r.replies, 0) WHERE p.post_id >= %s AND p.post_id < %s",
+                (start, start + batch_size, start, start + batch_size))
+            updated += max(cursor.rowcount, 0)
+            connection.commit()
+
+        cursor.execute("UPDATE author_stats SET post_count = 0, total_posts = 0")
+        cursor.execute("INSERT INTO author_stats (author_id, post_count, total_posts) "
+                       "SELECT author_id, SUM(validated=1), COUNT(*) FROM post GROUP BY author_id "
+                       "ON DUPLICATE KEY UPDATE post_count = VALUES(post_count), total_posts = VALUES(total_posts)")
+        cursor.execute("SELECT COUNT(*) AS authors FROM author_stats WHERE post_count > 0")
+        authors = cursor.fetchone()["authors"]
+        connection.commit()
+        return {"posts": updated, "authors": authors}
+    finally:
+        cursor.close()
+
+
+SESSION_REVOCATIONS_DDL = """
+CREATE TABLE IF NOT EXISTS session_revocations (
+    school_id VARCHAR(20) NOT NULL PRIMARY KEY,
+    revoked_at DOUBLE NOT NULL
+)
+"""
+
+
+def migrate_session_revocations(connection):
+    """Create session_revocations, the shared list behind /sessions/revoke. Returns its row count."""
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute(SESSION_REVOCATIONS_DDL)
+        cursor.execute("SELECT COUNT(*) AS revoked FROM session_revocations")
+        revoked = cursor.fetchone()["revoked"]
+        connection.commit()
+        return revoked
+    finally:
+        cursor.close()
+
+
+# Access paths the handlers in SchoolWebServer_Sep6.py filter and sort on:
+# (index name, table, columns to create, leading columns a query needs).
+# Where a feed also sorts by upload_time the index carries it, so the newest rows come
+# straight off the index instead of through a filesort.
+HOT_PATH_INDEXES = [
+    ("idx_post_validated_time", "post", ("validated", "upload_time"), ("validated", "upload_time")),
+    ("idx_post_category_validated_time", "post", ("category", "validated", "upload_time"), ("category", "validated")),
+    ("idx_post_author", "post", ("author_id",), ("author_id",)),
+    ("idx_reply_parent_time", "reply", ("parent_post_id", "upload_time"), ("parent_post_id", "upload_time")),
+    ("idx_reply_validated_time", "reply", ("validated", "upload_time"), ("validated",)),
+    ("idx_personal_info_school", "personal_info", ("school_id",), ("school_id",)),
+    ("idx_personal_info_login", "personal_info", ("user_id", "password"), ("user_id", "password")),
+    ("idx_classes_creator", "classes", ("creator_id",), ("creator_id",)),
+]
+# Key prefix used for TEXT/BLOB columns, which MySQL can't index whole
+INDEX_PREFIX_LENGTH = 191
+
+
+def _table_indexes(cursor, table):
+    """{index name: (column tuple in key order, unique)} for one table of the current database."""
+    # Aliased because MySQL 8 reports information_schema column labels in upper case
+    cursor.execute("SELECT index_name AS index_name, column_name AS column_name, non_unique AS non_unique "
+                   "FROM information_schema.statistics WHERE table_schema = DATABASE() AND table_name=%s "
+                   "ORDER BY index_name, seq_in_index", (table,))
+    indexes = {}
+    for row in cursor.fetchall():
+        columns, unique = indexes.get(row["index_name"], ((), not row["non_unique"]))
+        indexes[row["index_name"]] = (columns + (row["column_name"].lower(),), unique)
+    return indexes
+
+
+def _serving_index(indexes, needed):
+    """Name of an existing index that serves an equality lookup on `needed`, or None.
+    Any index starting with those columns does, and so does a unique index covering a prefix of them."""
+    for name, (columns, unique) in indexes.items():
+        if columns[:len(needed)] == needed or (unique and needed[:len(columns)] == columns):
+            return name
+    return None
+
+
+def _index_column(cursor, table, column):
+    cursor.execute("SELECT data_type AS data_type FROM information_schema.columns "
+                   "WHERE table_schema = DATABASE() AND table_name=%s AND column_name=%s", (table, column))
+    row = cursor.fetchone()
+    if row and row["data_type"].lower().endswith(("text", "blob")):
+        return f"`{column}`({INDEX_PREFIX_LENGTH})"
+    return f"`{column}`"
+
+
+def check_indexes(connection):
+    """[(table, needed columns, index name or None)] for every HOT_PATH_INDEXES access path."""
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        report, by_table = [], {}
+        for _name, table, _columns, needed in HOT_PATH_INDEXES:
+            if table not in by_table:
+                by_table[table] = _table_indexes(cursor, table)
+            report.append((table, needed, _serving_index(by_table[table], needed)))
+        return report
+    finally:
+        cursor.close()
+
+
+def migrate_hot_path_indexes(connection):
+    """Create each HOT_PATH_INDEXES entry whose access path no existing index serves.
+    Uses online DDL (ALGORITHM=INPLACE, LOCK=NONE) so reads and writes continue during the build.
+    Returns the names of the indexes created.
+    """
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        created = []
+        for name, table, columns, needed in HOT_PATH_INDEXES:
+            if _serving_index(_table_indexes(cursor, table), needed):
+                continue
+            key = ", ".join(_index_column(cursor, table, column) for column in columns)
+            cursor.execute(f"CREATE INDEX `{name}` ON `{table}` ({key}) ALGORITHM=INPLACE LOCK=NONE")
+            created.append(name)
+        return created
+    finally:
+        cursor.close()
+
+
+SCHEMA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INT NOT NULL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+)
+"""
+# Serializes `up` across hosts deploying at the same time
+MIGRATION_LOCK_NAME = "forum_schema_migrations"
+MIGRATION_LOCK_TIMEOUT = 600
+
+# Ordered up-steps. Append new ones with the next version; never renumber or edit applied ones.
+def _class_membership_step(connection):
+    """Version 1: copy the legacy CSV rosters, unless class_membership is already in use."""
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        populated = _class_membership_populated(cursor)
+    finally:
+        cursor.close()
+    if populated:
+        return "class_membership already populated; nothing copied"
+    return migrate_class_membership(connection)
+
+
+MIGRATIONS = [
+    (1, "class-membership", _class_membership_step),
+    (2, "moderation-counts", migrate_moderation_counts),
+    (3, "counters", migrate_counters),
+    (4, "session-revocations", migrate_session_revocations),
+    (5, "hot-path-indexes", migrate_hot_path_indexes),
+    # Re-runs the counters repair, which now also adds and fills author_stats.total_posts
+    (6, "author-total-posts", migrate_counters),
+]
+
+
+def _applied_versions(cursor):
+    cursor.execute(SCHEMA_VERSION_DDL)
+    cursor.execute("SELECT version, name, applied_at FROM schema_version ORDER BY version")
+    return {row["version"]: row for row in cursor.fetchall()}
+
+
+def migrate_up(connection, target=None):
+    """Apply every pending step up to `target` (default: all) in version order.
+    Each step is recorded in schema_version once it finishes, so an interrupted run resumes
+    where it stopped. Returns [(version, name, step result)] for the steps that ran.
+    """
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s) AS acquired", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+        if not cursor.fetchone()["acquired"]:
+            raise RuntimeError("Another migration run holds the schema lock")
+        try:
+            applied = _applied_versions(cursor)
+            connection.commit()
+            ran = []
+            for version, name, step in MIGRATIONS:
+                if version in applied or (target is not None and version > target):
+                    continue
+                result = step(connection)
+                cursor.execute("INSERT INTO schema_version (version, name) VALUES (%s, %s)", (version, name))
+                connection.commit()
+                ran.append((version, name, result))
+            return ran
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK(%s) AS released", (MIGRATION_LOCK_NAME,))
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+def migration_status(connection):
+    """[(version, name, applied_at or None)] for every known step."""
+    cursor = connection.cursor(dictionary=True, buffered=True)
+    try:
+        applied = _applied_versions(cursor)
+        connection.commit()
+        return [(version, name, applied[version]["applied_at"] if version in applied else None)
+                for version, name, _step in MIGRATIONS]
+    finally:
+        cursor.close()
+
+
+def _run_up(connection, argv):
+    target = int(argv[2]) if len(argv) > 2 else None
+    ran = migrate_up(connection, target)
+    for version, name, result in ran:
+        print(f"{version:>4} {name}: done ({result})")
+    if not ran:
+        print("schema is up to date")
+    return 0
+
+
+def _run_status(connection, argv):
+    for version, name, applied_at in migration_status(connection):
+        print(f"{version:>4} {name:<24} {applied_at or 'pending'}")
+    return 0
+
+
+def _run_check(connection, argv):
+    missing = 0
+    for table, needed, index in check_indexes(connection):
+        path = f"{table} ({', '.join(needed)})"
+        print(f"{path:<40} {index or 'MISSING'}")
+        missing += index is None
+    print(f"{missing} missing index(es)" if missing else "all hot-path indexes present")
+    return 1 if missing else 0
+
+
+VERSIONED_COMMANDS = {
+    "up": _run_up,
+    "status": _run_status,
+    "check": _run_check,
+}
+
+COMMANDS = {
+    "class-membership": migrate_class_membership,
+    "moderation-counts": migrate_moderation_counts,
+    "counters": migrate_counters,
+    "session-revocations": migrate_session_revocations,
+}
+
+
+def main(argv):
+    force = argv[1:2] == ["class-membership"] and argv[2:] == ["--force"]
+    if len(argv) < 2 or (argv[1] not in VERSIONED_COMMANDS and (argv[1] not in COMMANDS
+                                                               or (len(argv) != 2 and not force))):
+        print(f"usage: python migrations.py [{'|'.join(VERSIONED_COMMANDS)}|{'|'.join(COMMANDS)}]")
+        return 2
+    connection = get_connection()
+    try:
+        if argv[1] in VERSIONED_COMMANDS:
+            return VERSIONED_COMMANDS[argv[1]](connection, argv)
+        result = COMMANDS[argv[1]](connection, force=True) if force else COMMANDS[argv[1]](connection)
+        print(f"{argv[1]}: done ({result})")
+    finally:
+        connection.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -0,0 +1,270 @@
+"""Opt-in SQL profiler: per-request statement fingerprints, N+1 flags and EXPLAIN capture.
+
+Enable with SQL_PROFILE=1. ProfilerMiddleware opens a RequestProfile for each sampled request.
+db.py's InstrumentedCursor calls record_statement() for every execute, and the profile is
+found through a context variable, as with metrics. When the response is finished, the
+profile is handed to a single background thread. That thread runs EXPLAIN for slow
+statements, updates the per-fingerprint totals, writes one JSON line to the "sql_profile"
+logger and keeps the result for /debug/sql-profile. None of that work happens on the request
+path. Parameters are only kept for slow statements, and only until they have been EXPLAINed.
+They are never logged or exposed.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import TTLCache
+
+SQL_PROFILE = os.environ.get("SQL_PROFILE", "0") not in ("0", "false", "False")
+# Fraction of requests profiled while enabled
+SQL_PROFILE_SAMPLE = float(os.environ.get("SQL_PROFILE_SAMPLE", "1"))
+# Statements at or above this many milliseconds get an EXPLAIN
+SQL_PROFILE_SLOW_MS = float(os.environ.get("SQL_PROFILE_SLOW_MS", "100"))
+# A SELECT fingerprint repeated this many times in one request is flagged as a likely N+1
+SQL_PROFILE_REPEAT_THRESHOLD = int(os.environ.get("SQL_PROFILE_REPEAT_THRESHOLD", "5"))
+# Finished request profiles kept for /debug/sql-profile
+SQL_PROFILE_HISTORY = int(os.environ.get("SQL_PROFILE_HISTORY", "200"))
+# Per-request cap on recorded statements; the rest are only counted
+SQL_PROFILE_MAX_STATEMENTS = 1000
+# Distinct fingerprints tracked in the running totals
+SQL_PROFILE_MAX_FINGERPRINTS = 2000
+EXPLAIN_CACHE_TTL = 600
+
+logger = logging.getLogger("sql_profile")
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\"")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|\?")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+_EXPLAINABLE = ("select", "update", "delete")
+
+
+@functools.lru_cache(maxsize=4096)
+def fingerprint(statement):
+    """Statement shape with literals and placeholders replaced by ? and IN lists collapsed, so
+    `post_id IN (%s, %s)` and `post_id IN (%s)` share a fingerprint."""
+    text = _STRING_RE.sub("?", statement)
+    text = _NUMBER_RE.sub("?", text)
+    text = _PLACEHOLDER_RE.sub("?", text)
+    text = _LIST_RE.sub("(?+)", text)
+    return _SPACE_RE.sub(" ", text).strip().lower()
+
+
+class RequestProfile:
+    __slots__ = ("method", "path", "started_at", "started", "statements", "dropped")
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.statements = []
+        self.dropped = 0
+
+    def add(self, statement, params, seconds, rowcount):
+        if len(self.statements) >= SQL_PROFILE_MAX_STATEMENTS:
+            self.dropped += 1
+            return
+        slow = seconds * 1000 >= SQL_PROFILE_SLOW_MS
+        # (statement, params, seconds, rowcount); params only survive for slow statements
+        self.statements.append((statement, params if slow else None, seconds, rowcount))
+
+
+_current = contextvars.ContextVar("sql_profile", default=None)
+
+
+def record_statement(statement, params, seconds, rowcount):
+    """Called by db.InstrumentedCursor for every statement; a no-op outside a profiled request."""
+    profile = _current.get()
+    if profile is not None:
+        profile.add(statement, params, seconds, rowcount)
+
+
+class Profiler:
+    def __init__(self, history=SQL_PROFILE_HISTORY):
+        self._lock = threading.Lock()
+        self._history = deque(maxlen=history)
+        self._totals = {}
+        self._explains = TTLCache(maxsize=512, ttl=EXPLAIN_CACHE_TTL)
+        # One thread, so EXPLAINs never hold more than one pooled connection
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sql-profile")
+        self.profiled = 0
+        self.flagged = 0
+        self.explain_failures = 0
+
+    def start(self, method, path):
+        if SQL_PROFILE_SAMPLE < 1 and random.random() >= SQL_PROFILE_SAMPLE:
+            return None
+        return RequestProfile(method, path)
+
+    def finish(self, profile, route, status):
+        duration = time.perf_counter() - profile.started
+        self._executor.submit(self._summarize, profile, route, status, duration)
+
+    def _explain(self, statement, params):
+        cached = self._explains.get(fingerprint(statement))
+        if cached is not None:
+            return cached
+        from db import get_connection
+        connection = get_connection()
+        try:
+            cursor = connection.cursor(dictionary=True, buffered=True)
+            cursor.execute("EXPLAIN " + statement, params)
+            plan = cursor.fetchall()
+            cursor.close()
+        finally:
+            connection.close()
+        self._explains.set(fingerprint(statement), plan)
+        return plan
+
+    def _summarize(self, profile, route, status, duration):
+        try:
+            summary = self._build_summary(profile, route, status, duration)
+        except Exception:
+            logger.exception("sql profile summary failed for %s %s", profile.method, route)
+            return
+        with self._lock:
+            self._history.append(summary)
+            self.profiled += 1
+            self.flagged += bool(summary["n_plus_one"] or summary["slow"])
+        logger.info(json.dumps(summary, default=str))
+
+    def _build_summary(self, profile, route, status, duration):
+        by_fingerprint = {}
+        slow = []
+        for statement, params, seconds, rowcount in profile.statements:
+            key = fingerprint(statement)
+            entry = by_fingerprint.get(key)
+            if entry is None:
+                entry = by_fingerprint[key] = {"fingerprint": key, "count": 0, "total_ms": 0.0, "max_ms": 0.0}
+            entry["count"] += 1
+            entry["total_ms"] += seconds * 1000
+            entry["max_ms"] = max(entry["max_ms"], seconds * 1000)
+            if seconds * 1000 >= SQL_PROFILE_SLOW_MS:
+                record = {"fingerprint": key, "ms": round(seconds * 1000, 3), "rows": rowcount, "explain": None}
+                # executemany batches are recorded without params and can't be EXPLAINed as one statement
+                if key.split(" ", 1)[0] in _EXPLAINABLE and (params is not None or "%s" not in statement):
+                    try:
+                        record["explain"] = self._explain(statement, params)
+                    except Exception as e:
+                        self.explain_failures += 1
+                        record["explain_error"] = str(e)
+                slow.append(record)
+        fingerprints = sorted(by_fingerprint.values(), key=lambda entry: entry["total_ms"], reverse=True)
+        for entry in fingerprints:
+            entry["total_ms"] = round(entry["total_ms"], 3)
+            entry["max_ms"] = round(entry["max_ms"], 3)
+        n_plus_one = [entry for entry in fingerprints
+                      if entry["count"] >= SQL_PROFILE_REPEAT_THRESHOLD and entry["fingerprint"].startswith("select")]
+        self._add_totals(route, fingerprints, n_plus_one, profile.statements)
+        return {
+            "route": route,
+            "method": profile.method,
+            "path": profile.path,
+            "status": status,
+            "started_at": round(profile.started_at, 3),
+            "duration_ms": round(duration * 1000, 3),
+            "statements": len(profile.statements) + profile.dropped,
+            "db_ms": round(sum(seconds for _s, _p, seconds, _r in profile.statements) * 1000, 3),
+            "fingerprints": fingerprints,
+            "n_plus_one": n_plus_one,
+            "slow": slow,
+        }
+
+    def _add_totals(self, route, fingerprints, n_plus_one, statements):
+        flagged = {entry["fingerprint"] for entry in n_plus_one}
+        samples = {}
+        for statement, *_rest in statements:
+            samples.setdefault(fingerprint(statement), statement)
+        with self._lock:
+            for entry in fingerprints:
+                key = entry["fingerprint"]
+                totals = self._totals.get(key)
+                if totals is None:
+                    if len(self._totals) >= SQL_PROFILE_MAX_FINGERPRINTS:
+                        continue
+                    totals = self._totals[key] = {"fingerprint": key, "sample": samples[key][:500], "count": 0,
+                                                  "requests": 0, "total_ms": 0.0, "max_ms": 0.0,
+                                                  "n_plus_one_requests": 0, "routes": set()}
+                totals["count"] += entry["count"]
+                totals["requests"] += 1
+                totals["total_ms"] += entry["total_ms"]
+                totals["max_ms"] = max(totals["max_ms"], entry["max_ms"])
+                totals["n_plus_one_requests"] += key in flagged
+                totals["routes"].add(route)
+
+    def recent(self, limit=50, flagged_only=False):
+        with self._lock:
+            history = list(self._history)
+        if flagged_only:
+            history = [summary for summary in history if summary["n_plus_one"] or summary["slow"]]
+        return history[-limit:][::-1]
+
+    def top(self, limit=50):
+        """Fingerprints with the most total DB time since start."""
+        with self._lock:
+            totals = [dict(entry, total_ms=round(entry["total_ms"], 3), routes=sorted(entry["routes"]))
+                      for entry in self._totals.values()]
+        totals.sort(key=lambda entry: entry["total_ms"], reverse=True)
+        return totals[:limit]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": SQL_PROFILE,
+                "sample": SQL_PROFILE_SAMPLE,
+                "slow_ms": SQL_PROFILE_SLOW_MS,
+                "repeat_threshold": SQL_PROFILE_REPEAT_THRESHOLD,
+                "profiled_requests": self.profiled,
+                "flagged_requests": self.flagged,
+                "fingerprints": len(self._totals),
+                "explain_failures": self.explain_failures,
+                "pending": self._executor._work_queue.qsize(),
+            }
+
+    def reset(self):
+        with self._lock:
+            self._history.clear()
+            self._totals.clear()
+        self._explains.clear()
+
+
+profiler = Profiler()
+
+
+class ProfilerMiddleware:
+    def __init__(self, app, profiler=profiler):
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        profile = self.profiler.start(scope["method"], scope["path"])
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+        token = _current.set(profile)
+        status = {"code": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            self.profiler.finish(profile, route, status["code"])
@@ -0,0 +1,264 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter
+
+
+def _normalize(text):
+    text = str(text or "")
+    if text.isascii():
+        return text.lower().strip()
+    # Strip accents (José -> jose) but keep non-Latin scripts such as Hangul intact
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return unicodedata.normalize("NFC", text).casefold().strip()
+
+
+def _trigrams(token):
+    padded = f"^{token}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """In-memory student name index with prefix, substring and typo-tolerant (trigram) matching.
+
+    Matching runs over the distinct name-token vocabulary (far smaller than the student count)
+    and only then fans out to students. Built once from the DB, updated incrementally with add();
+    search() never touches the DB.
+    """
+
+    # Minimum Dice similarity between a query token and a name token to count as a typo match
+    MIN_SIMILARITY = 0.45
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._records = {}
+        self._doc_tokens = {}
+        self._sort_keys = {}
+        # token -> set of school_ids whose name contains it
+        self._token_docs = {}
+        # token -> its trigram set; trigram -> set of tokens containing it
+        self._token_trigrams = {}
+        self._trigram_tokens = {}
+        self._vocabulary = []
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._records)
+
+    def build(self, rows, built_at=None):
+        """Fill the index from rows (dicts with school_id, given_name, surname, ...)."""
+        with self._lock:
+            for row in rows:
+                self._add(row, keep_sorted=False)
+            self._vocabulary = sorted(self._token_docs)
+            self.built_at = built_at
+
+    def add(self, row):
+        with self._lock:
+            self._add(row, keep_sorted=True)
+
+    def _add(self, row, keep_sorted):
+        school_id = str(row["school_id"])
+        if school_id in self._records:
+            self._remove(school_id)
+        given_name = _normalize(row.get("given_name"))
+        surname = _normalize(row.get("surname"))
+        tokens = set(f"{given_name} {surname}".split())
+        self._records[school_id] = row
+        self._doc_tokens[school_id] = tokens
+        self._sort_keys[school_id] = (surname, given_name, school_id)
+        for token in tokens:
+            docs = self._token_docs.get(token)
+            if docs is None:
+                docs = self._token_docs[token] = set()
+                grams = self._token_trigrams[token] = _trigrams(token)
+                for gram in grams:
+                    self._trigram_tokens.setdefault(gram, set()).add(token)
+                if keep_sorted:
+                    bisect.insort(self._vocabulary, token)
+            docs.add(school_id)
+
+    def _remove(self, school_id):
+        # Tokens stay in the vocabulary even if no student uses them any more; they match nobody
+        for token in self._doc_tokens.pop(school_id, ()):
+            self._token_docs[token].discard(school_id)
+        self._records.pop(school_id, None)
+        self._sort_keys.pop(school_id, None)
+
+    def _match_tokens(self, query_token):
+        """Score every vocabulary token against one query word: {token: score}."""
+        scores = {}
+        i = bisect.bisect_left(self._vocabulary, query_token)
+        while i < len(self._vocabulary) and self._vocabulary[i].startswith(query_token):
+            token = self._vocabulary[i]
+            scores[token] = 1.0 if token == query_token else 0.9
+            i += 1
+        if len(query_token) < 3:
+            return scores
+        query_grams = _trigrams(query_token)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(self._trigram_tokens.get(gram, ()))
+        for token, count in shared.items():
+            if token in scores:
+                continue
+            if query_token in token:
+                scores[token] = 0.7
+                continue
+            similarity = 2 * count / (len(query_grams) + len(self._token_trigrams[token]))
+            if similarity >= self.MIN_SIMILARITY:
+                scores[token] = 0.6 * similarity
+        return scores
+
+    def search(self, query, limit=20):
+        """Ranked matches where every query word matches some part of the student's name."""
+        query_tokens = list(dict.fromkeys(_normalize(query).split()))
+        if not query_tokens:
+            return []
+        with self._lock:
+            per_word = []
+            for query_token in query_tokens:
+                doc_scores = {}
+                for token, score in self._match_tokens(query_token).items():
+                    for school_id in self._token_docs[token]:
+                        if doc_scores.get(school_id, 0.0) < score:
+                            doc_scores[school_id] = score
+                if not doc_scores:
+                    return []
+                per_word.append(doc_scores)
+            # Every word has to match: intersect starting from the most selective word
+            per_word.sort(key=len)
+            totals = dict(per_word[0])
+            for doc_scores in per_word[1:]:
+                totals = {school_id: score + doc_scores[school_id]
+                          for school_id, score in totals.items() if school_id in doc_scores}
+                if not totals:
+                    return []
+            best = heapq.nsmallest(limit, totals.items(),
+                                   key=lambda item: (-item[1], self._sort_keys[item[0]]))
+            return [self._records[school_id] for school_id, _ in best]
+
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _terms(text):
+    return _WORD_RE.findall(_normalize(text))
+
+
+class PostIndex:
+    """In-memory BM25 inverted index over post titles, post bodies and validated reply bodies.
+
+    Each post is one document; title words count double. Posts keep their category and
+    validated flag so visibility is filtered here, and replies are folded into their parent
+    post only while validated. Maintained incrementally by the write and moderation handlers.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    TITLE_WEIGHT = 2
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # post_id -> [category, validated, {term: tf}, length]
+        self._posts = {}
+        # reply_id -> [parent_post_id, validated, {term: tf}]
+        self._replies = {}
+        # term -> {post_id: tf}
+        self._postings = {}
+        self._total_length = 0
+        self.built_at = None
+
+    def __len__(self):
+        return len(self._posts)
+
+    def build(self, posts, replies, built_at=None):
+        """Fill the index from post rows (post_id, title, content, category, validated)
+        and reply rows (reply_id, parent_post_id, content, validated).
+        """
+        with self._lock:
+            for post in posts:
+                self.add_post(post["post_id"], post["title"], post["content"], post["category"], post["validated"])
+            for reply in replies:
+                self.add_reply(reply["reply_id"], reply["parent_post_id"], reply["content"], reply["validated"])
+            self.built_at = built_at
+
+    def _apply(self, post_id, term_counts, sign):
+        post = self._posts[post_id]
+        doc_terms = post[2]
+        for term, count in term_counts.items():
+            tf = doc_terms.get(term, 0) + sign * count
+            postings = self._postings.setdefault(term, {})
+            if tf > 0:
+                doc_terms[term] = tf
+                postings[post_id] = tf
+            else:
+                doc_terms.pop(term, None)
+                postings.pop(post_id, None)
+                if not postings:
+                    del self._postings[term]
+            post[3] += sign * count
+            self._total_length += sign * count
+
+    def add_post(self, post_id, title, content, category, validated=1):
+        term_counts = Counter(_terms(content))
+        for term in _terms(title):
+            term_counts[term] += self.TITLE_WEIGHT
+        with self._lock:
+            # Posts are never edited, so a repeated add only refreshes the moderation state
+            if post_id not in self._posts:
+                length = sum(term_counts.values())
+                self._posts[post_id] = [category, 0, dict(term_counts), length]
+                self._total_length += length
+                for term, tf in term_counts.items():
+                    self._postings.setdefault(term, {})[post_id] = tf
+            self._posts[post_id][1] = 1 if validated else 0
+
+    def add_reply(self, reply_id, post_id, content, validated=1):
+        with self._lock:
+            if reply_id in self._replies or post_id not in self._posts:
+                return
+            self._replies[reply_id] = [post_id, 0, Counter(_terms(content))]
+            self.set_reply_validated(reply_id, validated)
+
+    def set_post_validated(self, post_id, validated):
+        with self._lock:
+            if post_id in self._posts:
+                self._posts[post_id][1] = 1 if validated else 0
+
+    def set_reply_validated(self, reply_id, validated):
+        validated = 1 if validated else 0
+        with self._lock:
+            reply = self._replies.get(reply_id)
+            if reply is None or reply[1] == validated or reply[0] not in self._posts:
+                return
+            reply[1] = validated
+            self._apply(reply[0], reply[2], 1 if validated else -1)
+
+    def search(self, query, limit=20, offset=0, category=None, include_pending=False):
+        """Return ([(post_id, score)], has_more) for posts matching any query word, best first."""
+        query_terms = set(_terms(query))
+        with self._lock:
+            if not query_terms or not self._posts:
+                return [], False
+            total = len(self._posts)
+            average_length = self._total_length / total or 1.0
+            scores = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for post_id, tf in postings.items():
+                    category_, validated, _, length = self._posts[post_id]
+                    if not (validated or include_pending) or (category is not None and category_ != category):
+                        continue
+                    norm = self.K1 * (1 - self.B + self.B * length / average_length)
+                    scores[post_id] = scores.get(post_id, 0.0) + idf * tf * (self.K1 + 1) / (tf + norm)
+            # Ties go to the newer post (higher id)
+            top = heapq.nlargest(offset + limit + 1, scores.items(), key=lambda item: (item[1], item[0]))
+            return top[offset:offset + limit], len(top) > offset + limit
@@ -0,0 +1,109 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import threading
+import time
+
+# HMAC key shared by every worker. Without it each process signs with its own random key,
+# so tokens only verify on the worker that issued them.
+SESSION_SECRET_CONFIGURED = bool(os.environ.get("SESSION_SECRET"))
+SESSION_SECRET = os.environ.get("SESSION_SECRET") or secrets.token_hex(32)
+# Token lifetime in seconds
+SESSION_TTL = int(os.environ.get("SESSION_TTL", str(12 * 3600)))
+# Seconds between reloads of the shared revocation list; bounds how long a revoked token still works
+SESSION_REVOCATION_REFRESH = float(os.environ.get("SESSION_REVOCATION_REFRESH", "30"))
+# When set, endpoints ignore the legacy requester_school_id and only trust session tokens
+SESSION_TOKENS_REQUIRED = os.environ.get("SESSION_TOKENS_REQUIRED", "0") not in ("0", "false", "False")
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _b64encode(raw):
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload, secret):
+    return _b64encode(hmac.new(secret.encode(), payload.encode(), hashlib.sha256).digest())
+
+
+def issue_token(school_id, user_id, is_teacher, is_admin, ttl=None, secret=None, now=None):
+    """Sign a session token carrying the caller's identity and role. Returns (token, expires_at)."""
+    issued_at = time.time() if now is None else now
+    expires_at = issued_at + (SESSION_TTL if ttl is None else ttl)
+    claims = {
+        "sid": str(school_id),
+        "uid": user_id,
+        "t": bool(is_teacher),
+        "a": bool(is_admin),
+        "iat": issued_at,
+        "exp": expires_at,
+    }
+    payload = _b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{_sign(payload, secret or SESSION_SECRET)}", expires_at
+
+
+def verify_token(token, secret=None, now=None):
+    """Check signature and expiry without any I/O.
+    Returns {"school_id", "user_id", "is_teacher", "is_admin", "issued_at", "expires_at"};
+    raises InvalidToken otherwise.
+    """
+    try:
+        payload, signature = token.split(".")
+    except (AttributeError, ValueError):
+        raise InvalidToken("Malformed session token")
+    # Compare bytes: compare_digest raises TypeError on non-ASCII str, and the token is client input
+    if not hmac.compare_digest(signature.encode(), _sign(payload, secret or SESSION_SECRET).encode()):
+        raise InvalidToken("Invalid session token")
+    try:
+        claims = json.loads(_b64decode(payload))
+    except Exception:
+        raise InvalidToken("Malformed session token")
+    if claims["exp"] <= (time.time() if now is None else now):
+        raise InvalidToken("Session expired")
+    return {
+        "school_id": claims["sid"],
+        "user_id": claims["uid"],
+        "is_teacher": claims["t"],
+        "is_admin": claims["a"],
+        "issued_at": claims["iat"],
+        "expires_at": claims["exp"],
+    }
+
+
+class RevocationList:
+    """school_id -> revoked_at. Tokens for that school_id issued at or before revoked_at are rejected.
+
+    The list is shared through the DB; each process holds a copy that the caller refreshes every
+    SESSION_REVOCATION_REFRESH seconds, so lookups stay in memory.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self.loaded_at = None
+
+    def replace(self, revoked, loaded_at=None):
+        with self._lock:
+            self._revoked = dict(revoked)
+            self.loaded_at = loaded_at
+
+    def revoke(self, school_id, revoked_at):
+        with self._lock:
+            school_id = str(school_id)
+            self._revoked[school_id] = max(revoked_at, self._revoked.get(school_id, 0))
+
+    def is_revoked(self, session):
+        revoked_at = self._revoked.get(session["school_id"])
+        return revoked_at is not None and session["issued_at"] <= revoked_at
+
+    def __len__(self):
+        return len(self._revoked)
@@ -0,0 +1,97 @@
+"""Shared fixtures: the app running in-process against the SQLite stand-in from bench/."""
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+
+import schema  # noqa: E402
+import standin  # noqa: E402
+
+sys.modules["pool"] = standin
+
+import db as db_module  # noqa: E402
+import SchoolWebServer_Sep6 as server  # noqa: E402
+
+
+def _reset_state():
+    """Process-wide caches outlive a test; start each one from nothing. The lifespan skips its
+    shutdown when a scenario raises, so also drop any pool still open on an earlier database."""
+    server.write_batcher.close()
+    db_module.close_pool()
+    server.feed_cache.clear()
+    server.role_cache.clear()
+    server.revocations.replace({}, None)
+    server.post_rate_limiter = server.TokenBucketLimiter(server.POST_RATE, server.POST_BURST)
+    server.reply_rate_limiter = server.TokenBucketLimiter(server.REPLY_RATE, server.REPLY_BURST)
+    db_module._recent_writes.clear()
+
+
+@pytest.fixture
+def seeded_db(tmp_path):
+    """Factory: seed a fresh stand-in database and return its path. Keyword arguments go to
+    schema.seed(), except `replicas` and `replica_lag` which configure the stand-in."""
+    def seed(replicas=0, replica_lag=0.0, **kwargs):
+        path = str(tmp_path / "school.sqlite")
+        standin.configure(path, replicas=replicas, replica_lag=replica_lag)
+        options = dict(students=40, teachers=4, admins=1, posts=30, replies_per_post=2, classes=4, class_size=10)
+        options.update(kwargs)
+        connection = standin.get_connection()
+        try:
+            schema.create_schema(connection, dialect="sqlite")
+            schema.seed(connection, **options)
+        finally:
+            connection.close()
+        _reset_state()
+        return path
+
+    yield seed
+    _reset_state()
+
+
+@pytest.fixture
+def run_app():
+    """Run `scenario(client)` against the app, with its lifespan, and return what it returns."""
+    def run(scenario):
+        async def main():
+            async with server.app.router.lifespan_context(server.app):
+                transport = httpx.ASGITransport(app=server.app)
+                async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                    return await scenario(client)
+
+        return asyncio.run(main())
+
+    return run
+
+
+@pytest.fixture
+def login():
+    """Log in through the API and return the session token."""
+    async def log_in(client, role, user_id):
+        response = await client.post(f"/login-check-{role}", json={"username": user_id, "password": "password"})
+        body = response.json()
+        assert body["status"] == "success", body
+        return body["token"]
+
+    return log_in
+
+
+@pytest.fixture
+def sql():
+    """Run one statement straight against the stand-in database; returns the rows as dicts."""
+    def run(query, params=()):
+        connection = standin.get_connection()
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(query, params)
+            rows = cursor.fetchall() if cursor.description else []
+            connection.commit()
+            return rows
+        finally:
+            connection.close()
+
+    return run
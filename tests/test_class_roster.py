@@ -0,0 +1,60 @@
+"""Bulk roster edits: one result per id, partial failures reported rather than aborting the batch."""
+
+
+def _class_with_outsiders(sql):
+    klass = sql("SELECT class_id, creator_id FROM classes ORDER BY class_id LIMIT 1")[0]
+    members = [row["school_id"] for row in sql(
+        "SELECT school_id FROM class_membership WHERE class_id=%s ORDER BY school_id", (klass["class_id"],))]
+    outsiders = [row["school_id"] for row in sql(
+        "SELECT school_id FROM student_data WHERE school_id NOT IN "
+        "(SELECT school_id FROM class_membership WHERE class_id=%s) ORDER BY school_id", (klass["class_id"],))]
+    return klass, members, outsiders
+
+
+def _members(sql, class_id):
+    return {row["school_id"] for row in sql("SELECT school_id FROM class_membership WHERE class_id=%s", (class_id,))}
+
+
+def test_bulk_roster_reports_each_id(seeded_db, run_app, sql):
+    seeded_db()
+    klass, members, outsiders = _class_with_outsiders(sql)
+    class_id = klass["class_id"]
+    request = {
+        "class_id": class_id,
+        "creator_id": klass["creator_id"],
+        "add": [outsiders[0], outsiders[1], members[0], "200000", outsiders[2]],
+        "remove": [members[1], members[2], outsiders[3], outsiders[2]],
+    }
+
+    async def scenario(client):
+        return (await client.post("/class-roster/bulk", json=request)).json()
+
+    body = run_app(scenario)
+    assert body["status"] == "success", body
+    assert body["results"] == {
+        outsiders[0]: "added",
+        outsiders[1]: "added",
+        members[0]: "already_member",
+        "200000": "not_a_student",
+        members[1]: "removed",
+        members[2]: "removed",
+        outsiders[3]: "not_member",
+        outsiders[2]: "conflict",
+    }
+    assert (body["added"], body["removed"]) == (2, 2)
+    assert _members(sql, class_id) == set(members) - {members[1], members[2]} | {outsiders[0], outsiders[1]}
+
+
+def test_bulk_roster_rejects_other_teachers(seeded_db, run_app, sql):
+    seeded_db()
+    klass, members, outsiders = _class_with_outsiders(sql)
+    other = next(row["teacher_id"] for row in sql("SELECT teacher_id FROM teacher_data ORDER BY teacher_id")
+                 if row["teacher_id"] != klass["creator_id"])
+    request = {"class_id": klass["class_id"], "creator_id": other, "add": [outsiders[0]], "remove": [members[0]]}
+
+    async def scenario(client):
+        return (await client.post("/class-roster/bulk", json=request)).json()
+
+    body = run_app(scenario)
+    assert body == {"status": "error", "message": "Class not found or you don't have permission to edit it"}
+    assert _members(sql, klass["class_id"]) == set(members)
@@ -0,0 +1,58 @@
+"""Conditional GETs: an unchanged post or feed page answers 304, and any write that changes it a new ETag."""
+import SchoolWebServer_Sep6 as server
+
+
+def _conditional(client, path, etag, **params):
+    return client.get(path, params=params, headers={"If-None-Match": etag})
+
+
+def test_get_post_304_until_a_reply_changes_it(seeded_db, run_app, login, sql):
+    seeded_db()
+    post_id = sql("SELECT post_id FROM post WHERE validated=1 AND anonymous=1 ORDER BY post_id LIMIT 1")[0]["post_id"]
+
+    async def scenario(client):
+        first = await client.get("/get-post", params={"post_id": post_id})
+        etag = first.headers["ETag"]
+        unchanged = await _conditional(client, "/get-post", etag, post_id=post_id)
+        assert (unchanged.status_code, unchanged.headers["ETag"], unchanged.content) == (304, etag, b"")
+
+        # Admins see the real author of an anonymous post, so they must not share its tag
+        admin = await login(client, "admin", "admin0")
+        as_admin = await client.get("/get-post", params={"post_id": post_id},
+                                    headers={"Authorization": f"Bearer {admin}", "If-None-Match": etag})
+        assert as_admin.status_code == 200 and as_admin.headers["ETag"] != etag
+
+        reply = await client.post("/post-reply", json={"upload_time": "2026-10-01T12:00:00Z", "parent_post_id": post_id,
+                                                       "content": "me too", "author_id": "100003", "anonymous": 0})
+        assert reply.json()["status"] == "success"
+        changed = await _conditional(client, "/get-post", etag, post_id=post_id)
+        assert changed.status_code == 200 and changed.headers["ETag"] != etag
+        assert changed.json()["post"]["reply_count"] == first.json()["post"]["reply_count"] + 1
+
+    run_app(scenario)
+
+
+def test_post_list_304_until_an_upload_changes_it(seeded_db, run_app):
+    seeded_db()
+    params = {"limit": 10}
+
+    async def scenario(client):
+        first = await client.get("/post-list", params=params)
+        etag = first.headers["ETag"]
+        assert (await _conditional(client, "/post-list", etag, **params)).status_code == 304
+        assert (await _conditional(client, "/post-list", f"W/{etag}", **params)).status_code == 304
+
+        # The tag comes from the page itself, so it survives the cache entry being rebuilt
+        server.feed_cache.clear()
+        rebuilt = await _conditional(client, "/post-list", etag, **params)
+        assert (rebuilt.status_code, rebuilt.headers["ETag"]) == (304, etag)
+
+        upload = await client.post("/post-upload", json={
+            "upload_time": "2026-10-17T12:00:00Z", "title": "newest", "content": "body",
+            "author_id": "100004", "anonymous": 0, "category": "Math"})
+        post_id = upload.json()["post_id"]
+        changed = await _conditional(client, "/post-list", etag, **params)
+        assert changed.status_code == 200 and changed.headers["ETag"] != etag
+        assert changed.json()["posts"][0]["post_id"] == post_id
+
+    run_app(scenario)
@@ -0,0 +1,80 @@
+"""Feed requests must cost a constant number of SQL statements, however many posts there are.
+
+Runs the app in-process against the SQLite stand-in from bench/ and reads the per-route
+statement counter that MetricsMiddleware publishes on /metrics.
+"""
+import asyncio
+import os
+import re
+import sys
+
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "bench")]
+
+import schema  # noqa: E402
+import standin  # noqa: E402
+
+sys.modules["pool"] = standin
+
+import SchoolWebServer_Sep6 as server  # noqa: E402
+
+_QUERIES_RE = re.compile(r'^db_queries_total\{method="GET",route="(?P<route>[^"]+)"\} (?P<count>\d+)$', re.M)
+
+
+def _route_queries(route):
+    for match in _QUERIES_RE.finditer(server.metrics_registry.render()):
+        if match.group("route") == route:
+            return int(match.group("count"))
+    return 0
+
+
+def _seed(path, posts):
+    standin.configure(path)
+    connection = standin.get_connection()
+    try:
+        schema.create_schema(connection, dialect="sqlite")
+        schema.seed(connection, students=40, teachers=4, admins=1, posts=posts, replies_per_post=3,
+                    classes=4, class_size=10)
+    finally:
+        connection.close()
+
+
+def _feed_page_queries(path, posts, params):
+    """Seed a database with `posts` posts, walk /post-list to the end and return the statements per page."""
+    _seed(path, posts)
+    server.feed_cache.clear()
+
+    async def walk():
+        async with server.app.router.lifespan_context(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                counts, page_cursor, seen = [], None, 0
+                while True:
+                    before = _route_queries("/post-list")
+                    page_params = dict(params, cursor=page_cursor) if page_cursor else params
+                    response = await client.get("/post-list", params=page_params)
+                    body = response.json()
+                    assert body["status"] == "success", body
+                    counts.append(_route_queries("/post-list") - before)
+                    seen += len(body["posts"])
+                    page_cursor = body["next_cursor"]
+                    if not page_cursor:
+                        return counts, seen
+
+    return asyncio.run(walk())
+
+
+@pytest.mark.parametrize("params", [
+    {"limit": server.FEED_MAX_LIMIT},
+    {"limit": server.FEED_MAX_LIMIT, "include_replies": "false"},
+])
+def test_post_list_query_count_is_constant(tmp_path, params):
+    small, small_seen = _feed_page_queries(str(tmp_path / "small.sqlite"), 10, params)
+    large, large_seen = _feed_page_queries(str(tmp_path / "large.sqlite"), 500, params)
+    assert small_seen > 0 and large_seen > small_seen
+    assert len(large) > 1 and min(small) > 0
+    # Every page costs the same, whether it holds a handful of posts or a full page
+    assert set(large) == set(small), (small, large)
@@ -0,0 +1,101 @@
+"""Group commit: each caller gets back its own id, or its own error, however the rows were batched."""
+import asyncio
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import standin
+import SchoolWebServer_Sep6 as server
+from writer import GroupCommitWriter
+
+
+@pytest.fixture(autouse=True)
+def _fresh_batcher_stats(monkeypatch):
+    """The server's shared writer keeps counting across tests; give each test its own."""
+    batcher = GroupCommitWriter(server.get_connection)
+    batcher.register("post", server._insert_posts)
+    batcher.register("reply", server._insert_replies)
+    monkeypatch.setattr(server, "write_batcher", batcher)
+    yield
+    batcher.close()
+
+
+def _post_row(i):
+    return ("2026-10-01 12:00:00", f"title {i}", f"content {i}", f"10000{i % 3}", 0, "Math")
+
+
+def test_concurrent_submits_get_their_own_ids(seeded_db, sql):
+    seeded_db()
+    totals = {row["author_id"]: row["total_posts"] for row in sql("SELECT author_id, total_posts FROM author_stats")}
+    writer = GroupCommitWriter(standin.get_connection, linger=0.05)
+    writer.register("post", server._insert_posts)
+    try:
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            ids = list(pool.map(lambda i: writer.submit("post", _post_row(i)).result(timeout=10), range(24)))
+    finally:
+        writer.close()
+
+    assert len(set(ids)) == 24
+    titles = {row["post_id"]: row["title"] for row in sql(
+        f"SELECT post_id, title FROM post WHERE post_id IN ({','.join(['%s'] * len(ids))})", ids)}
+    assert [titles[post_id] for post_id in ids] == [f"title {i}" for i in range(24)]
+    stats = writer.stats()
+    assert stats["rows"] == 24 and stats["batches"] < 24
+    assert (stats["failed_batches"], stats["failed_rows"]) == (0, 0)
+    for author_id in ("100000", "100001", "100002"):
+        after = sql("SELECT total_posts FROM author_stats WHERE author_id=%s", (author_id,))[0]["total_posts"]
+        assert after == totals.get(author_id, 0) + 8
+
+
+def _insert_notes(connection, values):
+    cursor = connection.cursor()
+    cursor.execute("INSERT INTO note (value) VALUES " + ", ".join(["(%s)"] * len(values)), values)
+    first_id = cursor.lastrowid
+    connection.commit()
+    return [first_id + i for i in range(len(values))]
+
+
+def test_a_bad_row_fails_only_its_own_caller(seeded_db, sql):
+    seeded_db(posts=0)
+    sql("CREATE TABLE note (note_id INTEGER PRIMARY KEY, value TEXT NOT NULL)")
+    writer = GroupCommitWriter(standin.get_connection, linger=0.2)
+    writer.register("note", _insert_notes)
+    try:
+        values = ["a", "b", None, "c", "d"]
+        futures = [writer.submit("note", value) for value in values]
+        results = {}
+        for value, future in zip(values, futures):
+            try:
+                results[value] = future.result(timeout=10)
+            except sqlite3.IntegrityError as e:
+                results[value] = e
+    finally:
+        writer.close()
+
+    assert isinstance(results.pop(None), sqlite3.IntegrityError)
+    rows = {row["note_id"]: row["value"] for row in sql("SELECT note_id, value FROM note")}
+    # The failed batch was rolled back, so the good rows were written once, by the row-by-row retry
+    assert rows == {note_id: value for value, note_id in results.items()}
+    stats = writer.stats()
+    assert (stats["failed_batches"], stats["failed_rows"]) == (1, 1)
+
+
+def test_uploads_through_the_batcher(seeded_db, run_app, sql, monkeypatch):
+    seeded_db()
+    monkeypatch.setattr(server, "WRITE_BATCHING", True)
+
+    async def upload(client, i):
+        response = await client.post("/post-upload", json={
+            "upload_time": "2026-10-01T12:00:00Z", "title": f"batched {i}", "content": "body",
+            "author_id": f"10000{i}", "anonymous": 0, "category": "Math"})
+        return response.json()
+
+    async def scenario(client):
+        return await asyncio.gather(*(upload(client, i) for i in range(8)))
+
+    bodies = run_app(scenario)
+    assert all(body["status"] == "success" for body in bodies), bodies
+    titles = {row["post_id"]: row["title"] for row in sql("SELECT post_id, title FROM post WHERE title LIKE 'batched %'")}
+    assert {body["post_id"]: f"batched {i}" for i, body in enumerate(bodies)} == titles
+    assert server.write_batcher.stats()["rows"] >= 8
@@ -0,0 +1,80 @@
+"""Bulk moderation: per-item results, partial failures, and counters kept in step with the rows."""
+
+
+def _counters_match_rows(sql):
+    """The maintained counters agree with a full recount of the rows they summarize."""
+    pending = {row["kind"]: row["pending"] for row in sql("SELECT kind, pending FROM moderation_counts")}
+    assert pending["post"] == sql("SELECT COUNT(*) AS n FROM post WHERE validated=0")[0]["n"]
+    assert pending["reply"] == sql("SELECT COUNT(*) AS n FROM reply WHERE validated=0")[0]["n"]
+    assert sql("SELECT a.author_id FROM author_stats a WHERE a.post_count <> "
+               "(SELECT COUNT(*) FROM post p WHERE p.author_id = a.author_id AND p.validated=1)") == []
+    assert sql("SELECT p.post_id FROM post p WHERE p.reply_count <> "
+               "(SELECT COUNT(*) FROM reply r WHERE r.parent_post_id = p.post_id AND r.validated=1)") == []
+
+
+def test_bulk_moderation_results_and_counters(seeded_db, run_app, login, sql):
+    seeded_db(pending_ratio=0.3)
+    validated = [row["post_id"] for row in sql("SELECT post_id FROM post WHERE validated=1 ORDER BY post_id LIMIT 3")]
+    pending = sql("SELECT post_id FROM post WHERE validated=0 ORDER BY post_id LIMIT 1")[0]["post_id"]
+    reply = sql("SELECT reply_id, parent_post_id FROM reply WHERE validated=1 ORDER BY reply_id LIMIT 1")[0]
+    before = {row["kind"]: row["pending"] for row in sql("SELECT kind, pending FROM moderation_counts")}
+    items = [
+        {"type": "post", "id": validated[0], "action": "block"},
+        {"type": "post", "id": pending, "action": "validate"},
+        {"type": "post", "id": validated[1], "action": "validate"},
+        {"type": "post", "id": validated[2], "action": "block"},
+        {"type": "post", "id": validated[2], "action": "validate"},
+        {"type": "reply", "id": reply["reply_id"], "action": "block"},
+        {"type": "post", "id": 999999, "action": "block"},
+        {"type": "comment", "id": 1, "action": "block"},
+        {"type": "post", "id": "abc", "action": "block"},
+        {"type": "post", "id": 999998, "action": "delete"},
+    ]
+
+    async def scenario(client):
+        token = await login(client, "teacher", "teacher0")
+        response = await client.post("/moderate/bulk", json={"items": items},
+                                     headers={"Authorization": f"Bearer {token}"})
+        return response.json()
+
+    body = run_app(scenario)
+    assert body["status"] == "success", body
+    assert body["results"] == {
+        f"post:{validated[0]}": "blocked",
+        f"post:{pending}": "validated",
+        f"post:{validated[1]}": "unchanged",
+        f"post:{validated[2]}": "conflict",
+        f"reply:{reply['reply_id']}": "blocked",
+        "post:999999": "not_found",
+        "comment:1": "invalid",
+        "post:abc": "invalid",
+        "post:999998": "invalid",
+    }
+    assert (body["blocked"], body["validated"]) == (2, 1)
+    assert body["missing"] == {"posts": [999999], "replies": []}
+
+    states = {row["post_id"]: row["validated"] for row in sql(
+        "SELECT post_id, validated FROM post WHERE post_id IN (%s, %s, %s, %s)", (*validated, pending))}
+    assert states == {validated[0]: 0, pending: 1, validated[1]: 1, validated[2]: 1}
+    assert sql("SELECT validated FROM reply WHERE reply_id=%s", (reply["reply_id"],))[0]["validated"] == 0
+    after = {row["kind"]: row["pending"] for row in sql("SELECT kind, pending FROM moderation_counts")}
+    assert after == {"post": before["post"], "reply": before["reply"] + 1}
+    _counters_match_rows(sql)
+
+
+def test_bulk_moderation_requires_a_moderator_token(seeded_db, run_app, login, sql):
+    seeded_db()
+    post_id = sql("SELECT post_id FROM post WHERE validated=1 ORDER BY post_id LIMIT 1")[0]["post_id"]
+    items = [{"type": "post", "id": post_id, "action": "block"}]
+
+    async def scenario(client):
+        # A teacher's school_id without their token is not enough
+        spoofed = await client.post("/moderate/bulk", json={"requester_school_id": "200000", "items": items})
+        token = await login(client, "student", "student0")
+        student = await client.post("/moderate/bulk", json={"items": items},
+                                    headers={"Authorization": f"Bearer {token}"})
+        return spoofed.json(), student.json()
+
+    for body in run_app(scenario):
+        assert body == {"status": "error", "message": "Access denied"}
+    assert sql("SELECT validated FROM post WHERE post_id=%s", (post_id,))[0]["validated"] == 1
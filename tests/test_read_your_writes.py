@@ -0,0 +1,71 @@
+"""Replica routing: reads go to lagging replicas, except for whoever just wrote, who reads the primary."""
+import db as db_module
+
+# Long enough that the replicas never catch up during a test
+REPLICA_LAG = 30.0
+
+
+async def _get_post(client, post_id, **params):
+    response = await client.get("/get-post", params=dict(params, post_id=post_id))
+    return response.json()
+
+
+async def _upload(client, author_id, title, headers=None):
+    response = await client.post("/post-upload", headers=headers, json={
+        "upload_time": "2026-10-01T12:00:00Z", "title": title, "content": "body",
+        "author_id": author_id, "anonymous": 0, "category": "Math"})
+    body = response.json()
+    assert body["status"] == "success", body
+    return body["post_id"]
+
+
+def _sticky_reads():
+    return db_module.replica_stats()["primary_reads"]["sticky"]
+
+
+def test_writers_read_their_own_post_from_the_primary(seeded_db, run_app, sql):
+    seeded_db(replicas=2, replica_lag=REPLICA_LAG)
+    existing = sql("SELECT post_id FROM post WHERE validated=1 ORDER BY post_id LIMIT 1")[0]["post_id"]
+
+    async def scenario(client):
+        # Pin each replica's snapshot before the write
+        for _ in range(4):
+            assert (await _get_post(client, existing))["status"] == "success"
+        post_id = await _upload(client, "100005", "fresh")
+        sticky = _sticky_reads()
+
+        assert (await _get_post(client, post_id))["message"] == "Post not found"
+        assert _sticky_reads() == sticky
+        # Either of the author's ids is enough to read the write back
+        assert (await _get_post(client, post_id, requester_school_id="100005"))["status"] == "success"
+        assert (await _get_post(client, post_id, requester_school_id="student5"))["status"] == "success"
+        mine = await client.post("/my-post-list", json={"author_id": "100005"})
+        assert post_id in [post["post_id"] for post in mine.json()["posts"]]
+        assert _sticky_reads() == sticky + 3
+        # Someone else's read still goes to a replica
+        assert (await _get_post(client, post_id, requester_school_id="100006"))["message"] == "Post not found"
+        return db_module.replica_stats()
+
+    stats = run_app(scenario)
+    assert all(replica["reads"] > 0 for replica in stats["replicas"])
+
+
+def test_bearer_session_is_sticky(seeded_db, run_app, login, sql):
+    seeded_db(replicas=2, replica_lag=REPLICA_LAG)
+    existing = sql("SELECT post_id FROM post WHERE validated=1 ORDER BY post_id LIMIT 1")[0]["post_id"]
+
+    async def scenario(client):
+        for _ in range(4):
+            await _get_post(client, existing)
+        token = await login(client, "student", "student7")
+        headers = {"Authorization": f"Bearer {token}"}
+        post_id = await _upload(client, "100007", "with a token", headers=headers)
+        sticky = _sticky_reads()
+        mine = await client.get("/get-post", params={"post_id": post_id}, headers=headers)
+        other = await client.get("/get-post", params={"post_id": post_id})
+        return mine.json(), other.json(), _sticky_reads() - sticky
+
+    mine, other, sticky = run_app(scenario)
+    assert mine["status"] == "success"
+    assert other["message"] == "Post not found"
+    assert sticky == 1
@@ -0,0 +1,71 @@
+"""Cached role lookups: hits never touch the database, and invalidation drops every alias of a user."""
+import db as db_module
+import standin
+import SchoolWebServer_Sep6 as server
+
+
+def _resolve(identifier):
+    session = db_module.DBSession()
+    try:
+        return server._is_privileged(session, identifier)
+    finally:
+        session.close()
+
+
+def test_cache_hit_skips_the_database(seeded_db, run_app):
+    seeded_db()
+
+    async def scenario(client):
+        assert _resolve("200000") == (True, False)
+        assert _resolve("admin0") == (False, True)
+        hits = server.role_cache.hits
+        # A hit must not need a connection at all
+        assert server._is_privileged(None, "200000") == (True, False)
+        assert server._is_privileged(None, "admin0") == (False, True)
+        assert server.role_cache.hits == hits + 2
+
+    run_app(scenario)
+
+
+def test_invalidate_drops_school_id_and_user_id_entries(seeded_db, run_app):
+    seeded_db()
+
+    async def scenario(client):
+        assert _resolve("200001") == (True, False)
+        assert _resolve("teacher1") == (True, False)
+        connection = standin.get_connection()
+        try:
+            connection.cursor().execute("DELETE FROM teacher_data WHERE teacher_id=%s", ("200001",))
+            connection.commit()
+        finally:
+            connection.close()
+        # Stale until invalidated
+        assert server._is_privileged(None, "200001") == (True, False)
+
+        server.invalidate_role("teacher1")
+        assert server.role_cache.get("200001") is None
+        assert server.role_cache.get("teacher1") is None
+        assert _resolve("200001") == (False, False)
+        assert _resolve("teacher1") == (False, False)
+
+    run_app(scenario)
+
+
+def test_invalidate_endpoint_requires_admin(seeded_db, run_app, login):
+    seeded_db()
+
+    async def scenario(client):
+        _resolve("200000")
+        student = await login(client, "student", "student0")
+        response = await client.post("/role-cache/invalidate", json={"identifiers": ["200000"]},
+                                     headers={"Authorization": f"Bearer {student}"})
+        assert response.json() == {"status": "error", "message": "Access denied"}
+        assert server.role_cache.get("200000") is not None
+
+        admin = await login(client, "admin", "admin0")
+        response = await client.post("/role-cache/invalidate", json={"identifiers": ["200000"]},
+                                     headers={"Authorization": f"Bearer {admin}"})
+        assert response.json()["status"] == "success"
+        assert server.role_cache.get("200000") is None
+
+    run_app(scenario)
@@ -0,0 +1,88 @@
+"""Session tokens: issued at login, checked without I/O, rejected once expired, tampered or revoked."""
+import time
+
+import pytest
+
+from sessions import InvalidToken, issue_token, verify_token
+
+
+def test_verify_round_trip_and_expiry():
+    token, expires_at = issue_token("200000", "teacher0", True, False, ttl=60, secret="s", now=1000.0)
+    assert expires_at == 1060.0
+    assert verify_token(token, secret="s", now=1059.0) == {
+        "school_id": "200000", "user_id": "teacher0", "is_teacher": True, "is_admin": False,
+        "issued_at": 1000.0, "expires_at": 1060.0,
+    }
+    with pytest.raises(InvalidToken, match="expired"):
+        verify_token(token, secret="s", now=1060.0)
+    with pytest.raises(InvalidToken):
+        verify_token(token, secret="other", now=1000.0)
+
+
+@pytest.mark.parametrize("token", ["", "no-dot", "a.b.c", "e30.abc", "e30.éé", "é.é"])
+def test_malformed_tokens_raise_invalid_token(token):
+    with pytest.raises(InvalidToken):
+        verify_token(token, secret="s")
+
+
+def test_tampered_claims_are_rejected():
+    token, _expires_at = issue_token("100000", "student0", False, False, secret="s")
+    _payload, signature = token.split(".")
+    forged, _expires_at = issue_token("100000", "student0", True, True, secret="s")
+    with pytest.raises(InvalidToken):
+        verify_token(f"{forged.split('.')[0]}.{signature}", secret="s")
+
+
+def _counts(client, token):
+    # Sent as bytes so a non-ASCII token reaches the server as it would from a real client
+    return client.get("/pending-content/counts", headers={"Authorization": f"Bearer {token}".encode()})
+
+
+def test_login_token_carries_the_role(seeded_db, run_app, login):
+    seeded_db()
+
+    async def scenario(client):
+        return await login(client, "teacher", "teacher2")
+
+    claims = verify_token(run_app(scenario))
+    assert (claims["school_id"], claims["user_id"]) == ("200002", "teacher2")
+    assert (claims["is_teacher"], claims["is_admin"]) == (True, False)
+    assert claims["issued_at"] <= time.time() < claims["expires_at"]
+
+
+def test_bad_tokens_get_401(seeded_db, run_app):
+    seeded_db()
+    expired, _expires_at = issue_token("200000", "teacher0", True, False, ttl=10, now=time.time() - 60)
+    foreign, _expires_at = issue_token("200000", "teacher0", True, False, secret="another worker")
+
+    async def scenario(client):
+        return [(await _counts(client, token)).status_code for token in (expired, foreign, "é.é", "garbage")]
+
+    assert run_app(scenario) == [401, 401, 401, 401]
+
+
+def test_revoked_tokens_get_401_until_the_next_login(seeded_db, run_app, login, sql):
+    seeded_db()
+
+    async def scenario(client):
+        teacher = await login(client, "teacher", "teacher0")
+        assert (await _counts(client, teacher)).json()["status"] == "success"
+
+        student = await login(client, "student", "student0")
+        denied = await client.post("/sessions/revoke", json={"identifiers": ["teacher0"]},
+                                   headers={"Authorization": f"Bearer {student}"})
+        assert denied.json() == {"status": "error", "message": "Access denied"}
+        assert (await _counts(client, teacher)).status_code == 200
+
+        admin = await login(client, "admin", "admin0")
+        revoked = await client.post("/sessions/revoke", json={"identifiers": ["teacher0"]},
+                                    headers={"Authorization": f"Bearer {admin}"})
+        assert revoked.json()["school_ids"] == ["200000"]
+        response = await _counts(client, teacher)
+        assert (response.status_code, response.json()["detail"]) == (401, "Session revoked")
+
+        fresh = await login(client, "teacher", "teacher0")
+        assert (await _counts(client, fresh)).json()["status"] == "success"
+
+    run_app(scenario)
+    assert [row["school_id"] for row in sql("SELECT school_id FROM session_revocations")] == ["200000"]
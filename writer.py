@@ -0,0 +1,159 @@
+"""Group commit for small INSERTs.
+
+With WRITE_BATCHING=1, post and reply handlers hand their row to a GroupCommitWriter instead
+of inserting it themselves. A single background thread takes whatever has queued up, lingers
+up to WRITE_BATCH_LINGER_MS for more, and writes each kind with one multi-row INSERT and one
+commit. Under a burst of submissions, hundreds of fsyncs become a handful. Each caller waits on
+its own Future and gets back its own new id, or its own exception: when a batch fails it is
+retried row by row, so one bad row can't fail its neighbours.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+WRITE_BATCHING = os.environ.get("WRITE_BATCHING", "0") not in ("0", "false", "False")
+# How long the writer waits for more rows after the first one arrives; 0 flushes what is queued
+WRITE_BATCH_LINGER_MS = float(os.environ.get("WRITE_BATCH_LINGER_MS", "3"))
+# Upper bound on rows per multi-row INSERT
+WRITE_BATCH_MAX_SIZE = int(os.environ.get("WRITE_BATCH_MAX_SIZE", "200"))
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    def __init__(self, connect, linger=WRITE_BATCH_LINGER_MS / 1000, max_size=WRITE_BATCH_MAX_SIZE):
+        self._connect = connect
+        self.linger = linger
+        self.max_size = max_size
+        self._flushers = {}
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+        self.max_batch = 0
+        self.failed_batches = 0
+        self.failed_rows = 0
+
+    def register(self, kind, flush):
+        """flush(connection, payloads) writes and commits all payloads in one transaction and
+        returns one result (e.g. the new id) per payload, in order. It must not raise once it
+        has committed: a failed batch is retried row by row, which would write those rows twice."""
+        self._flushers[kind] = flush
+
+    def submit(self, kind, payload):
+        """Queue one row; the returned Future resolves once it is committed."""
+        if kind not in self._flushers:
+            raise KeyError(f"No flusher registered for {kind!r}")
+        future = Future()
+        self._ensure_thread()
+        self._queue.put((kind, payload, future))
+        return future
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+                self._thread.start()
+
+    def close(self):
+        """Flush everything queued so far and stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(_STOP)
+            thread.join()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stopping = False
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.max_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+            if stopping:
+                return
+
+    def _flush(self, batch):
+        by_kind = {}
+        for kind, payload, future in batch:
+            # Callers that gave up (Future cancelled) before the flush are skipped
+            if future.set_running_or_notify_cancel():
+                by_kind.setdefault(kind, []).append((payload, future))
+        for kind, entries in by_kind.items():
+            self._flush_kind(self._flushers[kind], entries)
+
+    def _flush_kind(self, flush, entries):
+        try:
+            results = self._write(flush, [payload for payload, _future in entries])
+        except Exception as e:
+            with self._lock:
+                self.failed_batches += 1
+            if len(entries) == 1:
+                self._fail(entries[0][1], e)
+                return
+            # Isolate the bad row(s) so the rest of the batch still lands
+            for payload, future in entries:
+                try:
+                    future.set_result(self._write(flush, [payload])[0])
+                except Exception as row_error:
+                    self._fail(future, row_error)
+            return
+        with self._lock:
+            self.batches += 1
+            self.rows += len(entries)
+            self.max_batch = max(self.max_batch, len(entries))
+        for (_payload, future), result in zip(entries, results):
+            future.set_result(result)
+
+    def _fail(self, future, error):
+        with self._lock:
+            self.failed_rows += 1
+        future.set_exception(error)
+
+    def _write(self, flush, payloads):
+        connection = self._connect()
+        try:
+            try:
+                return flush(connection, payloads)
+            except Exception:
+                connection.rollback()
+                raise
+        finally:
+            connection.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": WRITE_BATCHING,
+                "linger_ms": self.linger * 1000,
+                "max_size": self.max_size,
+                "queued": self._queue.qsize(),
+                "batches": self.batches,
+                "rows": self.rows,
+                "avg_batch": round(self.rows / self.batches, 2) if self.batches else 0.0,
+                "max_batch": self.max_batch,
+                "failed_batches": self.failed_batches,
+                "failed_rows": self.failed_rows,
+            }